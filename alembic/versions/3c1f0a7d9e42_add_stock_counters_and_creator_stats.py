@@ -0,0 +1,159 @@
+"""add stock counters and creator_stats
+
+Revision ID: 3c1f0a7d9e42
+Revises: 2aa01dd3f53b
+Create Date: 2026-10-19 14:05:12.318204
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0a7d9e42'
+down_revision: Union[str, None] = '2aa01dd3f53b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+benefits = sa.table(
+    'benefits',
+    sa.column('id', sa.Integer),
+    sa.column('creator_id', sa.Integer),
+    sa.column('total_claims', sa.Integer),
+    sa.column('total_cdkeys', sa.Integer),
+    sa.column('available_cdkeys', sa.Integer),
+)
+benefit_cdkeys = sa.table(
+    'benefit_cdkeys',
+    sa.column('id', sa.Integer),
+    sa.column('benefit_id', sa.Integer),
+    sa.column('is_claimed', sa.Boolean),
+)
+benefit_claims = sa.table(
+    'benefit_claims',
+    sa.column('id', sa.Integer),
+    sa.column('benefit_id', sa.Integer),
+)
+personal_blacklists = sa.table(
+    'personal_blacklists',
+    sa.column('id', sa.Integer),
+    sa.column('creator_id', sa.Integer),
+)
+
+
+def _backfill_counters(bind, tables) -> None:
+    """按 BenefitService.rebuild_all_stats 的分组聚合回填福利计数和创建者统计"""
+    counts = {}
+    if 'benefit_cdkeys' in tables:
+        for benefit_id, total_cdkeys, available_cdkeys in bind.execute(
+            sa.select(
+                benefit_cdkeys.c.benefit_id,
+                sa.func.count(benefit_cdkeys.c.id),
+                sa.func.coalesce(sa.func.sum(sa.case((benefit_cdkeys.c.is_claimed == sa.false(), 1), else_=0)), 0)
+            ).group_by(benefit_cdkeys.c.benefit_id)
+        ):
+            counts[benefit_id] = {'_id': benefit_id, '_claims': 0, '_cdkeys': total_cdkeys, '_available': available_cdkeys}
+    if 'benefit_claims' in tables:
+        for benefit_id, total_claims in bind.execute(
+            sa.select(benefit_claims.c.benefit_id, sa.func.count(benefit_claims.c.id)).group_by(benefit_claims.c.benefit_id)
+        ):
+            counts.setdefault(benefit_id, {'_id': benefit_id, '_cdkeys': 0, '_available': 0})['_claims'] = total_claims
+
+    # 领取库独立时（CLAIMS_DATABASE_URL）这里没有领取和CDKEY表，保留原有的 total_claims，
+    # 库存计数需在升级后运行 python manage.py rebuild-stats
+    if 'benefit_claims' in tables:
+        bind.execute(sa.update(benefits).values(total_claims=0, total_cdkeys=0, available_cdkeys=0))
+    else:
+        bind.execute(sa.update(benefits).values(total_cdkeys=0, available_cdkeys=0))
+    if counts:
+        bind.execute(
+            sa.update(benefits).where(benefits.c.id == sa.bindparam('_id')).values(
+                total_claims=sa.bindparam('_claims'),
+                total_cdkeys=sa.bindparam('_cdkeys'),
+                available_cdkeys=sa.bindparam('_available')
+            ),
+            list(counts.values())
+        )
+
+    creator_stats = sa.table(
+        'creator_stats',
+        sa.column('creator_id', sa.Integer),
+        sa.column('total_benefits', sa.Integer),
+        sa.column('total_claims', sa.Integer),
+        sa.column('total_cdkeys', sa.Integer),
+        sa.column('available_cdkeys', sa.Integer),
+        sa.column('blacklisted_users', sa.Integer),
+        sa.column('updated_at', sa.DateTime),
+    )
+    now = datetime.utcnow()
+    stats = {}
+
+    def row_for(creator_id):
+        return stats.setdefault(creator_id, {
+            'creator_id': creator_id, 'total_benefits': 0, 'total_claims': 0,
+            'total_cdkeys': 0, 'available_cdkeys': 0, 'blacklisted_users': 0, 'updated_at': now
+        })
+
+    for creator_id, total_benefits, total_claims, total_cdkeys, available_cdkeys in bind.execute(
+        sa.select(
+            benefits.c.creator_id,
+            sa.func.count(benefits.c.id),
+            sa.func.coalesce(sa.func.sum(benefits.c.total_claims), 0),
+            sa.func.coalesce(sa.func.sum(benefits.c.total_cdkeys), 0),
+            sa.func.coalesce(sa.func.sum(benefits.c.available_cdkeys), 0)
+        ).group_by(benefits.c.creator_id)
+    ):
+        row_for(creator_id).update(
+            total_benefits=total_benefits, total_claims=total_claims,
+            total_cdkeys=total_cdkeys, available_cdkeys=available_cdkeys
+        )
+    for creator_id, blacklisted_users in bind.execute(
+        sa.select(personal_blacklists.c.creator_id, sa.func.count(personal_blacklists.c.id))
+        .group_by(personal_blacklists.c.creator_id)
+    ):
+        row_for(creator_id)['blacklisted_users'] = blacklisted_users
+
+    bind.execute(sa.delete(creator_stats))
+    if stats:
+        bind.execute(sa.insert(creator_stats), list(stats.values()))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    # 应用启动时的 create_all 可能已经建好了 creator_stats（但不会给已有的表加列）
+    columns = {column['name'] for column in inspector.get_columns('benefits')}
+    if 'total_cdkeys' not in columns:
+        op.add_column('benefits', sa.Column('total_cdkeys', sa.Integer(), nullable=True))
+    if 'available_cdkeys' not in columns:
+        op.add_column('benefits', sa.Column('available_cdkeys', sa.Integer(), nullable=True))
+    if 'creator_stats' not in tables:
+        op.create_table('creator_stats',
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.Column('total_benefits', sa.Integer(), nullable=False),
+        sa.Column('total_claims', sa.Integer(), nullable=False),
+        sa.Column('total_cdkeys', sa.Integer(), nullable=False),
+        sa.Column('available_cdkeys', sa.Integer(), nullable=False),
+        sa.Column('blacklisted_users', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('creator_id')
+        )
+
+    # 回填计数，否则已有的CDKEY福利在升级后都显示为已领完
+    _backfill_counters(bind, tables)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('creator_stats')
+    with op.batch_alter_table('benefits') as batch_op:
+        batch_op.drop_column('available_cdkeys')
+        batch_op.drop_column('total_cdkeys')
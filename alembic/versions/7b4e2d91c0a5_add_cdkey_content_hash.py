@@ -0,0 +1,90 @@
+"""add cdkey content_hash and per-benefit unique index
+
+Revision ID: 7b4e2d91c0a5
+Revises: 3c1f0a7d9e42
+Create Date: 2026-10-19 14:48:30.902117
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b4e2d91c0a5'
+down_revision: Union[str, None] = '3c1f0a7d9e42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 5000
+
+benefit_cdkeys = sa.table(
+    'benefit_cdkeys',
+    sa.column('id', sa.Integer),
+    sa.column('benefit_id', sa.Integer),
+    sa.column('cdkey_content', sa.Text),
+    sa.column('content_hash', sa.String),
+)
+
+
+def _backfill_hashes(bind) -> None:
+    """按 (benefit_id, id) 顺序补算哈希（同 app.core.security.hash_cdkey）
+
+    同一福利下内容重复的CDKEY只有id最小的一个写入哈希，其余保持为空，唯一索引才能建立。
+    """
+    stmt = sa.update(benefit_cdkeys).where(benefit_cdkeys.c.id == sa.bindparam('_id')).values(
+        content_hash=sa.bindparam('_hash')
+    )
+    last_benefit_id, last_id = 0, 0
+    seen = set()
+    while True:
+        rows = bind.execute(
+            sa.select(benefit_cdkeys.c.id, benefit_cdkeys.c.benefit_id, benefit_cdkeys.c.cdkey_content)
+            .where(sa.or_(
+                benefit_cdkeys.c.benefit_id > last_benefit_id,
+                sa.and_(benefit_cdkeys.c.benefit_id == last_benefit_id, benefit_cdkeys.c.id > last_id)
+            ))
+            .order_by(benefit_cdkeys.c.benefit_id, benefit_cdkeys.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            if row.benefit_id != last_benefit_id:
+                seen = set()
+            content_hash = hashlib.sha256(row.cdkey_content.strip().encode('utf-8')).hexdigest()
+            if content_hash not in seen:
+                seen.add(content_hash)
+                params.append({'_id': row.id, '_hash': content_hash})
+            last_benefit_id, last_id = row.benefit_id, row.id
+        if params:
+            bind.execute(stmt, params)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 领取库独立时CDKEY表不在这个库中，由应用启动时按当前模型创建
+    if 'benefit_cdkeys' not in inspector.get_table_names():
+        return
+
+    columns = {column['name'] for column in inspector.get_columns('benefit_cdkeys')}
+    if 'content_hash' not in columns:
+        op.add_column('benefit_cdkeys', sa.Column('content_hash', sa.String(length=64), nullable=True))
+        _backfill_hashes(bind)
+
+    indexes = {index['name'] for index in inspector.get_indexes('benefit_cdkeys')}
+    if 'uq_benefit_cdkeys_benefit_hash' not in indexes:
+        op.create_index('uq_benefit_cdkeys_benefit_hash', 'benefit_cdkeys', ['benefit_id', 'content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_benefit_cdkeys_benefit_hash', table_name='benefit_cdkeys')
+    with op.batch_alter_table('benefit_cdkeys') as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,59 @@
+"""add benefit soft delete columns and claim/cdkey lookup indexes
+
+Revision ID: 9d5a3e7f1b28
+Revises: 7b4e2d91c0a5
+Create Date: 2026-10-19 15:32:07.514883
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d5a3e7f1b28'
+down_revision: Union[str, None] = '7b4e2d91c0a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 列)
+INDEXES = [
+    ('ix_benefits_deleted_at', 'benefits', ['deleted_at']),
+    ('ix_benefit_claims_benefit_id', 'benefit_claims', ['benefit_id']),
+    ('ix_benefit_claims_user_id', 'benefit_claims', ['user_id']),
+    ('ix_benefit_cdkeys_benefit_claimed', 'benefit_cdkeys', ['benefit_id', 'is_claimed']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    columns = {column['name'] for column in inspector.get_columns('benefits')}
+    if 'deleted_at' not in columns:
+        op.add_column('benefits', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    if 'purge_claimed_at' not in columns:
+        op.add_column('benefits', sa.Column('purge_claimed_at', sa.DateTime(), nullable=True))
+
+    # 领取库独立时领取和CDKEY表不在这个库中，由应用启动时按当前模型创建（含索引）
+    for name, table, index_columns in INDEXES:
+        if table not in tables:
+            continue
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, index_columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, _ in reversed(INDEXES):
+        if table in tables:
+            op.drop_index(name, table_name=table)
+    with op.batch_alter_table('benefits') as batch_op:
+        batch_op.drop_column('purge_claimed_at')
+        batch_op.drop_column('deleted_at')
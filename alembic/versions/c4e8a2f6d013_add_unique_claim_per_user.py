@@ -0,0 +1,74 @@
+"""add unique (user_id, benefit_id) index on benefit_claims
+
+Revision ID: c4e8a2f6d013
+Revises: 9d5a3e7f1b28
+Create Date: 2026-10-19 17:12:44.208731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2f6d013'
+down_revision: Union[str, None] = '9d5a3e7f1b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+benefit_claims = sa.table(
+    'benefit_claims',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('benefit_id', sa.Integer),
+)
+benefits = sa.table(
+    'benefits',
+    sa.column('id', sa.Integer),
+    sa.column('total_claims', sa.Integer),
+)
+
+
+def _remove_duplicate_claims(bind) -> None:
+    """同一用户对同一福利的多条领取记录只保留id最小的一条，并重算受影响福利的 total_claims
+
+    被删除记录关联的CDKEY已经发放给用户，保持已领取状态；创建者统计在升级后用
+    python manage.py rebuild-stats 重建。
+    """
+    duplicated = bind.execute(
+        sa.select(benefit_claims.c.user_id, benefit_claims.c.benefit_id, sa.func.min(benefit_claims.c.id))
+        .group_by(benefit_claims.c.user_id, benefit_claims.c.benefit_id)
+        .having(sa.func.count(benefit_claims.c.id) > 1)
+    ).all()
+    for user_id, benefit_id, keep_id in duplicated:
+        bind.execute(benefit_claims.delete().where(sa.and_(
+            benefit_claims.c.user_id == user_id,
+            benefit_claims.c.benefit_id == benefit_id,
+            benefit_claims.c.id != keep_id
+        )))
+
+    for benefit_id in {benefit_id for _, benefit_id, _ in duplicated}:
+        bind.execute(benefits.update().where(benefits.c.id == benefit_id).values(
+            total_claims=sa.select(sa.func.count(benefit_claims.c.id))
+            .where(benefit_claims.c.benefit_id == benefit_id).scalar_subquery()
+        ))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 领取库独立时领取表不在这个库中，见 README 中的说明
+    if 'benefit_claims' not in inspector.get_table_names():
+        return
+
+    if 'uq_benefit_claims_user_benefit' not in {index['name'] for index in inspector.get_indexes('benefit_claims')}:
+        _remove_duplicate_claims(bind)
+        op.create_index('uq_benefit_claims_user_benefit', 'benefit_claims', ['user_id', 'benefit_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_benefit_claims_user_benefit', table_name='benefit_claims')
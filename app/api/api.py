@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from app.api import auth, users, benefits
+from app.api import auth, users, benefits, profiling
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/oauth", tags=["认证"])
 api_router.include_router(users.router, prefix="/users", tags=["用户"])
 api_router.include_router(benefits.router, prefix="/benefits", tags=["福利"])
+api_router.include_router(profiling.router, prefix="/admin/profiling", tags=["性能分析"])
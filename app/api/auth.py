@@ -2,7 +2,7 @@ import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import DATABASE_BUSY_ERRORS, get_write_db
 from app.schemas.schemas import Token, ApiResponse, OAuthState
 from app.services.oauth_service import oauth_service
 from app.services.user_service import user_service
@@ -29,7 +29,7 @@ async def oauth_login(redirect_url: str = Query(None, description="登录成功
 async def oauth_callback(
     code: str = Query(..., description="授权码"),
     state: str = Query(..., description="状态码"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """OAuth回调处理"""
     # 验证state
@@ -77,6 +77,9 @@ async def oauth_callback(
             expires_in=1440 * 60  # 24小时，秒为单位
         )
         
+    except DATABASE_BUSY_ERRORS:
+        # 交给全局处理：数据库繁忙时返回503
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -85,9 +88,9 @@ async def oauth_callback(
 
 
 @router.post("/agree-advanced-mode")
-async def agree_advanced_mode(
+def agree_advanced_mode(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """同意高级模式协议"""
     user = user_service.agree_to_advanced_mode(db, current_user.id)
@@ -1,113 +1,177 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
-from app.db.database import get_db
+from typing import List, Optional, Dict, Any, Literal
+from app.db.database import get_db, get_read_db, get_write_db
 from app.schemas.schemas import (
-    Benefit, BenefitCreate, BenefitUpdate, BenefitClaim, 
+    Benefit, BenefitCard, BenefitCreate, BenefitCreated, BenefitUpdate, BenefitClaim, 
     BenefitEligibility, ApiResponse, User, BenefitAccessRequest,
-    CDKeyClaimResult, BenefitCDKey, PersonalBlacklistCreate,
-    PersonalBlacklist, CreatorStats, CDKeyAdd
+    CDKeyClaimResult, CDKeyPage, PersonalBlacklistCreate,
+    PersonalBlacklist, CreatorStats, CDKeyAdd, UserClaimHistoryResponse,
+    BenefitManagement, BenefitDeletionProgress
 )
-from app.services.benefit_service import benefit_service
-from app.api.deps import get_current_user, get_optional_current_user
+from app.models.models import Benefit as BenefitModel, BenefitClaim as BenefitClaimModel
+from app.services.benefit_service import benefit_service, CLAIM_EXPORT_COLUMNS
+from app.api.deps import get_current_user, get_optional_current_user, sparse_fields
+from app.core.config import settings
+from app.core.serialization import FastJSONResponse
+from app.core.streaming import UploadTooLarge, export_response, iter_upload_lines
 
 router = APIRouter()
 
+# ?fields= 稀疏字段集
+card_fields = sparse_fields(BenefitCard, BenefitModel)
+benefit_fields = sparse_fields(Benefit, BenefitModel)
+claim_fields = sparse_fields(BenefitClaim, BenefitClaimModel)
 
-@router.get("/public", response_model=List[Benefit])
+
+@router.get("/public", response_model=List[BenefitCard])
 async def get_public_benefits(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[Any]] = Depends(card_fields),
     current_user: Optional[User] = Depends(get_optional_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取公开的活跃福利列表"""
-    benefits = benefit_service.get_public_benefits(db, current_user, skip, limit)
+    benefits = benefit_service.get_public_benefits(db, current_user, skip, limit, columns=fields)
+    if fields:
+        return FastJSONResponse(benefits)
     return benefits
 
 
-@router.get("/", response_model=List[Benefit])
+@router.get("/", response_model=List[BenefitCard])
 async def get_benefits(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[Any]] = Depends(card_fields),
     current_user: Optional[User] = Depends(get_optional_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取公开的活跃福利列表（默认路由）"""
-    benefits = benefit_service.get_public_benefits(db, current_user, skip, limit)
+    benefits = benefit_service.get_public_benefits(db, current_user, skip, limit, columns=fields)
+    if fields:
+        return FastJSONResponse(benefits)
+    return benefits
+
+
+@router.get("/search", response_model=List[BenefitCard])
+async def search_benefits(
+    q: str = Query(..., min_length=1, max_length=100, description="搜索关键词，多个关键词用空格分隔"),
+    skip: int = 0,
+    limit: int = Query(20, le=100),
+    fields: Optional[List[Any]] = Depends(card_fields),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """按标题和描述搜索公开福利"""
+    benefits = benefit_service.search_benefits(db, q, current_user, skip, limit, columns=fields)
+    if fields:
+        return FastJSONResponse(benefits)
     return benefits
 
 
-@router.post("/", response_model=Benefit)
-async def create_benefit(
+@router.post("/", response_model=BenefitCreated)
+def create_benefit(
     benefit_data: BenefitCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
-    """创建新福利"""
+    """创建新福利（CDKEY按内容去重，duplicate_cdkeys 为跳过的重复数）"""
     benefit = benefit_service.create_benefit(db, benefit_data, current_user.id)
     return benefit
 
 
-@router.get("/my", response_model=List[Benefit])
+@router.get("/my", response_model=List[BenefitCard])
 async def get_my_benefits(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[Any]] = Depends(card_fields),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取我创建的福利"""
-    benefits = benefit_service.get_user_benefits(db, current_user.id, skip, limit)
+    benefits = benefit_service.get_user_benefits(db, current_user.id, skip, limit, columns=fields)
+    if fields:
+        return FastJSONResponse(benefits)
     return benefits
 
 
 @router.get("/my/stats", response_model=CreatorStats)
-async def get_my_stats(
+def get_my_stats(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """获取我的创建者统计"""
-    from app.models.models import Benefit, BenefitClaim, BenefitCDKey, PersonalBlacklist
-    from sqlalchemy import func
-    
-    # 总福利数
-    total_benefits = db.query(func.count(Benefit.id)).filter(Benefit.creator_id == current_user.id).scalar()
+    return benefit_service.get_creator_stats(db, current_user.id)
+
+
+# 黑名单管理（须在 /{benefit_id} 之前注册，否则 GET /blacklist 被当作福利ID）
+@router.post("/blacklist", response_model=ApiResponse)
+def add_to_blacklist(
+    blacklist_data: PersonalBlacklistCreate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
+):
+    """添加用户到个人黑名单"""
+    success = benefit_service.add_personal_blacklist(
+        db, current_user.id, blacklist_data.blacklisted_username, blacklist_data.reason
+    )
     
-    # 总领取次数
-    total_claims = db.query(func.sum(Benefit.total_claims)).filter(Benefit.creator_id == current_user.id).scalar() or 0
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User is already in your blacklist"
+        )
     
-    # CDKEY统计
-    total_cdkeys = db.query(func.count(BenefitCDKey.id)).join(Benefit).filter(Benefit.creator_id == current_user.id).scalar()
-    available_cdkeys = db.query(func.count(BenefitCDKey.id)).join(Benefit).filter(
-        Benefit.creator_id == current_user.id,
-        BenefitCDKey.is_claimed == False
-    ).scalar()
+    return ApiResponse(success=True, message="用户已添加到黑名单")
+
+
+@router.delete("/blacklist/{username}", response_model=ApiResponse)
+def remove_from_blacklist(
+    username: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_write_db)
+):
+    """从个人黑名单移除用户"""
+    success = benefit_service.remove_personal_blacklist(db, current_user.id, username)
     
-    # 黑名单用户数
-    blacklisted_users = db.query(func.count(PersonalBlacklist.id)).filter(PersonalBlacklist.creator_id == current_user.id).scalar()
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found in your blacklist"
+        )
     
-    return CreatorStats(
-        total_benefits=total_benefits,
-        total_claims=total_claims,
-        total_cdkeys=total_cdkeys,
-        available_cdkeys=available_cdkeys,
-        blacklisted_users=blacklisted_users
-    )
+    return ApiResponse(success=True, message="用户已从黑名单移除")
+
+
+@router.get("/blacklist", response_model=List[PersonalBlacklist])
+async def get_my_blacklist(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """获取我的个人黑名单"""
+    return benefit_service.get_personal_blacklist(db, current_user.id)
 
 
 @router.get("/{benefit_id}", response_model=Benefit)
 async def get_benefit(
     benefit_id: int,
+    fields: Optional[List[Any]] = Depends(benefit_fields),
     current_user: Optional[User] = Depends(get_optional_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取福利详情"""
-    benefit = benefit_service.get_benefit_by_id(db, benefit_id, current_user)
+    if fields:
+        benefit = benefit_service.get_benefit_fields(db, benefit_id, fields, current_user)
+    else:
+        benefit = benefit_service.get_benefit_by_id(db, benefit_id, current_user)
     if not benefit:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Benefit not found"
         )
+    if fields:
+        return FastJSONResponse(benefit)
     return benefit
 
 
@@ -136,11 +200,11 @@ async def access_private_benefit(
 
 
 @router.put("/{benefit_id}", response_model=Benefit)
-async def update_benefit(
+def update_benefit(
     benefit_id: int,
     benefit_data: BenefitUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """更新福利（仅创建者可更新）"""
     benefit = benefit_service.update_benefit(db, benefit_id, benefit_data, current_user.id)
@@ -156,7 +220,7 @@ async def update_benefit(
 async def check_benefit_eligibility(
     benefit_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """检查用户是否有资格领取福利"""
     benefit = benefit_service.get_benefit_by_id(db, benefit_id, current_user)
@@ -193,11 +257,12 @@ async def get_benefit_claims(
     benefit_id: int,
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[Any]] = Depends(claim_fields),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取福利的领取记录（仅创建者可查看）"""
-    claims = benefit_service.get_benefit_claims(db, benefit_id, current_user.id, skip, limit)
+    claims = benefit_service.get_benefit_claims(db, benefit_id, current_user.id, skip, limit, columns=fields)
     if not claims and benefit_id:
         # 检查福利是否存在且属于当前用户
         benefit = benefit_service.get_benefit_by_id(db, benefit_id)
@@ -206,84 +271,78 @@ async def get_benefit_claims(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Benefit not found or you don't have permission to view claims"
             )
+    if fields:
+        return FastJSONResponse(claims)
     return claims
 
 
-@router.get("/{benefit_id}/cdkeys", response_model=List[BenefitCDKey])
-async def get_benefit_cdkeys(
+@router.get("/{benefit_id}/claims/export")
+async def export_benefit_claims(
     benefit_id: int,
+    format: Literal["csv", "ndjson"] = Query("csv", description="导出格式"),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """获取福利的CDKEY列表（仅创建者可查看）"""
-    cdkeys = benefit_service.get_benefit_cdkeys(db, benefit_id, current_user.id)
-    if not cdkeys and benefit_id:
-        # 检查福利是否存在且属于当前用户
-        benefit = benefit_service.get_benefit_by_id(db, benefit_id)
-        if not benefit or benefit.creator_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Benefit not found or you don't have permission to view CDKEYs"
-            )
-    return cdkeys
-
-
-# 黑名单管理
-@router.post("/blacklist", response_model=ApiResponse)
-async def add_to_blacklist(
-    blacklist_data: PersonalBlacklistCreate,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """添加用户到个人黑名单"""
-    success = benefit_service.add_personal_blacklist(
-        db, current_user.id, blacklist_data.blacklisted_username, blacklist_data.reason
-    )
-    
-    if not success:
+    """流式导出福利的全部领取记录，包含领取用户和CDKEY（仅创建者可导出）"""
+    if not benefit_service.is_benefit_owner(db, benefit_id, current_user.id):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User is already in your blacklist"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Benefit not found or you don't have permission to export claims"
         )
     
-    return ApiResponse(success=True, message="用户已添加到黑名单")
+    stmt = benefit_service.benefit_claims_export_query(benefit_id)
+    return export_response(
+        stmt, format, f"benefit-{benefit_id}-claims",
+        columns=CLAIM_EXPORT_COLUMNS, enrich=benefit_service.add_claim_users
+    )
 
 
-@router.delete("/blacklist/{username}", response_model=ApiResponse)
-async def remove_from_blacklist(
-    username: str,
+@router.get("/{benefit_id}/cdkeys", response_model=CDKeyPage)
+async def get_benefit_cdkeys(
+    benefit_id: int,
+    status_filter: Optional[Literal["claimed", "unclaimed"]] = Query(None, alias="status", description="按领取状态筛选"),
+    after_id: Optional[int] = Query(None, description="游标：返回id大于该值的CDKEY"),
+    limit: int = Query(100, ge=1, le=1000),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """从个人黑名单移除用户"""
-    success = benefit_service.remove_personal_blacklist(db, current_user.id, username)
-    
-    if not success:
+    """分页获取福利的CDKEY库存（仅创建者可查看）"""
+    page = benefit_service.get_benefit_cdkeys(db, benefit_id, current_user.id, status_filter, after_id, limit)
+    if page is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found in your blacklist"
+            detail="Benefit not found or you don't have permission to view CDKEYs"
         )
-    
-    return ApiResponse(success=True, message="用户已从黑名单移除")
+    return page
 
 
-@router.get("/blacklist", response_model=List[PersonalBlacklist])
-async def get_my_blacklist(
+@router.get("/{benefit_id}/cdkeys/export")
+async def export_benefit_cdkeys(
+    benefit_id: int,
+    status_filter: Optional[Literal["claimed", "unclaimed"]] = Query(None, alias="status", description="按领取状态筛选"),
+    format: Literal["txt", "csv", "ndjson"] = Query("txt", description="导出格式，txt为每行一个CDKEY"),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """获取我的个人黑名单"""
-    return benefit_service.get_personal_blacklist(db, current_user.id)
+    """流式下载福利的CDKEY（仅创建者可下载）"""
+    if not benefit_service.is_benefit_owner(db, benefit_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Benefit not found or you don't have permission to view CDKEYs"
+        )
+    
+    stmt = benefit_service.benefit_cdkeys_export_query(benefit_id, status_filter, content_only=(format == "txt"))
+    return export_response(stmt, format, f"benefit-{benefit_id}-cdkeys")
 
 
 # 新增功能API端点
 
 @router.post("/{benefit_id}/cdkeys/add", response_model=ApiResponse)
-async def add_cdkeys_to_benefit(
+def add_cdkeys_to_benefit(
     benefit_id: int,
     cdkey_data: CDKeyAdd,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """向福利添加CDKEY（仅创建者可操作）"""
     result = benefit_service.add_cdkeys_to_benefit(
@@ -299,16 +358,76 @@ async def add_cdkeys_to_benefit(
     return ApiResponse(
         success=True, 
         message=result["message"],
-        data={"added_count": result["added_count"]}
+        data={"added_count": result["added_count"], "duplicate_count": result["duplicate_count"]}
     )
 
 
-@router.get("/my/history", response_model=Dict[str, Any])
+@router.post(
+    "/{benefit_id}/cdkeys/upload",
+    response_model=ApiResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/plain": {"schema": {"type": "string"}},
+                "application/gzip": {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def upload_cdkeys_to_benefit(
+    benefit_id: int,
+    request: Request,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """流式上传CDKEY文件（每行一个，UTF-8纯文本或gzip压缩），分批写入（仅创建者可操作）"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.cdkey_upload_max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload exceeds {settings.cdkey_upload_max_bytes} bytes"
+        )
+    
+    try:
+        result = await benefit_service.ingest_cdkey_stream(
+            db, benefit_id, current_user.id, iter_upload_lines(
+                request.stream(),
+                max_bytes=settings.cdkey_upload_max_bytes,
+                max_decompressed_bytes=settings.cdkey_upload_max_decompressed_bytes,
+                max_lines=settings.cdkey_upload_max_lines
+            )
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["message"]
+        )
+    
+    return ApiResponse(
+        success=True,
+        message=result["message"],
+        data={"added_count": result["added_count"], "duplicate_count": result["duplicate_count"]}
+    )
+
+
+@router.get("/my/history", response_model=UserClaimHistoryResponse)
 async def get_my_claim_history(
     skip: int = 0,
     limit: int = 100,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取我的福利领取历史"""
     history = benefit_service.get_user_claim_history(db, current_user.id, skip, limit)
@@ -316,12 +435,13 @@ async def get_my_claim_history(
 
 
 @router.delete("/{benefit_id}", response_model=ApiResponse)
-async def delete_benefit(
+def delete_benefit(
     benefit_id: int,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
-    """删除福利（仅创建者可删除）"""
+    """删除福利（仅创建者可删除），关联的CDKEY和领取记录在后台分批清理"""
     success = benefit_service.delete_benefit(db, benefit_id, current_user.id)
     
     if not success:
@@ -330,14 +450,33 @@ async def delete_benefit(
             detail="Benefit not found or you are not the creator"
         )
     
-    return ApiResponse(success=True, message="福利已删除")
+    background_tasks.add_task(benefit_service.purge_deleted_benefit, benefit_id)
+    return ApiResponse(success=True, message="福利已删除，关联数据正在后台清理")
+
+
+@router.get("/{benefit_id}/deletion", response_model=BenefitDeletionProgress)
+async def get_benefit_deletion_progress(
+    benefit_id: int,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """查看已删除福利的后台清理进度（仅创建者），清理完成后返回404"""
+    progress = benefit_service.get_deletion_progress(db, benefit_id, current_user.id)
+    
+    if not progress:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deleted benefit not found or already purged"
+        )
+    
+    return progress
 
 
 @router.get("/{benefit_id}/detail", response_model=Dict[str, Any])
 async def get_benefit_detail_with_secret(
     benefit_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取福利详情（包含秘密内容）"""
     benefit = benefit_service.get_benefit_with_secret(db, benefit_id, current_user)
@@ -351,12 +490,12 @@ async def get_benefit_detail_with_secret(
     return benefit
 
 
-@router.get("/my/managed", response_model=List[Dict[str, Any]])
+@router.get("/my/managed", response_model=List[BenefitManagement])
 async def get_my_managed_benefits(
     skip: int = 0,
     limit: int = 100,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取我创建的福利管理列表"""
     benefits = benefit_service.get_user_managed_benefits(db, current_user.id, skip, limit)
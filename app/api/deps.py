@@ -1,9 +1,11 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import Optional
-from app.db.database import get_db
+from typing import Any, Callable, List, Optional, Type
+from app.db.database import get_read_db
 from app.core.security import verify_token
+from app.core.profiling import profiling_enabled, verify_profile_token
 from app.services.user_service import user_service
 from app.models.models import User
 
@@ -11,7 +13,7 @@ security = HTTPBearer(auto_error=False)
 
 
 def get_current_user(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """获取当前认证用户"""
@@ -44,7 +46,7 @@ def get_current_user(
 
 
 def get_optional_current_user(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token: Optional[HTTPAuthorizationCredentials] = Depends(security)
 ) -> Optional[User]:
     """获取可选的当前用户（允许匿名访问）"""
@@ -64,3 +66,52 @@ def get_optional_current_user(
         return user
     except Exception:
         return None
+
+
+# 不能通过 ?fields= 投影的列：投影跳过了完整响应中的登录和密码校验
+PRIVATE_FIELDS = frozenset({"access_password", "secret"})
+
+
+def sparse_fields(schema: Type[BaseModel], model: Any) -> Callable[..., Optional[List[Any]]]:
+    """生成 ?fields= 参数依赖：把字段列表解析为模型列，用于在SQL层面投影"""
+    columns = model.__table__.c
+    allowed = {
+        name: getattr(model, name) for name in schema.model_fields
+        if name in columns and name not in PRIVATE_FIELDS
+    }
+    
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=f"只返回指定字段（逗号分隔），可选: {','.join(allowed)}"
+        )
+    ) -> Optional[List[Any]]:
+        if not fields:
+            return None
+        
+        names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in names if name not in allowed]
+        if unknown or not names:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {','.join(unknown)}" if unknown else "No fields specified"
+            )
+        return [allowed[name] for name in names]
+    
+    return dependency
+
+
+def require_profiling_token(
+    token: Optional[str] = Header(None, alias="X-Profile-Token", description="manage.py profile-token 生成的令牌")
+) -> None:
+    """性能分析接口的管理员认证：未配置 PROFILING_SECRET 时接口不存在"""
+    if not profiling_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    if not verify_profile_token(token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired profiling token"
+        )
@@ -0,0 +1,61 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse
+from typing import Any, Dict, Literal
+from app.core.config import settings
+from app.core.profiling import process_sampler, list_profiles, find_profile, profile_path
+from app.api.deps import require_profiling_token
+
+router = APIRouter(dependencies=[Depends(require_profiling_token)])
+
+
+@router.get("", response_model=Dict[str, Any])
+async def get_profiles():
+    """已保存的分析结果和当前采样状态"""
+    return {"profiles": list_profiles(), "sampler": process_sampler.status()}
+
+
+@router.post("/sampler", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+async def start_sampler(
+    seconds: float = Query(10, gt=0, description="采样时长（秒）"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="采样间隔（毫秒）"),
+    memory: bool = Query(False, description="同时记录tracemalloc内存分配快照")
+):
+    """开始限定时长的进程调用栈采样，完成后可下载折叠栈（collapsed）"""
+    if seconds > settings.profiling_max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sampling is limited to {settings.profiling_max_seconds} seconds"
+        )
+    try:
+        return process_sampler.start(seconds, interval_ms / 1000, memory)
+    except RuntimeError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A sampling session is already running"
+        )
+
+
+@router.get("/sampler", response_model=Dict[str, Any])
+async def get_sampler_status():
+    """当前（或最近一次）采样的状态"""
+    sampler = process_sampler.status()
+    if not sampler:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No sampling session"
+        )
+    return sampler
+
+
+@router.get("/{profile_id}/{profile_format}")
+async def download_profile(profile_id: str, profile_format: Literal["pstats", "collapsed", "tracemalloc", "memory"]):
+    """下载分析结果：pstats（单请求cProfile）、collapsed（采样折叠栈）、tracemalloc / memory（内存快照）"""
+    profile = find_profile(profile_id)
+    if not profile or profile_format not in profile["formats"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    path = profile_path(profile_id, profile_format)
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
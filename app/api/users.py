@@ -1,18 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+from typing import Any, List, Optional
+from app.db.database import get_read_db
 from app.schemas.schemas import User, BenefitClaim, ApiResponse
+from app.models.models import User as UserModel, BenefitClaim as BenefitClaimModel
 from app.services.user_service import user_service
 from app.services.benefit_service import benefit_service
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, sparse_fields
+from app.core.serialization import FastJSONResponse
 
 router = APIRouter()
 
+# ?fields= 稀疏字段集
+user_fields = sparse_fields(User, UserModel)
+claim_fields = sparse_fields(BenefitClaim, BenefitClaimModel)
+
 
 @router.get("/me", response_model=User)
-async def get_current_user_info(current_user = Depends(get_current_user)):
+async def get_current_user_info(
+    fields: Optional[List[Any]] = Depends(user_fields),
+    current_user = Depends(get_current_user)
+):
     """获取当前用户信息"""
+    if fields:
+        # 认证时已加载完整用户行，这里直接裁剪
+        return FastJSONResponse({column.key: getattr(current_user, column.key) for column in fields})
     return current_user
 
 
@@ -20,24 +32,33 @@ async def get_current_user_info(current_user = Depends(get_current_user)):
 async def get_my_claims(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[List[Any]] = Depends(claim_fields),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取当前用户的领取记录"""
-    claims = benefit_service.get_user_claims(db, current_user.id, skip, limit)
+    claims = benefit_service.get_user_claims(db, current_user.id, skip, limit, columns=fields)
+    if fields:
+        return FastJSONResponse(claims)
     return claims
 
 
 @router.get("/{user_id}", response_model=User)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db)
+    fields: Optional[List[Any]] = Depends(user_fields),
+    db: Session = Depends(get_read_db)
 ):
     """获取用户信息（公开信息）"""
-    user = user_service.get_user_by_id(db, user_id)
+    if fields:
+        user = user_service.get_user_fields(db, user_id, fields)
+    else:
+        user = user_service.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    if fields:
+        return FastJSONResponse(user)
     return user
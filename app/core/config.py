@@ -5,6 +5,32 @@ from typing import Optional
 class Settings(BaseSettings):
     # 数据库配置
     database_url: str = "sqlite:///./linuxdo_free.db"
+    database_read_url: Optional[str] = None  # 只读副本；未设置时SQLite使用同一文件的只读连接
+    # 领取记录和CDKEY的独立数据库（写热点与目录数据分库）；未设置时与 database_url 相同
+    claims_database_url: Optional[str] = None
+    claims_database_read_url: Optional[str] = None
+
+    # 连接池（每个引擎各自一个池；SQLite单写引擎固定为1个连接）
+    db_pool_size: int = 5                  # 常驻连接数
+    db_max_overflow: int = 10              # 池满时可额外创建的连接数
+    db_pool_timeout: float = 30            # 等待空闲连接的秒数，超时报错
+    db_pool_pre_ping: bool = False         # 签出前检测连接是否可用（MySQL/PostgreSQL建议开启）
+    db_pool_recycle: int = -1              # 连接最长使用秒数，-1 表示不回收
+    db_busy_retry_after: int = 1           # 等待连接超时或数据库被锁时返回503，Retry-After的秒数
+    
+    # SQLite调优（每个连接建立时设置，其他数据库忽略）
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000        # 等待写锁的毫秒数
+    sqlite_cache_size: int = -65536        # 页缓存，负数表示KiB（64MB）
+    sqlite_mmap_size: int = 268435456      # 内存映射读取大小（256MB）
+    sqlite_temp_store: str = "MEMORY"
+    sqlite_single_writer: bool = True      # 领取等写操作经单个写连接串行执行（BEGIN IMMEDIATE）
+    
+    # CDKEY文件上传限制
+    cdkey_upload_max_bytes: int = 64 * 1024 * 1024  # 请求体（压缩时为压缩后）的最大字节数
+    cdkey_upload_max_decompressed_bytes: int = 256 * 1024 * 1024  # 解压后的最大字节数
+    cdkey_upload_max_lines: int = 1000000           # 单次上传的最大行数（含空行）
     
     # LinuxDO OAuth配置
     linuxdo_client_id: str
@@ -24,7 +50,24 @@ class Settings(BaseSettings):
     
     # 应用配置
     app_name: str = "LinuxDO福利分发平台"
-    debug: bool = False
+    debug: bool = False                    # 开启后响应头附带SQL查询统计（X-DB-*）
+    log_level: str = "INFO"
+    log_format: str = "json"               # json：每条一行JSON；text：便于本地阅读的文本
+    slow_request_ms: int = 1000            # 超过该耗时的请求记录查询统计日志
+    query_n_plus_one_threshold: int = 5    # 同一语句在一个请求内执行达到该次数视为N+1
+
+    # 按需性能分析（未设置 profiling_secret 时关闭，令牌由 manage.py profile-token 生成）
+    profiling_secret: Optional[str] = None
+    profiling_dir: str = "./profiles"      # 分析结果保存目录
+    profiling_max_seconds: int = 60        # 单次进程采样的最长时间
+    profiling_keep: int = 50               # 保留的分析结果个数（超出时删除最旧的）
+
+    # 链路追踪（请求、服务方法、LinuxDO调用和SQL语句的span）
+    tracing_enabled: bool = False
+    tracing_sample_rate: float = 0.01      # 随机导出的请求比例
+    tracing_slow_ms: int = 1000            # 超过该耗时的请求总是导出
+    tracing_exporters: str = "jsonl"       # 逗号分隔：jsonl、log 或 "模块路径:工厂"
+    tracing_file: str = "./traces.jsonl"   # jsonl导出器的输出文件
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,132 @@
+"""
+日志配置
+
+所有日志经 QueueHandler 入队，由后台线程（QueueListener）格式化并写到标准输出，
+请求处理线程中不做阻塞I/O。默认每条日志一行JSON，extra 传入的字段原样输出；
+密码、令牌等敏感字段、文本中的同名参数和OAuth回调地址中的授权码在输出前打码。
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import orjson
+
+from app.core.config import settings
+
+# 这些字段（不区分大小写）的值不写入日志；只列真正的凭据，code、token 这类通用名称
+# 会误伤状态码、token_type 等无关字段
+SENSITIVE_KEYS = frozenset({
+    "client_secret", "access_token", "refresh_token", "id_token",
+    "password", "access_password", "secret_key", "authorization", "cookie",
+})
+
+REDACTED = "***"
+
+_SENSITIVE_PATTERN = "|".join(sorted(SENSITIVE_KEYS, key=len, reverse=True))
+# JSON（"key": "value"）和表单/查询串（key=value）中的敏感参数
+_SENSITIVE_TEXT = re.compile(
+    rf'(?i)("(?:{_SENSITIVE_PATTERN})"\s*:\s*")[^"]*(")|\b((?:{_SENSITIVE_PATTERN})=)[^&\s,;\'"]*'
+)
+# OAuth回调地址查询串中的授权码（只在回调地址中打码）
+_OAUTH_CODE_TEXT = re.compile(r'(/callback\?(?:[^\s"\'#]*&)?code=)[^&\s"\'#]*')
+
+# LogRecord 自带的属性，其余属性视为 extra 传入的字段
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(value: Any) -> Any:
+    """对字典中的敏感字段和文本中的敏感参数打码（递归处理字典和列表）"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return _OAUTH_CODE_TEXT.sub(rf"\g<1>{REDACTED}", _SENSITIVE_TEXT.sub(_redact_match, value))
+    return value
+
+
+def _redact_match(match: re.Match) -> str:
+    if match.group(1) is not None:
+        return f"{match.group(1)}{REDACTED}{match.group(2)}"
+    return f"{match.group(3)}{REDACTED}"
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志一行JSON：时间、级别、logger、消息、extra 字段、当前trace ID和异常堆栈"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        # 无法序列化的 extra 值按 str() 输出
+        return orjson.dumps(redact(entry), default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """便于本地阅读的单行文本，extra 字段以 key=value 附在消息后"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        return redact(f"{text} {fields}" if fields else text)
+
+
+class _TraceQueueHandler(logging.handlers.QueueHandler):
+    """入队前在产生日志的线程中合并消息参数、展开异常堆栈，并补上当前trace ID（上下文变量只在该线程中可见）
+
+    与默认的 prepare 不同，不在此处格式化整条日志，extra 字段和异常堆栈留给输出线程的格式化器。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        from app.core.tracing import current_span
+
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        span = current_span()
+        if span is not None and not hasattr(record, "trace_id"):
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return record
+
+
+def setup_logging() -> None:
+    """根logger经队列输出到标准输出，级别和格式取自 LOG_LEVEL、LOG_FORMAT（重复调用无副作用）"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter() if settings.log_format == "json" else TextFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(_TraceQueueHandler(log_queue))
+    root.setLevel(settings.log_level.upper())
@@ -0,0 +1,360 @@
+"""
+进程内指标
+
+请求数和耗时、数据库耗时、领取结果、LinuxDO接口调用以及连接池状态在进程内聚合，
+由 /metrics 以Prometheus文本格式输出，/health/pool 以JSON输出连接池部分。
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import httpx
+
+from app.core.query_profiler import current_profile
+from app.core.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# 等待连接耗时的直方图分桶上限（秒）
+WAIT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 请求耗时、数据库耗时和外部接口耗时的分桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定分桶的直方图，线程安全"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """累计分桶计数（le: 小于等于该上限的观测数）"""
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, value in zip(self.buckets + ("+Inf",), counts):
+            running += value
+            cumulative[str(bound)] = running
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class _Family:
+    """按标签区分的一组指标"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(样本名后缀, 标签, 值) 列表"""
+        with self._lock:
+            children = list(self._children.items())
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in children]
+
+
+class Counter(_Family):
+    """只增计数"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+
+class Gauge(_Family):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class LabeledHistogram(_Family):
+    """按标签区分的直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        histogram = self._children.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._children.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for _, labels, histogram in super().samples():
+            samples.extend(_histogram_samples(labels, histogram.snapshot()))
+        return samples
+
+
+def _histogram_samples(labels: Dict[str, str], snapshot: Dict[str, Any]) -> List[Tuple[str, Dict[str, str], float]]:
+    samples = [("_bucket", {**labels, "le": bound}, count) for bound, count in snapshot["buckets"].items()]
+    samples.append(("_sum", labels, snapshot["sum"]))
+    samples.append(("_count", labels, snapshot["count"]))
+    return samples
+
+
+REGISTRY: List[_Family] = []
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_duration = LabeledHistogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is sent", ("method", "route", "status")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+http_requests_in_flight.inc(0)  # 无标签，启动后即输出0
+http_request_db_time = LabeledHistogram(
+    "http_request_db_seconds", "Time spent executing SQL per HTTP request", ("method", "route")
+)
+benefit_claims = Counter(
+    "benefit_claims_total", "Claim attempts by benefit type and outcome", ("benefit_type", "outcome")
+)
+linuxdo_request_duration = LabeledHistogram(
+    "linuxdo_request_duration_seconds", "Latency of outbound linux.do API calls", ("endpoint",)
+)
+linuxdo_request_errors = Counter(
+    "linuxdo_request_errors_total", "Failed outbound linux.do API calls", ("endpoint", "reason")
+)
+
+
+@contextmanager
+def observe_linuxdo(endpoint: str) -> Iterator[None]:
+    """记录一次LinuxDO接口调用的耗时和结果（指标、日志，并作为trace中的client span），
+    块内抛出的异常计为失败后继续抛出"""
+    started = time.perf_counter()
+    fields: Dict[str, Any] = {"endpoint": endpoint}
+    try:
+        with start_span(f"linuxdo.{endpoint}", "client", {"peer.service": "linux.do"}):
+            yield
+    except httpx.HTTPStatusError as e:
+        fields.update(reason=f"status_{e.response.status_code}", status_code=e.response.status_code,
+                      response_body=e.response.text[:500])
+        raise
+    except httpx.TimeoutException:
+        fields["reason"] = "timeout"
+        raise
+    except httpx.TransportError as e:
+        fields.update(reason="transport", error=str(e))
+        raise
+    except Exception as e:
+        fields.update(reason="invalid_response", error=f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        linuxdo_request_duration.observe(elapsed, endpoint=endpoint)
+        fields["duration_ms"] = round(elapsed * 1000, 1)
+        if "reason" in fields:
+            linuxdo_request_errors.inc(endpoint=endpoint, reason=fields["reason"])
+            logger.warning("LinuxDO %s request failed: %s", endpoint, fields["reason"], extra=fields)
+        else:
+            logger.debug("LinuxDO %s request", endpoint, extra=fields)
+
+
+def route_label(scope) -> str:
+    """请求匹配到的路由模板（如 /api/v1/benefits/{benefit_id}），避免按实际路径产生无界的标签值"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        # 挂载的子应用（如 /static）没有路由对象，以挂载路径为标签
+        return scope.get("root_path") or "unmatched"
+    # 子路由的 route.path 不含 include_router 的前缀（前缀均为固定路径），从实际路径中补回
+    path = scope["path"]
+    regex = getattr(route, "path_regex", None)
+    if regex is not None:
+        for index, char in enumerate(path):
+            if char == "/" and regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """记录每个HTTP请求的数量、耗时、处理中数量和数据库耗时（ASGI中间件）
+
+    须注册在 QueryProfilerMiddleware 之内（先于其 add_middleware），才能读取请求的SQL统计。
+    与SQL统计一致，耗时截止到响应体发送完毕，不含之后执行的后台任务。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            http_requests_in_flight.dec()
+            method, route = scope["method"], route_label(scope)
+            http_requests.inc(method=method, route=route, status=status_code)
+            http_request_duration.observe(time.perf_counter() - started, method=method, route=route, status=status_code)
+            profile = current_profile()
+            if profile is not None:
+                http_request_db_time.observe(profile.total_time, method=method, route=route)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 异常或客户端断开时响应体可能没有发送完
+            record()
+
+
+class PoolMetrics:
+    """单个连接池的指标"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = Histogram(WAIT_TIME_BUCKETS)
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait: float) -> None:
+        self.wait_time.observe(wait)
+        with self._lock:
+            self.checkouts += 1
+
+    def record_timeout(self, wait: float) -> None:
+        self.wait_time.observe(wait)
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.pool
+        data: Dict[str, Any] = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds": self.wait_time.snapshot(),
+        }
+        if pool is not None:
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        return data
+
+
+_pools: Dict[str, PoolMetrics] = {}
+
+
+def pool_metrics(name: str) -> PoolMetrics:
+    """按名称获取（首次时创建）连接池指标"""
+    metrics = _pools.get(name)
+    if metrics is None:
+        metrics = _pools.setdefault(name, PoolMetrics(name))
+    return metrics
+
+
+def pools_snapshot() -> Dict[str, Dict[str, Any]]:
+    """所有连接池的当前指标"""
+    return {name: metrics.snapshot() for name, metrics in _pools.items()}
+
+
+# 连接池指标：(名称, 类型, 说明, snapshot中的字段)
+_POOL_FAMILIES = (
+    ("db_pool_size", "gauge", "Configured pool size", "size"),
+    ("db_pool_checked_out", "gauge", "Connections currently checked out", "checked_out"),
+    ("db_pool_idle", "gauge", "Idle connections in the pool", "idle"),
+    ("db_pool_overflow", "gauge", "Overflow connections currently open", "overflow"),
+    ("db_pool_checkouts_total", "counter", "Connection checkouts", "checkouts"),
+    ("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection", "timeouts"),
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+    value_text = repr(float(value)) if isinstance(value, float) else str(value)
+    return f"{name}{{{label_text}}} {value_text}" if label_text else f"{name} {value_text}"
+
+
+def _format_family(name: str, kind: str, documentation: str, samples) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines.extend(_format_sample(name + suffix, labels, value) for suffix, labels, value in samples)
+    return lines
+
+
+def render_prometheus() -> str:
+    """所有指标的Prometheus文本格式（0.0.4）"""
+    lines: List[str] = []
+    for family in REGISTRY:
+        lines.extend(_format_family(family.name, family.kind, family.documentation, family.samples()))
+
+    pools = pools_snapshot()
+    for name, kind, documentation, field in _POOL_FAMILIES:
+        samples = [("", {"pool": pool}, data[field]) for pool, data in pools.items() if field in data]
+        lines.extend(_format_family(name, kind, documentation, samples))
+    wait_samples = []
+    for pool, data in pools.items():
+        wait_samples.extend(_histogram_samples({"pool": pool}, data["wait_seconds"]))
+    lines.extend(_format_family(
+        "db_pool_wait_seconds", "histogram", "Time spent waiting to check out a connection", wait_samples
+    ))
+    return "\n".join(lines) + "\n"
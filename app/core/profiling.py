@@ -0,0 +1,266 @@
+"""
+按需性能分析（仅持有 PROFILING_SECRET 的管理员可用）
+
+- 单请求分析：请求带有效的 X-Profile-Token 头时以cProfile运行该请求，结果保存为pstats，
+  响应头 X-Profile-Id 为结果ID。cProfile只跟踪事件循环线程，线程池中执行的部分
+  （同步路由、run_in_threadpool）请用进程采样查看；该请求await期间事件循环上运行的
+  其他请求的协程也会计入结果，响应头 X-Profile-Concurrent 为期间同时处理的其他请求数。
+- 进程采样：限定时长内定时采样所有线程的调用栈，输出火焰图可用的折叠栈（collapsed stacks），
+  可同时用tracemalloc记录内存分配快照。
+
+结果保存在 PROFILING_DIR 中，通过 /api/v1/admin/profiling 下载；只保留最新的 PROFILING_KEEP 个。
+"""
+import cProfile
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+PROFILE_TOKEN_HEADER = "x-profile-token"
+
+# 结果文件的扩展名及下载格式
+PROFILE_FORMATS = {
+    "pstats": ".pstats",          # cProfile统计，可用 pstats / snakeviz 查看
+    "collapsed": ".collapsed",    # 折叠栈，可用 flamegraph.pl / speedscope 生成火焰图
+    "tracemalloc": ".tracemalloc",  # tracemalloc快照，可用 tracemalloc.Snapshot.load 读取
+    "memory": ".memory.txt",      # 内存分配最多的代码行（文本）
+}
+
+# 不对这些路径做单请求分析（管理接口本身也用同一令牌认证）
+_EXCLUDED_PREFIXES = ("/api/v1/admin/profiling",)
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.profiling_secret)
+
+
+def _sign(expires: int) -> str:
+    return hmac.new(settings.profiling_secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def create_profile_token(ttl_seconds: int = 3600) -> str:
+    """生成在 ttl_seconds 秒内有效的分析令牌（格式: 过期时间戳.签名）"""
+    if not profiling_enabled():
+        raise RuntimeError("PROFILING_SECRET未配置")
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_sign(expires)}"
+
+
+def verify_profile_token(token: Optional[str]) -> bool:
+    """校验分析令牌的签名和有效期"""
+    if not profiling_enabled() or not token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(int(expires)))
+
+
+def _new_profile_id(kind: str) -> str:
+    return f"{datetime.utcnow():%Y%m%d%H%M%S%f}-{kind}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_path(profile_id: str, profile_format: str) -> str:
+    return os.path.join(settings.profiling_dir, profile_id + PROFILE_FORMATS[profile_format])
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """已保存的分析结果（新的在前）"""
+    if not os.path.isdir(settings.profiling_dir):
+        return []
+    profiles: Dict[str, Dict[str, Any]] = {}
+    for filename in os.listdir(settings.profiling_dir):
+        for profile_format, suffix in PROFILE_FORMATS.items():
+            if filename.endswith(suffix):
+                profile_id = filename[:-len(suffix)]
+                entry = profiles.setdefault(profile_id, {"id": profile_id, "formats": []})
+                entry["formats"].append(profile_format)
+                break
+    return sorted(profiles.values(), key=lambda entry: entry["id"], reverse=True)
+
+
+def find_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    return next((entry for entry in list_profiles() if entry["id"] == profile_id), None)
+
+
+def prune_profiles() -> None:
+    """删除最新 PROFILING_KEEP 个之外的分析结果（每次保存结果后调用）"""
+    for entry in list_profiles()[settings.profiling_keep:]:
+        for profile_format in entry["formats"]:
+            try:
+                os.remove(profile_path(entry["id"], profile_format))
+            except FileNotFoundError:
+                pass
+
+
+class RequestProfilerMiddleware:
+    """带有效 X-Profile-Token 头的请求以cProfile运行（ASGI中间件）
+
+    cProfile同一时刻只能有一个，已有请求在分析时后来的请求照常处理，响应头 X-Profile-Id 为 busy。
+    分析期间事件循环上其他请求的协程同样被计入，X-Profile-Concurrent 为这期间（到响应头发出时）
+    同时处理的其他请求数，非0时结果混有其他请求的开销，宜在空闲时重新分析。
+    """
+
+    _lock = threading.Lock()
+    _in_flight = 0                            # 正在处理的请求数
+    _concurrent: Optional[List[int]] = None   # 正在分析时：期间同时处理的其他请求数
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        cls = type(self)
+        cls._in_flight += 1
+        if cls._concurrent is not None:
+            cls._concurrent[0] += 1
+        try:
+            await self._dispatch(scope, receive, send)
+        finally:
+            cls._in_flight -= 1
+
+    async def _dispatch(self, scope, receive, send):
+        if scope["path"].startswith(_EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(PROFILE_TOKEN_HEADER.encode())
+        if token is None or not verify_profile_token(token.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, self._with_headers(send, {"x-profile-id": "busy"}))
+            return
+
+        cls = type(self)
+        profile_id = _new_profile_id("request")
+        profiler = cProfile.Profile()
+        concurrent = cls._concurrent = [cls._in_flight - 1]
+        stopped = False
+
+        def stop():
+            nonlocal stopped
+            if not stopped:
+                stopped = True
+                profiler.disable()
+                cls._concurrent = None
+                try:
+                    os.makedirs(settings.profiling_dir, exist_ok=True)
+                    profiler.dump_stats(profile_path(profile_id, "pstats"))
+                    prune_profiles()
+                finally:
+                    self._lock.release()
+
+        send_with_headers = self._with_headers(
+            send, {"x-profile-id": profile_id, "x-profile-concurrent": lambda: str(concurrent[0])}
+        )
+
+        async def send_wrapper(message):
+            await send_with_headers(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                stop()
+
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop()
+
+    @staticmethod
+    def _with_headers(send, headers: Dict[str, Any]):
+        """在响应头中追加 headers；值为函数时在响应头发出时取值"""
+        async def wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.encode(), (value() if callable(value) else value).encode()) for name, value in headers.items()
+                ]
+            await send(message)
+        return wrapper
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProcessSampler:
+    """限定时长的进程调用栈采样，同一时刻只运行一个"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current: Optional[Dict[str, Any]] = None
+
+    def start(self, seconds: float, interval: float, memory: bool = False) -> Dict[str, Any]:
+        """在后台线程中开始采样，已有采样在运行时抛出 RuntimeError"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有采样正在运行")
+        self.current = {
+            "id": _new_profile_id("sampler"),
+            "seconds": seconds,
+            "interval": interval,
+            "memory": memory,
+            "started_at": datetime.utcnow(),
+            "running": True,
+        }
+        threading.Thread(target=self._run, args=(dict(self.current),), daemon=True, name="profiling-sampler").start()
+        return dict(self.current)
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        return dict(self.current) if self.current else None
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        own_thread = threading.get_ident()
+        names = {}
+        stacks: Counter = Counter()
+        started_tracemalloc = job["memory"] and not tracemalloc.is_tracing()
+        try:
+            if started_tracemalloc:
+                tracemalloc.start(25)
+            deadline = time.monotonic() + job["seconds"]
+            while time.monotonic() < deadline:
+                names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(labels))] += 1
+                time.sleep(job["interval"])
+
+            os.makedirs(settings.profiling_dir, exist_ok=True)
+            with open(profile_path(job["id"], "collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            if job["memory"]:
+                # 排除采样自身（调用栈计数）的分配
+                snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+                snapshot.dump(profile_path(job["id"], "tracemalloc"))
+                with open(profile_path(job["id"], "memory"), "w", encoding="utf-8") as f:
+                    for stat in snapshot.statistics("lineno")[:50]:
+                        f.write(f"{stat}\n")
+            prune_profiles()
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self.current = {**job, "running": False, "finished_at": datetime.utcnow()}
+            self._lock.release()
+
+
+process_sampler = ProcessSampler()
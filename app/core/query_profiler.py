@@ -0,0 +1,142 @@
+"""
+请求级SQL分析
+
+通过 before/after_cursor_execute 事件统计每个请求的查询次数和数据库耗时，
+同一语句形态（参数占位后的SQL）重复执行达到阈值时标记为N+1。
+debug 开启时结果写入响应头，慢请求和N+1记录到日志。
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+# IN (?, ?, ...) 展开后的参数个数不同也视为同一形态
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|:\w+|\$\d+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """归一化SQL语句，用于判断是否为同一查询形态"""
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryProfile:
+    """一个请求内执行的SQL统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            self.shapes[shape] += 1
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """重复执行次数达到阈值的语句形态（疑似N+1），按次数降序"""
+        threshold = threshold or settings.query_n_plus_one_threshold
+        with self._lock:
+            return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def current_profile() -> Optional[QueryProfile]:
+    """当前请求的SQL统计（不在请求中时为None）"""
+    return _current_profile.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_profile.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    started = getattr(context, "_query_started", None)
+    if profile is not None and started is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def profile_engine(engine: Engine) -> None:
+    """在引擎上启用查询统计（重复调用无副作用）"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryProfilerMiddleware:
+    """统计每个HTTP请求的SQL查询（ASGI中间件）
+
+    debug 开启时在响应头输出 X-DB-Query-Count、X-DB-Query-Time-Ms、X-DB-N-Plus-One
+    和 Server-Timing；请求耗时超过 slow_request_ms 或出现N+1时记录警告日志。
+    统计截止到响应体发送完毕，不含之后执行的后台任务。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        finished = False
+
+        async def send_wrapper(message):
+            nonlocal finished
+            if message["type"] == "http.response.start" and settings.debug:
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + self._headers(profile)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not finished:
+                finished = True
+                self._log(scope, profile, time.perf_counter() - started)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+
+    @staticmethod
+    def _headers(profile: QueryProfile) -> List[Tuple[bytes, bytes]]:
+        db_ms = profile.total_time * 1000
+        headers: Dict[str, str] = {
+            "x-db-query-count": str(profile.count),
+            "x-db-query-time-ms": f"{db_ms:.1f}",
+            "x-db-n-plus-one": str(len(profile.repeated())),
+            "server-timing": f'db;dur={db_ms:.1f};desc="{profile.count} queries"',
+        }
+        return [(name.encode(), value.encode()) for name, value in headers.items()]
+
+    @staticmethod
+    def _log(scope, profile: QueryProfile, elapsed: float) -> None:
+        repeated = profile.repeated()
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < settings.slow_request_ms and not repeated:
+            return
+
+        logger.warning(
+            "%s %s %s: %.0f ms, %d queries, %.0f ms in DB",
+            "Slow request" if elapsed_ms >= settings.slow_request_ms else "N+1 queries in",
+            scope["method"], scope["path"], elapsed_ms, profile.count, profile.total_time * 1000
+        )
+        for shape, count in repeated:
+            logger.warning("  N+1: %d x %s", count, shape[:500])
@@ -1,3 +1,4 @@
+import hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
@@ -36,3 +37,8 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+def hash_cdkey(content: str) -> str:
+    """CDKEY内容的定长哈希（SHA-256十六进制），用于唯一索引去重"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
@@ -0,0 +1,47 @@
+"""
+JSON序列化
+
+统一使用orjson输出JSON：原生支持datetime、date、UUID和Enum，
+Pydantic模型通过 model_dump_json 直接由pydantic-core序列化。
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """orjson无法原生处理的类型"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "_mapping"):  # SQLAlchemy Row
+        return dict(obj._mapping)
+    if hasattr(obj, "keys") and hasattr(obj, "__getitem__"):  # SQLAlchemy RowMapping
+        return dict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为JSON字节串"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump_json().encode()
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps_str(obj: Any) -> str:
+    """序列化为JSON字符串（用于写入Text列）"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump_json()
+    return dumps(obj).decode()
+
+
+class FastJSONResponse(JSONResponse):
+    """基于orjson的JSON响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
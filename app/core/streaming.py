@@ -0,0 +1,281 @@
+"""
+流式导入导出
+
+导出：查询结果通过 yield_per 分批读取，逐行编码为CSV或NDJSON交给StreamingResponse；
+导入：上传的请求体按块解压、解码并切分为行，先写入临时文件再入库。内存占用均与数据量无关。
+"""
+import codecs
+import csv
+import io
+import tempfile
+import zlib
+from datetime import datetime
+from typing import IO, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.core.serialization import dumps
+from app.db.database import ReadSessionLocal
+
+EXPORT_MEDIA_TYPES: Dict[str, str] = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "txt": "text/plain; charset=utf-8",
+}
+
+# 每批从数据库读取的行数
+STREAM_BATCH_SIZE = 1000
+
+# 每累积多少行输出一个响应块
+FLUSH_ROWS = 500
+
+
+def iter_rows(stmt: Select, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Mapping[str, Any]]:
+    """在独立会话中分批迭代查询结果
+
+    响应体在请求依赖清理之后仍可能继续迭代，因此不复用请求的会话。
+    """
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            yield row
+    finally:
+        db.close()
+
+
+def enrich_rows(rows: Iterable[Mapping[str, Any]], enrich: Callable[[Any, List[Dict[str, Any]]], None],
+                batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """按批补充行数据（如到另一个库查询关联字段），enrich(会话, 一批行) 原地修改这批行"""
+    db = ReadSessionLocal()
+    try:
+        batch: List[Dict[str, Any]] = []
+        for row in rows:
+            batch.append(dict(row))
+            if len(batch) >= batch_size:
+                enrich(db, batch)
+                yield from batch
+                batch = []
+        if batch:
+            enrich(db, batch)
+            yield from batch
+    finally:
+        db.close()
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None:
+        return ""
+    return value
+
+
+def encode_csv(columns: List[str], rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    """把行编码为CSV（首行为表头）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 1
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        pending += 1
+        if pending >= FLUSH_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode()
+
+
+def _chunked(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """把逐行输出合并为较大的响应块"""
+    chunk: List[bytes] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= FLUSH_ROWS:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
+def encode_ndjson(rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    """把行编码为NDJSON（每行一个JSON对象）"""
+    return _chunked(dumps(dict(row)) + b"\n" for row in rows)
+
+
+def encode_lines(column: str, rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    """每行输出单个字段的值（纯文本，一行一个）"""
+    return _chunked(f"{row[column]}\n".encode() for row in rows)
+
+
+def export_response(stmt: Select, export_format: str, filename: str, columns: Optional[List[str]] = None,
+                    enrich: Optional[Callable[[Any, List[Dict[str, Any]]], None]] = None) -> StreamingResponse:
+    """以CSV、NDJSON或纯文本（仅第一列）流式返回查询结果
+
+    columns 为输出列（默认为查询的列），enrich 见 enrich_rows。
+    """
+    rows = iter_rows(stmt)
+    if enrich:
+        rows = enrich_rows(rows, enrich)
+    columns = columns or [column.key for column in stmt.selected_columns]
+    if export_format == "csv":
+        body = encode_csv(columns, rows)
+    elif export_format == "txt":
+        body = encode_lines(columns[0], rows)
+    else:
+        body = encode_ndjson(rows)
+
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# 每次解压输出的最大字节数，防止压缩炸弹一次性占满内存
+DECOMPRESS_CHUNK_SIZE = 1 << 20
+
+# 单行最大长度（字节），超过视为非法文件
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """上传内容超过大小或行数限制"""
+
+
+async def _limited(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """请求体超过 max_bytes 时中止"""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f"上传内容超过 {max_bytes} 字节")
+        yield chunk
+
+
+def _gunzip():
+    return zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+
+async def _decompressed(chunks: AsyncIterator[bytes], max_bytes: Optional[int] = None) -> AsyncIterator[bytes]:
+    """按首个数据块的魔数识别gzip并增量解压，否则原样输出
+
+    多个gzip成员依次拼接（如 cat a.gz b.gz）时逐个解压；成员之后不是gzip数据时报错。
+    max_bytes 限制输出（解压后）的总字节数，压缩炸弹在解压到上限时即中止。
+    """
+    total = 0
+
+    def counted(data: bytes) -> bytes:
+        nonlocal total
+        total += len(data)
+        if max_bytes is not None and total > max_bytes:
+            raise UploadTooLarge(f"解压后的内容超过 {max_bytes} 字节")
+        return data
+
+    decompressor = None
+    fed = False  # 当前成员是否已输入数据
+    head = b""   # 凑够魔数长度之前的开头数据
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if decompressor is None:
+                head += chunk
+                if len(head) < len(GZIP_MAGIC):
+                    continue
+                chunk, head = head, b""
+                if not chunk.startswith(GZIP_MAGIC):
+                    yield counted(chunk)
+                    async for rest in chunks:
+                        yield counted(rest)
+                    return
+                decompressor = _gunzip()
+
+            while chunk:
+                fed = True
+                yield counted(decompressor.decompress(chunk, DECOMPRESS_CHUNK_SIZE))
+                while decompressor.unconsumed_tail:
+                    yield counted(decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK_SIZE))
+                chunk = b""
+                if decompressor.eof:
+                    # 本成员结束，剩余的数据属于下一个成员
+                    chunk = decompressor.unused_data
+                    decompressor, fed = _gunzip(), False
+
+        if head:
+            yield counted(head)
+        if decompressor is not None:
+            yield counted(decompressor.flush())
+            if fed and not decompressor.eof:
+                raise ValueError("gzip数据不完整")
+    except zlib.error:
+        raise ValueError("gzip数据无效")
+
+
+async def iter_upload_lines(
+    chunks: AsyncIterator[bytes],
+    max_bytes: Optional[int] = None,
+    max_decompressed_bytes: Optional[int] = None,
+    max_lines: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """把上传的请求体（纯文本或gzip，UTF-8）逐行输出，去除首尾空白并跳过空行
+
+    max_bytes 限制请求体（压缩时为压缩后）的大小，max_decompressed_bytes 限制解压后的大小，
+    max_lines 限制行数（空行同样计数）；超过时抛出 UploadTooLarge。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    count = 0
+    if max_bytes is not None:
+        chunks = _limited(chunks, max_bytes)
+
+    def counted(lines: List[str]) -> List[str]:
+        nonlocal count
+        count += len(lines)
+        if max_lines is not None and count > max_lines:
+            raise UploadTooLarge(f"上传内容超过 {max_lines} 行")
+        return lines
+
+    try:
+        async for data in _decompressed(chunks, max_decompressed_bytes):
+            text = pending + decoder.decode(data)
+            lines = text.splitlines()
+            # 最后一段可能是不完整的行，留到下一块
+            pending = lines.pop() if lines and not text.endswith(("\n", "\r")) else ""
+            if len(pending) > MAX_LINE_LENGTH:
+                raise ValueError(f"单行长度超过 {MAX_LINE_LENGTH} 字节")
+            for line in counted(lines):
+                line = line.strip()
+                if line:
+                    yield line
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ValueError("文件不是有效的UTF-8文本")
+
+    if pending.strip():
+        counted([pending])
+        yield pending.strip()
+
+
+async def spool_upload_lines(lines: AsyncIterator[str]) -> IO[str]:
+    """把上传的行完整接收到临时文件（每行一个），返回定位到开头的文件，由调用方关闭
+
+    入库前先收完上传，写事务不会因为等待慢速客户端而长时间持有写锁；
+    临时文件的大小由 iter_upload_lines 的解压后大小和行数限制约束。
+    """
+    spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+    try:
+        async for line in lines:
+            spool.write(line)
+            spool.write("\n")
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
@@ -0,0 +1,409 @@
+"""
+轻量级链路追踪
+
+每个HTTP请求为一条trace，API、服务方法（@traced）、LinuxDO调用和SQL语句各为一个span，
+字段结构与OpenTelemetry一致（traceId/spanId/parentSpanId、kind、纳秒时间戳、attributes、status），
+支持W3C traceparent请求头。
+
+请求结束时决定是否导出：按 tracing_sample_rate 随机采样，耗时超过 tracing_slow_ms 的请求总是导出，
+便于离线还原慢请求的关键路径。导出在后台线程中进行，导出器可插拔（默认写JSONL文件）。
+"""
+import functools
+import importlib
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# 单条trace最多保留的span数，超出的计入 dropped_spans
+MAX_SPANS_PER_TRACE = 2000
+
+# SQL语句属性的最大长度
+MAX_STATEMENT_LENGTH = 1000
+
+SPAN_KINDS = {
+    "internal": "SPAN_KIND_INTERNAL",
+    "server": "SPAN_KIND_SERVER",
+    "client": "SPAN_KIND_CLIENT",
+}
+
+
+class _Trace:
+    """一条trace中已结束的span"""
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped_spans = 0
+        self.closed = False
+
+    def add(self, span: "Span") -> None:
+        if self.closed:
+            return
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return
+        self.spans.append(span)
+
+
+class Span:
+    """一次计时的操作"""
+
+    def __init__(self, trace: _Trace, name: str, kind: str = "internal", parent: Optional["Span"] = None,
+                 parent_span_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else parent_span_id
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status_code = "STATUS_CODE_UNSET"
+        self.status_message: Optional[str] = None
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status_code = "STATUS_CODE_ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            self.trace.add(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """OTLP JSON形式（attributes为扁平字典）"""
+        status: Dict[str, Any] = {"code": self.status_code}
+        if self.status_message:
+            status["message"] = self.status_message
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, SPAN_KINDS["internal"]),
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "attributes": self.attributes,
+            "status": status,
+            "resource": {"service.name": settings.app_name},
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """当前正在记录的span（不在trace中时为None）"""
+    span = _current_span.get()
+    if span is None or span.trace.closed:
+        return None
+    return span
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Span]]:
+    """在当前trace中开始一个子span；不在trace中时什么也不做（返回None）"""
+    parent = current_span()
+    if parent is None:
+        yield None
+        return
+
+    span = Span(parent.trace, name, kind, parent=parent, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def traced(cls):
+    """类装饰器：类中定义的每个方法（含私有方法）在trace中以 类名.方法名 记录为span"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("__") or not inspect.isfunction(attr):
+            continue
+        if inspect.isgeneratorfunction(attr) or inspect.isasyncgenfunction(attr):
+            continue
+        setattr(cls, name, _traced_function(attr, f"{cls.__name__}.{name}"))
+    return cls
+
+
+def _traced_function(func: Callable, span_name: str) -> Callable:
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if current_span() is None:
+                return await func(*args, **kwargs)
+            with start_span(span_name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if current_span() is None:
+            return func(*args, **kwargs)
+        with start_span(span_name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+# 导出
+
+class JSONLExporter:
+    """每个span一行JSON，追加写入文件"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.tracing_file
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.writelines(dumps(span) + b"\n" for span in spans)
+
+
+class LogExporter:
+    """按开始时间输出trace中每个span的缩进树和耗时（日志）"""
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        children: Dict[str, List[Dict[str, Any]]] = {}
+        span_ids = {span["spanId"] for span in spans}
+        for span in sorted(spans, key=lambda item: item["startTimeUnixNano"]):
+            parent = span["parentSpanId"] if span["parentSpanId"] in span_ids else ""
+            children.setdefault(parent, []).append(span)
+
+        lines: List[str] = []
+
+        def walk(parent: str, depth: int) -> None:
+            for span in children.get(parent, []):
+                duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+                error = " ERROR" if span["status"]["code"] == "STATUS_CODE_ERROR" else ""
+                lines.append(f"{'  ' * depth}{span['name']} {duration:.1f} ms{error}")
+                walk(span["spanId"], depth + 1)
+
+        walk("", 0)
+        logger.info("trace %s\n%s", spans[0]["traceId"] if spans else "", "\n".join(lines))
+
+
+EXPORTERS: Dict[str, Callable[[], Any]] = {
+    "jsonl": JSONLExporter,
+    "log": LogExporter,
+}
+
+
+def load_exporters(names: str) -> List[Any]:
+    """按配置创建导出器：内置名称（jsonl、log）或 "模块路径:工厂" 形式的自定义导出器，逗号分隔"""
+    exporters = []
+    for name in (item.strip() for item in names.split(",")):
+        if not name:
+            continue
+        if name in EXPORTERS:
+            exporters.append(EXPORTERS[name]())
+        else:
+            module_name, _, attr = name.partition(":")
+            exporters.append(getattr(importlib.import_module(module_name), attr)())
+    return exporters
+
+
+class _ExportWorker:
+    """在后台线程中调用导出器，请求路径上只做入队"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=1000)
+        self._exporters: Optional[List[Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans: List[Dict[str, Any]]) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._exporters = load_exporters(settings.tracing_exporters)
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="trace-exporter")
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            logger.warning("Trace export queue is full, dropping trace %s", spans[0]["traceId"])
+
+    def _run(self) -> None:
+        while True:
+            spans = self._queue.get()
+            for exporter in self._exporters:
+                try:
+                    exporter.export(spans)
+                except Exception:
+                    logger.exception("Trace exporter %s failed", type(exporter).__name__)
+
+
+_export_worker = _ExportWorker()
+
+
+def _finish_trace(root: Span) -> None:
+    trace = root.trace
+    trace.closed = True
+    if not trace.sampled and root.duration_ms < settings.tracing_slow_ms:
+        return
+    if trace.dropped_spans:
+        root.set_attribute("trace.dropped_spans", trace.dropped_spans)
+    _export_worker.submit([span.to_dict() for span in trace.spans])
+
+
+def _parse_traceparent(value: Optional[bytes]):
+    """W3C traceparent: 版本-trace_id-parent_id-flags"""
+    if not value:
+        return None
+    parts = value.decode("latin-1").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, parent_id, flags = parts[1], parts[2], parts[3]
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, flags.endswith(("1", "3", "5", "7", "9", "b", "d", "f"))
+
+
+class TracingMiddleware:
+    """为每个HTTP请求创建根span（ASGI中间件），响应头 X-Trace-Id 为trace ID
+
+    上游通过 traceparent 传入已采样的trace时总是导出。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        from app.core.metrics import route_label
+
+        parent = _parse_traceparent(dict(scope["headers"]).get(b"traceparent"))
+        if parent:
+            trace_id, parent_span_id, upstream_sampled = parent
+        else:
+            trace_id, parent_span_id, upstream_sampled = os.urandom(16).hex(), None, False
+        sampled = upstream_sampled or random.random() < settings.tracing_sample_rate
+
+        trace = _Trace(trace_id, sampled)
+        root = Span(trace, f"{scope['method']} {scope['path']}", "server", parent_span_id=parent_span_id, attributes={
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status_code = "STATUS_CODE_ERROR"
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.record_exception(e)
+            raise
+        finally:
+            route = route_label(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set_attribute("http.route", route)
+            _current_span.reset(token)
+            root.end()
+            _finish_trace(root)
+
+
+# 数据库
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = current_span()
+    if parent is None or context is None:
+        return
+    context._trace_span = Span(parent.trace, "db.query", "client", parent=parent, attributes={
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:MAX_STATEMENT_LENGTH],
+        "db.executemany": bool(executemany),
+    })
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rowcount", cursor.rowcount)
+        span.end()
+
+
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+
+def trace_engine(engine: Engine) -> None:
+    """为引擎上的SQL语句记录span（重复调用无副作用）"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# 会话提交（flush + COMMIT），在写锁竞争时可能是慢请求的主要耗时
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    parent = current_span()
+    if parent is not None:
+        session.info["_trace_commit_span"] = Span(parent.trace, "db.commit", "client", parent=parent)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    span = session.info.pop("_trace_commit_span", None)
+    if span is not None:
+        span.end()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    span = session.info.pop("_trace_commit_span", None)
+    if span is not None:
+        span.status_code = "STATUS_CODE_ERROR"
+        span.status_message = "rolled back"
+        span.end()
@@ -1,14 +1,172 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData, Table
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from typing import List, Optional
 from app.core.config import settings
+from app.db.pool import InstrumentedQueuePool, instrument_engine
+from app.models.models import Base as ModelBase, BenefitClaim, BenefitCDKey
 
-engine = create_engine(
-    settings.database_url, 
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def sqlite_pragmas() -> dict:
+    """每个SQLite连接上设置的PRAGMA"""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "cache_size": settings.sqlite_cache_size,
+        "mmap_size": settings.sqlite_mmap_size,
+        "temp_store": settings.sqlite_temp_store,
+    }
+
+
+def pool_options(url: str) -> dict:
+    """连接池参数；内存SQLite库使用SQLAlchemy默认的单连接池，不适用"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def create_db_engine(url: str, pragmas: dict = None, begin: str = None, **kwargs) -> Engine:
+    """创建数据库引擎，SQLite时在每个新连接上应用PRAGMA
+
+    连接池参数取自 settings，kwargs 可覆盖。
+    begin="IMMEDIATE" 时事务开启即获取写锁，避免读事务升级为写事务时的锁冲突
+    （busy_timeout对这种冲突无效）；默认由驱动隐式开启事务。
+    """
+    kwargs = {**pool_options(url), **kwargs}
+    if not url.startswith("sqlite"):
+        return create_engine(url, **kwargs)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+        if begin:
+            # 由下面的begin事件自行发出BEGIN
+            dbapi_connection.isolation_level = None
+
+    if begin:
+        @event.listens_for(engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql(f"BEGIN {begin}")
+
+    return engine
+
+
+def _create_write_engine(url: str, default: Engine) -> Engine:
+    """写引擎：SQLite下为单连接池，让进程内的写事务排队执行，不再争抢写锁"""
+    if settings.sqlite_single_writer and url.startswith("sqlite"):
+        return create_db_engine(
+            url,
+            begin="IMMEDIATE",
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=max(settings.sqlite_busy_timeout / 1000, 1)
+        )
+    return default
+
+
+def _create_read_engine(url: str, read_url: Optional[str], default: Engine) -> Engine:
+    """只读查询使用的引擎：配置的只读副本，或SQLite同一文件上的只读连接"""
+    if read_url:
+        return create_db_engine(read_url)
+    if url.startswith("sqlite"):
+        # WAL下读连接不阻塞写入；query_only 防止误写
+        pragmas = {name: value for name, value in sqlite_pragmas().items() if name != "journal_mode"}
+        pragmas["query_only"] = "ON"
+        return create_db_engine(url, pragmas=pragmas)
+    return default
+
+
+# 目录库：用户、福利、黑名单、统计
+engine = create_db_engine(settings.database_url)
+write_engine = _create_write_engine(settings.database_url, engine)
+read_engine = _create_read_engine(settings.database_url, settings.database_read_url, engine)
+
+# 领取库：领取记录和CDKEY（写热点），未配置 claims_database_url 时与目录库相同
+CLAIMS_STORE_MODELS = (BenefitClaim, BenefitCDKey)
+
+if settings.claims_database_url:
+    claims_engine = create_db_engine(settings.claims_database_url)
+    claims_write_engine = _create_write_engine(settings.claims_database_url, claims_engine)
+    claims_read_engine = _create_read_engine(settings.claims_database_url, settings.claims_database_read_url, claims_engine)
+else:
+    claims_engine, claims_write_engine, claims_read_engine = engine, write_engine, read_engine
+
+# 连接池指标（/health/pool）
+instrument_engine("catalog", engine)
+instrument_engine("catalog_write", write_engine)
+instrument_engine("catalog_read", read_engine)
+instrument_engine("claims", claims_engine)
+instrument_engine("claims_write", claims_write_engine)
+instrument_engine("claims_read", claims_read_engine)
+
+
+def all_engines() -> List[Engine]:
+    """所有不重复的引擎"""
+    engines = []
+    for db_engine in (engine, write_engine, read_engine, claims_engine, claims_write_engine, claims_read_engine):
+        if db_engine not in engines:
+            engines.append(db_engine)
+    return engines
+
+
+def _sessionmaker(catalog: Engine, claims: Engine) -> sessionmaker:
+    """按模型路由连接的会话工厂：领取库的模型使用claims，其余使用catalog"""
+    binds = {model: claims for model in CLAIMS_STORE_MODELS} if claims is not catalog else None
+    return sessionmaker(autocommit=False, autoflush=False, bind=catalog, binds=binds)
+
+
+SessionLocal = _sessionmaker(engine, claims_engine)
+WriteSessionLocal = _sessionmaker(write_engine, claims_write_engine)
+ReadSessionLocal = _sessionmaker(read_engine, claims_read_engine)
+
+
+def create_tables() -> None:
+    """建表：领取库独立时，两类表分别建在各自的数据库中"""
+    if claims_engine is engine:
+        ModelBase.metadata.create_all(bind=engine)
+        return
+
+    claims_tables = [model.__table__ for model in CLAIMS_STORE_MODELS]
+    catalog_tables = [table for table in ModelBase.metadata.sorted_tables if table not in claims_tables]
+    ModelBase.metadata.create_all(bind=engine, tables=catalog_tables)
+    claims_store_metadata().create_all(bind=claims_engine)
+
+
+def claims_store_metadata() -> MetaData:
+    """领取库中的表结构：去掉引用目录库表（用户、福利）的外键
+
+    跨库的外键无法约束，SQLite开启外键检查时还会因引用的表不存在而拒绝写入；
+    模型上的 ForeignKey 保持不变，ORM关联仍按它连接。
+    """
+    claims_names = {model.__tablename__ for model in CLAIMS_STORE_MODELS}
+    metadata = MetaData()
+    for model in CLAIMS_STORE_MODELS:
+        table: Table = model.__table__.to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            if any(element.target_fullname.split(".")[0] not in claims_names for element in constraint.elements):
+                table.constraints.discard(constraint)
+                for element in constraint.elements:
+                    table.foreign_keys.discard(element)
+                    element.parent.foreign_keys.discard(element)
+    return metadata
+
 
 Base = declarative_base()
 metadata = MetaData()
@@ -20,3 +178,51 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def release_connection(db: Session) -> None:
+    """结束会话中只读的事务，把连接还给连接池，已加载的对象仍可使用
+
+    在await远程接口之前调用：同步的连接签出会阻塞事件循环，
+    若等待远程响应的请求占满连接池，新请求的签出会卡住整个进程。
+    """
+    if db.in_transaction() and not (db.new or db.dirty or db.deleted):
+        expire_on_commit = db.expire_on_commit
+        db.expire_on_commit = False
+        try:
+            db.commit()
+        finally:
+            db.expire_on_commit = expire_on_commit
+
+
+def get_write_db():
+    """写会话（用于先读后写的接口）
+
+    SQLite下事务以 BEGIN IMMEDIATE 开启并经单个写连接排队，读写之间不会因为其他连接
+    提交而失败（延迟事务升级为写事务时的 SQLITE_BUSY_SNAPSHOT 不受 busy_timeout 重试）。
+    """
+    db = WriteSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# 数据库繁忙：等待连接池超时，或SQLite等待写锁超时
+DATABASE_BUSY_ERRORS = (PoolTimeoutError, OperationalError)
+
+
+def is_database_busy(exc: Exception) -> bool:
+    """是否为可稍后重试的数据库繁忙错误"""
+    if isinstance(exc, PoolTimeoutError):
+        return True
+    return isinstance(exc, OperationalError) and "database is locked" in str(exc.orig)
+
+
+def get_read_db():
+    """只读会话（用于不写数据库的查询接口）"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
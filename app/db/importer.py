@@ -0,0 +1,343 @@
+"""
+福利批量导入
+
+逐行读取JSONL或CSV文件，每条记录为一个福利：字段同 BenefitCreate，另外可以有
+- creator_id / creator：创建者的用户ID或用户名（缺省时使用命令行指定的创建者）
+- cdkeys：内联的CDKEY列表（CSV中为一个单元格，每行一个）
+- cdkeys_file：CDKEY文件路径（相对导入文件所在目录，每行一个，支持 .gz），按块流式写入
+
+每 batch_size 条记录一个事务。每个事务提交后把已处理的记录数写入检查点文件，
+中断后再次运行从检查点继续；提交前在检查点中记下这一批插入的福利id，
+用来判断提交时中断的那一批是否已经写入。
+"""
+import csv
+import gzip
+import json
+import os
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.security import get_password_hash, hash_cdkey
+from app.db.bulk import bulk_insert
+from app.db.search import benefits_fts, fts_available
+from app.models.models import Benefit, BenefitCDKey, User
+from app.schemas.schemas import BenefitCreate
+from app.services.benefit_service import CDKEY_BATCH_SIZE, benefit_service
+
+# 记录中不属于 BenefitCreate 的字段
+EXTRA_FIELDS = ("creator_id", "creator", "cdkeys_file")
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+
+class ImportRecordError(ValueError):
+    """单条记录无效（跳过该记录，不中断导入）"""
+
+
+def detect_format(path: str) -> str:
+    """按扩展名判断文件格式（可带 .gz）"""
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def read_records(path: str, file_format: str) -> Iterator[Tuple[int, Any]]:
+    """逐条输出 (行号, 记录)；无法解析的行输出 (行号, ImportRecordError)"""
+    with _open_text(path) as f:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            line = reader.line_num
+            for row in reader:
+                # 空单元格视为未填写，使用默认值
+                yield line + 1, {key: value for key, value in row.items() if key and value not in (None, "")}
+                line = reader.line_num
+            return
+
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line, ImportRecordError(f"JSON解析失败: {e}")
+                continue
+            if not isinstance(record, dict):
+                record = ImportRecordError("每行必须是一个JSON对象")
+            yield line, record
+
+
+def iter_cdkey_file(path: str) -> Iterator[str]:
+    """逐行读取CDKEY文件"""
+    with _open_text(path) as f:
+        for text in f:
+            yield text
+
+
+def _cdkey_source(record: Dict[str, Any], base_dir: str) -> Optional[Callable[[], Iterator[str]]]:
+    """CDKEY来源：内联列表或引用的文件（写入时才打开）"""
+    cdkeys = record.get("cdkeys")
+    if isinstance(cdkeys, str):
+        cdkeys = cdkeys.splitlines()
+    cdkeys_file = record.get("cdkeys_file")
+    if cdkeys and cdkeys_file:
+        raise ImportRecordError("cdkeys 和 cdkeys_file 只能指定一个")
+    if cdkeys_file:
+        path = os.path.join(base_dir, cdkeys_file)
+        if not os.path.isfile(path):
+            raise ImportRecordError(f"CDKEY文件不存在: {cdkeys_file}")
+        return lambda: iter_cdkey_file(path)
+    if cdkeys:
+        return lambda: iter(cdkeys)
+    return None
+
+
+def parse_record(record: Dict[str, Any], base_dir: str) -> Tuple[BenefitCreate, Any, Optional[Callable[[], Iterator[str]]]]:
+    """校验一条记录，返回 (福利数据, 创建者ID或用户名, CDKEY来源)"""
+    source = _cdkey_source(record, base_dir)
+    fields = {key: value for key, value in record.items() if key not in EXTRA_FIELDS and key != "cdkeys"}
+    try:
+        benefit_data = BenefitCreate(**fields)
+    except ValidationError as e:
+        raise ImportRecordError("; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+        ))
+    if source and benefit_data.benefit_type != "cdkey":
+        raise ImportRecordError("只有cdkey类型的福利可以导入CDKEY")
+
+    creator = record.get("creator_id", record.get("creator"))
+    if "creator_id" in record:
+        try:
+            creator = int(creator)
+        except (TypeError, ValueError):
+            raise ImportRecordError(f"creator_id 不是整数: {creator}")
+    return benefit_data, creator, source
+
+
+def resolve_creators(db: Session, creators: Sequence[Any]) -> Dict[Any, int]:
+    """把一批记录的创建者（用户ID或用户名）映射为存在的用户ID"""
+    ids = {creator for creator in creators if isinstance(creator, int)}
+    usernames = {creator for creator in creators if isinstance(creator, str)}
+    resolved: Dict[Any, int] = {}
+    if ids:
+        resolved.update((user_id, user_id) for user_id in db.execute(select(User.id).where(User.id.in_(ids))).scalars())
+    if usernames:
+        # 同名用户取最早注册的
+        for user_id, username in db.execute(
+            select(User.id, User.username).where(User.username.in_(usernames)).order_by(User.id.desc())
+        ):
+            resolved[username] = user_id
+    return resolved
+
+
+class Checkpoint:
+    """检查点文件：已处理的记录数和累计结果，pending 为正在提交的那一批"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict[str, Any] = {"records": 0, "benefits": 0, "cdkeys": 0, "failed": 0, "pending": None}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state.update(json.load(f))
+
+    def save(self) -> None:
+        # 先写临时文件再替换，中断时不会留下半个文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def recover(self, db: Session) -> None:
+        """上次在提交时中断：按批次记下的福利id判断那一批是否已写入
+
+        pending 中 benefit_ids 为这一批插入的福利（最后一个同时核对标题，防止回滚后id被复用），
+        cdkey_benefit_id 为最后一个导入了CDKEY的福利。领取库独立时福利和CDKEY分别提交，
+        只有一边写入时删除已写入的部分，整批重新处理。
+        """
+        pending = self.state.get("pending")
+        if not pending:
+            return
+        benefit_ids = pending.get("benefit_ids") or []
+        # 没有写入福利的批次（全部无效）重新处理也不会产生数据，视为已提交
+        committed = True
+        if benefit_ids:
+            catalog = db.execute(
+                select(Benefit.id).where(Benefit.id == benefit_ids[-1], Benefit.title == pending["title"])
+                .execution_options(include_deleted=True)
+            ).first() is not None
+            cdkey_benefit_id = pending.get("cdkey_benefit_id")
+            claims = catalog if cdkey_benefit_id is None else db.execute(
+                select(BenefitCDKey.id).where(BenefitCDKey.benefit_id == cdkey_benefit_id).limit(1)
+            ).first() is not None
+            if catalog != claims:
+                discard_batch(db, benefit_ids)
+            committed = catalog and claims
+        if committed:
+            for key in ("records", "benefits", "cdkeys", "failed"):
+                self.state[key] = pending[key]
+        self.state["pending"] = None
+        self.save()
+
+
+def discard_batch(db: Session, benefit_ids: List[int]) -> None:
+    """删除只写入了一半的批次（福利、CDKEY、检索索引）并重算创建者统计，随后提交"""
+    benefits = Benefit.__table__
+    creators = db.execute(
+        select(benefits.c.creator_id).where(benefits.c.id.in_(benefit_ids)).distinct()
+    ).scalars().all()
+    cdkeys = BenefitCDKey.__table__
+    db.execute(cdkeys.delete().where(cdkeys.c.benefit_id.in_(benefit_ids)))
+    if fts_available(db):
+        db.execute(benefits_fts.delete().where(benefits_fts.c.rowid.in_(benefit_ids)))
+    db.execute(benefits.delete().where(benefits.c.id.in_(benefit_ids)))
+    for creator_id in creators:
+        benefit_service.rebuild_creator_stats(db, creator_id)
+    db.commit()
+
+
+def _insert_cdkeys(db: Session, benefit_id: int, cdkeys: Iterator[str], now: datetime) -> int:
+    """按块写入一个福利的CDKEY，跳过空行和重复内容，返回写入数"""
+    added = 0
+    rows: List[Tuple[int, str, str]] = []
+    for cdkey in cdkeys:
+        content = cdkey.strip()
+        if not content:
+            continue
+        rows.append((benefit_id, content, hash_cdkey(content)))
+        if len(rows) >= CDKEY_BATCH_SIZE:
+            added += bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"), rows,
+                                 ignore_conflicts=True, is_claimed=False, created_at=now)
+            rows = []
+    if rows:
+        added += bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"), rows,
+                             ignore_conflicts=True, is_claimed=False, created_at=now)
+    return added
+
+
+def import_batch(
+    db: Session, items: List[Tuple[int, BenefitCreate, int, Any]], hasher: Executor, now: datetime
+) -> Tuple[List[int], int, Optional[int]]:
+    """写入一批已校验的福利（不提交），创建时间均为 now
+
+    items 为 (行号, 福利数据, 创建者ID, CDKEY来源)。返回 (福利id列表, CDKEY数, 最后一个导入了CDKEY的福利id)。
+    """
+    rows = [benefit_data.model_dump(mode="json", exclude={"cdkeys"}) for _, benefit_data, _, _ in items]
+
+    # bcrypt较慢，在进程池中并行计算
+    private = [i for i, row in enumerate(rows) if row.get("access_password")]
+    for i, hashed in zip(private, hasher.map(get_password_hash, [rows[i]["access_password"] for i in private])):
+        rows[i]["access_password"] = hashed
+
+    for row, (_, _, creator_id, _) in zip(rows, items):
+        row.update(creator_id=creator_id, created_at=now, updated_at=now)
+    benefit_ids = list(db.execute(
+        insert(Benefit).returning(Benefit.id, sort_by_parameter_order=True), rows
+    ).scalars())
+
+    stock = []
+    for benefit_id, (_, _, _, source) in zip(benefit_ids, items):
+        if source:
+            stock.append({"_id": benefit_id, "_count": _insert_cdkeys(db, benefit_id, source(), now)})
+    if stock:
+        benefits = Benefit.__table__
+        db.execute(
+            update(benefits).where(benefits.c.id == bindparam("_id")).values(
+                total_cdkeys=bindparam("_count"), available_cdkeys=bindparam("_count")
+            ),
+            stock
+        )
+
+    if fts_available(db):
+        db.execute(benefits_fts.insert(), [
+            {"rowid": benefit_id, "title": row["title"], "description": row.get("description") or ""}
+            for benefit_id, row in zip(benefit_ids, rows)
+        ])
+    for creator_id in {creator_id for _, _, creator_id, _ in items}:
+        benefit_service.rebuild_creator_stats(db, creator_id)
+    cdkey_benefit_id = next((entry["_id"] for entry in reversed(stock) if entry["_count"]), None)
+    return benefit_ids, sum(entry["_count"] for entry in stock), cdkey_benefit_id
+
+
+def import_benefits(
+    db: Session,
+    path: str,
+    hasher: Executor,
+    file_format: Optional[str] = None,
+    default_creator: Any = None,
+    batch_size: int = 500,
+    checkpoint_path: Optional[str] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """导入福利文件，返回累计的 records、benefits、cdkeys、failed
+
+    无效的记录（校验失败、创建者不存在等）被跳过并通过 on_error(行号, 原因) 报告，计入 failed。
+    """
+    file_format = file_format or detect_format(path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    checkpoint = Checkpoint(checkpoint_path or f"{path}.checkpoint.json")
+    checkpoint.recover(db)
+    state = checkpoint.state
+    on_error = on_error or (lambda line, reason: None)
+
+    def commit_batch(batch: List[Tuple[int, BenefitCreate, Any, Any]], invalid: int, consumed: int) -> None:
+        resolved = resolve_creators(db, [creator for _, _, creator, _ in batch])
+        items = []
+        for line, benefit_data, creator, source in batch:
+            if creator in resolved:
+                items.append((line, benefit_data, resolved[creator], source))
+            else:
+                on_error(line, f"创建者不存在: {creator}")
+                invalid += 1
+        benefit_ids, cdkeys, cdkey_benefit_id = import_batch(db, items, hasher, datetime.utcnow()) if items else ([], 0, None)
+
+        done = {
+            "records": consumed, "benefits": state["benefits"] + len(benefit_ids),
+            "cdkeys": state["cdkeys"] + cdkeys, "failed": state["failed"] + invalid,
+        }
+        # 提交前记下这一批插入的福利，提交后才推进检查点
+        state["pending"] = {
+            **done, "benefit_ids": benefit_ids, "title": items[-1][1].title if items else None,
+            "cdkey_benefit_id": cdkey_benefit_id,
+        }
+        checkpoint.save()
+        db.commit()
+        state.update(done, pending=None)
+        checkpoint.save()
+        if progress:
+            progress(state)
+
+    batch: List[Tuple[int, BenefitCreate, Any, Any]] = []
+    invalid = 0
+    consumed = state["records"]
+    for index, (line, record) in enumerate(read_records(path, file_format), 1):
+        if index <= state["records"]:
+            continue
+        consumed = index
+        try:
+            if isinstance(record, ImportRecordError):
+                raise record
+            benefit_data, creator, source = parse_record(record, base_dir)
+            if creator is None:
+                if default_creator is None:
+                    raise ImportRecordError("未指定创建者")
+                creator = default_creator
+            batch.append((line, benefit_data, creator, source))
+        except ImportRecordError as e:
+            on_error(line, str(e))
+            invalid += 1
+        if len(batch) + invalid >= batch_size:
+            commit_batch(batch, invalid, consumed)
+            batch, invalid = [], 0
+    if consumed > state["records"]:
+        commit_batch(batch, invalid, consumed)
+    return {key: state[key] for key in ("records", "benefits", "cdkeys", "failed")}
@@ -0,0 +1,50 @@
+"""
+带指标的连接池
+
+在 QueuePool 的基础上记录每次签出连接的等待耗时和超时次数（见 app.core.metrics）。
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from app.core.metrics import PoolMetrics, pool_metrics
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录签出等待耗时的 QueuePool"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        if self.metrics:
+            self.metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # engine.dispose() 会用新池替换旧池，指标随之转移
+        pool = super().recreate()
+        if self.metrics:
+            pool.metrics = self.metrics
+            self.metrics.pool = pool
+        return pool
+
+
+def instrument_engine(name: str, engine: Engine) -> None:
+    """把引擎的连接池登记到名为 name 的指标下
+
+    非 InstrumentedQueuePool 时忽略；同一引擎以多个名称登记时保留第一个名称。
+    """
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool) and pool.metrics is None:
+        pool.metrics = pool_metrics(name)
+        pool.metrics.pool = pool
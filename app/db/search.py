@@ -0,0 +1,151 @@
+"""
+福利全文检索
+
+SQLite下使用FTS5虚拟表（trigram分词，支持中文子串匹配）索引福利标题和描述，
+按BM25排序；其他数据库引擎回退为LIKE匹配。
+"""
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, func, literal_column, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.models.models import Benefit
+
+logger = logging.getLogger(__name__)
+
+BENEFIT_FTS_TABLE = "benefits_fts"
+
+# trigram分词器的最短可匹配长度
+MIN_FTS_TERM_LENGTH = 3
+
+# 标题命中的权重高于描述
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# 独立的MetaData，避免被 Base.metadata.create_all 当作普通表创建
+benefits_fts = Table(
+    BENEFIT_FTS_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("title", Text),
+    Column("description", Text),
+)
+
+# 每个数据库是否已建好FTS索引表（按引擎URL缓存）
+_fts_ready: Dict[str, bool] = {}
+
+
+def _fts_table_exists(conn) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": BENEFIT_FTS_TABLE}
+    ).first() is not None
+
+
+def init_benefit_search(engine: Engine, rebuild: bool = False) -> bool:
+    """创建FTS索引表，首次创建或 rebuild=True 时从 benefits 表回填数据"""
+    if engine.dialect.name != "sqlite":
+        return False
+
+    with engine.begin() as conn:
+        created = False
+        if not _fts_table_exists(conn):
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {BENEFIT_FTS_TABLE} "
+                    "USING fts5(title, description, tokenize = 'trigram')"
+                ))
+            except OperationalError as e:
+                # SQLite版本过低（<3.34）或未编译FTS5，回退为LIKE检索
+                logger.warning("FTS5 unavailable, benefit search falls back to LIKE: %s", e)
+                _fts_ready[str(engine.url)] = False
+                return False
+            created = True
+
+        if created or rebuild:
+            conn.execute(text(f"DELETE FROM {BENEFIT_FTS_TABLE}"))
+            conn.execute(text(
+                f"INSERT INTO {BENEFIT_FTS_TABLE} (rowid, title, description) "
+                "SELECT id, title, COALESCE(description, '') FROM benefits"
+            ))
+
+    _fts_ready[str(engine.url)] = True
+    return True
+
+
+def fts_available(db: Session) -> bool:
+    """当前会话对应的数据库是否可以使用FTS检索"""
+    bind = db.get_bind(Benefit)
+    if bind.dialect.name != "sqlite":
+        return False
+
+    key = str(bind.url)
+    if key not in _fts_ready:
+        _fts_ready[key] = _fts_table_exists(db.connection(bind_arguments={"mapper": Benefit}))
+    return _fts_ready[key]
+
+
+def index_benefit(db: Session, benefit: Benefit) -> None:
+    """写入或刷新单个福利的索引（随调用方事务一起提交）"""
+    if not fts_available(db):
+        return
+    db.execute(benefits_fts.delete().where(benefits_fts.c.rowid == benefit.id))
+    db.execute(benefits_fts.insert().values(
+        rowid=benefit.id,
+        title=benefit.title,
+        description=benefit.description or ""
+    ))
+
+
+def unindex_benefit(db: Session, benefit_id: int) -> None:
+    """从索引中移除福利"""
+    if not fts_available(db):
+        return
+    db.execute(benefits_fts.delete().where(benefits_fts.c.rowid == benefit_id))
+
+
+def clear_benefit_index(db: Session) -> None:
+    """清空索引"""
+    if not fts_available(db):
+        return
+    db.execute(benefits_fts.delete())
+
+
+def _split_terms(q: str) -> List[str]:
+    return [term for term in q.split() if term]
+
+
+def build_match_expression(q: str) -> Optional[str]:
+    """把用户输入转换为FTS5 MATCH表达式，所有词都需命中；无法用trigram匹配时返回None"""
+    terms = _split_terms(q)
+    if not terms or any(len(term) < MIN_FTS_TERM_LENGTH for term in terms):
+        return None
+    # 每个词作为短语加引号，避免用户输入中的FTS语法字符
+    return " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def apply_benefit_search(db: Session, query: Select, q: str) -> Select:
+    """在福利查询上叠加检索条件和排序"""
+    match = build_match_expression(q) if fts_available(db) else None
+    if match:
+        fts_column = literal_column(BENEFIT_FTS_TABLE)
+        return query.join(benefits_fts, benefits_fts.c.rowid == Benefit.id).filter(
+            fts_column.op("MATCH")(match)
+        ).order_by(func.bm25(fts_column, TITLE_WEIGHT, DESCRIPTION_WEIGHT), Benefit.id.desc())
+
+    conditions = []
+    for term in _split_terms(q):
+        pattern = f"%{_escape_like(term)}%"
+        conditions.append(or_(
+            Benefit.title.ilike(pattern, escape="\\"),
+            Benefit.description.ilike(pattern, escape="\\")
+        ))
+    return query.filter(and_(*conditions)).order_by(Benefit.total_claims.desc(), Benefit.id.desc())
@@ -0,0 +1,227 @@
+"""
+性能测试用的合成数据
+
+按给定数量生成用户、福利（类型、模式、可见性混合）、CDKEY、领取记录和个人黑名单，
+分布带有真实的偏斜：少数热门福利占据大部分CDKEY和领取（齐夫分布），创建者的福利数为长尾分布。
+主键在生成时直接分配，所有数据以 bulk_insert 分块写入、每块一个事务；相同 seed 生成相同的数据。
+"""
+import itertools
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.security import get_password_hash, hash_cdkey
+from app.core.serialization import dumps_str
+from app.db.bulk import bulk_insert
+from app.models.models import Benefit, BenefitCDKey, BenefitClaim, PersonalBlacklist, User
+
+# 私有福利的访问密码（所有私有福利相同，只计算一次bcrypt）
+SYNTHETIC_PASSWORD = "synthetic"
+
+TITLE_PREFIXES = ("🎮 游戏", "📚 学习资料", "🎁 新人", "🔑 会员", "☁️ 云服务", "🤖 API额度", "🎵 音乐", "📺 视频会员")
+TITLE_SUFFIXES = ("CDKEY大放送", "福利包", "兑换码", "限时领取", "社区回馈", "周年庆", "抽奖补发", "邀请码")
+
+USER_COLUMNS = ("id", "linuxdo_id", "username", "name", "trust_level", "advanced_mode_agreed", "created_at")
+BENEFIT_COLUMNS = (
+    "id", "title", "description", "content", "benefit_type", "visibility", "access_password", "mode",
+    "min_trust_level", "min_likes_given", "min_topics_entered", "max_claims", "creator_id", "created_at",
+)
+CDKEY_COLUMNS = ("id", "benefit_id", "cdkey_content", "content_hash", "is_claimed", "claimed_by_user_id", "claimed_at", "created_at")
+CLAIM_COLUMNS = ("user_id", "benefit_id", "cdkey_id", "snapshot_data", "claimed_at")
+BLACKLIST_COLUMNS = ("creator_id", "blacklisted_username", "reason", "created_at")
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    """第 i 名的权重为 1 / i^exponent"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def allocate(total: int, weights: Sequence[float]) -> List[int]:
+    """按权重把 total 分配为整数（四舍五入，总和约等于 total）"""
+    weight_sum = sum(weights) or 1
+    return [round(total * weight / weight_sum) for weight in weights]
+
+
+def _next_id(db: Session, model: Any, column: str = "id") -> int:
+    stmt = select(func.max(getattr(model, column))).execution_options(include_deleted=True)
+    return (db.execute(stmt, bind_arguments={"mapper": model}).scalar() or 0) + 1
+
+
+class _ChunkedWriter:
+    """按模型缓存待写入的行，任一模型攒满 chunk_size 行时写入全部缓存并提交
+
+    tables 为 (模型, 列, 所有行相同的列值)，按外键依赖顺序给出，同一块内按此顺序写入。
+    """
+
+    def __init__(self, db: Session, chunk_size: int, progress: Callable[[str, int], None],
+                 tables: Sequence[Tuple[Any, Sequence[str], Dict[str, Any]]]):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.tables = tables
+        self.buffers: Dict[Any, List[Sequence[Any]]] = {model: [] for model, _, _ in tables}
+        self.written: Dict[str, int] = {}
+
+    def add(self, model: Any, row: Sequence[Any]) -> None:
+        buffer = self.buffers[model]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, model: Any, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            self.add(model, row)
+
+    def flush(self) -> None:
+        for model, columns, constants in self.tables:
+            rows = self.buffers[model]
+            if rows:
+                bulk_insert(self.db, model, columns, rows, **constants)
+                name = model.__tablename__
+                self.written[name] = self.written.get(name, 0) + len(rows)
+                self.progress(name, self.written[name])
+                rows.clear()
+        self.db.commit()
+
+
+def generate(
+    db: Session,
+    users: int = 100_000,
+    benefits: int = 10_000,
+    cdkeys: int = 1_000_000,
+    claims: int = 2_000_000,
+    blacklist: int = 20_000,
+    creator_ratio: float = 0.02,
+    seed: int = 42,
+    chunk_size: int = 50_000,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> Dict[str, int]:
+    """生成合成数据并返回各表写入的行数
+
+    claims 为目标值：单个福利的领取数不超过用户数、CDKEY数和 max_claims，实际数量可能略少。
+    计数字段（total_claims、库存、创建者统计）由调用方随后用 rebuild_all_stats 重建。
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # 计数字段先写0，由 rebuild_all_stats 重建
+    writer = _ChunkedWriter(db, chunk_size, progress or (lambda table, count: None), (
+        (User, USER_COLUMNS, {"is_active": True, "is_silenced": False, "is_globally_blacklisted": False, "updated_at": now}),
+        (Benefit, BENEFIT_COLUMNS, {
+            "is_active": True, "total_claims": 0, "total_cdkeys": 0, "available_cdkeys": 0, "updated_at": now
+        }),
+        (BenefitCDKey, CDKEY_COLUMNS, {}),
+        (BenefitClaim, CLAIM_COLUMNS, {}),
+        (PersonalBlacklist, BLACKLIST_COLUMNS, {}),
+    ))
+    year = timedelta(days=365).total_seconds()
+
+    def past(after: Optional[datetime] = None) -> datetime:
+        start = after or now - timedelta(days=365)
+        return start + timedelta(seconds=rng.uniform(0, (now - start).total_seconds()))
+
+    # 用户：新的ID和LinuxDO ID接在已有数据之后
+    first_user_id = _next_id(db, User)
+    first_linuxdo_id = _next_id(db, User, "linuxdo_id")
+    user_ids = list(range(first_user_id, first_user_id + users))
+    trust_levels = rng.choices(range(5), weights=(10, 40, 35, 12, 3), k=users)
+    writer.extend(User, (
+        (user_id, first_linuxdo_id + i, f"seed{first_linuxdo_id + i}", f"合成用户{i}",
+         trust_levels[i], rng.random() < 0.3, now - timedelta(seconds=rng.uniform(0, year)))
+        for i, user_id in enumerate(user_ids)
+    ))
+
+    # 创建者：福利数按齐夫分布，少数创建者发布了大部分福利
+    creators = rng.sample(user_ids, max(1, min(users, int(users * creator_ratio))))
+    benefit_creators = rng.choices(creators, cum_weights=list(itertools.accumulate(zipf_weights(len(creators), 1.2))), k=benefits)
+
+    # 福利热度：按随机顺序排名的齐夫分布，决定CDKEY数量和领取数
+    first_benefit_id = _next_id(db, Benefit)
+    benefit_ids = list(range(first_benefit_id, first_benefit_id + benefits))
+    popularity = zipf_weights(benefits, 1.0)
+    rng.shuffle(popularity)
+    is_cdkey = [rng.random() < 0.4 for _ in benefit_ids]
+    key_counts = [0] * benefits
+    cdkey_indexes = [i for i in range(benefits) if is_cdkey[i]]
+    for i, count in zip(cdkey_indexes, allocate(cdkeys, [popularity[i] for i in cdkey_indexes])):
+        key_counts[i] = max(1, count)
+
+    password_hash = get_password_hash(SYNTHETIC_PASSWORD)
+    plans = []  # (福利ID, 是否CDKEY, 模式, 创建时间, CDKEY数, 领取数)
+    for i, (benefit_id, claim_target) in enumerate(zip(benefit_ids, allocate(claims, popularity))):
+        mode = "advanced" if rng.random() < 0.15 else "normal"
+        private = rng.random() < 0.1
+        max_claims = None if is_cdkey[i] or rng.random() < 0.5 else rng.choice((10, 50, 100, 500, 1000, 10000))
+        created_at = past()
+        writer.add(Benefit, (
+            benefit_id,
+            f"{rng.choice(TITLE_PREFIXES)}{rng.choice(TITLE_SUFFIXES)} #{benefit_id}",
+            "合成测试数据。" + "先到先得，每人限领一份。" * rng.randint(1, 10),
+            None if is_cdkey[i] else "福利内容\n" * rng.randint(1, 20),
+            "cdkey" if is_cdkey[i] else "content",
+            "private" if private else "public",
+            password_hash if private else None,
+            mode,
+            rng.choices(range(4), weights=(50, 30, 15, 5))[0],
+            rng.randint(0, 100) if mode == "advanced" else None,
+            rng.randint(0, 500) if mode == "advanced" else None,
+            max_claims,
+            benefit_creators[i],
+            created_at,
+        ))
+        caps = [claim_target, users] + ([key_counts[i]] if is_cdkey[i] else []) + ([max_claims] if max_claims else [])
+        plans.append((benefit_id, is_cdkey[i], mode, created_at, key_counts[i], min(caps)))
+
+    # CDKEY和领取：逐个福利生成，热门福利的CDKEY领完，其余部分领取
+    cdkey_id = _next_id(db, BenefitCDKey)
+    for benefit_id, cdkey_benefit, mode, created_at, key_count, claim_count in plans:
+        claimers = rng.sample(user_ids, claim_count)
+        claimed_at = sorted(past(created_at) for _ in range(claim_count))
+        snapshots = (
+            [_snapshot(rng) for _ in range(claim_count)] if mode == "advanced" else itertools.repeat(None, claim_count)
+        )
+        if cdkey_benefit:
+            for k in range(key_count):
+                content = f"SEED-{benefit_id}-{k:07d}-{rng.getrandbits(32):08X}"
+                claimed = k < claim_count
+                writer.add(BenefitCDKey, (
+                    cdkey_id + k, benefit_id, content, hash_cdkey(content), claimed,
+                    claimers[k] if claimed else None, claimed_at[k] if claimed else None, created_at,
+                ))
+            writer.extend(BenefitClaim, (
+                (user_id, benefit_id, cdkey_id + k, snapshot, at)
+                for k, (user_id, snapshot, at) in enumerate(zip(claimers, snapshots, claimed_at))
+            ))
+            cdkey_id += key_count
+        else:
+            writer.extend(BenefitClaim, (
+                (user_id, benefit_id, None, snapshot, at)
+                for user_id, snapshot, at in zip(claimers, snapshots, claimed_at)
+            ))
+
+    # 个人黑名单：同样集中在发布福利多的创建者
+    writer.extend(PersonalBlacklist, (
+        (creator_id, f"seed{first_linuxdo_id + rng.randrange(users)}", rng.choice((None, "刷号", "倒卖CDKEY")), past())
+        for creator_id in rng.choices(benefit_creators, k=blacklist)
+    ))
+
+    writer.flush()
+    return writer.written
+
+
+def _snapshot(rng: random.Random) -> str:
+    """高级模式领取时保存的用户统计快照"""
+    return dumps_str({
+        "likes_given": rng.randint(0, 2000),
+        "likes_received": rng.randint(0, 2000),
+        "topics_entered": rng.randint(0, 5000),
+        "posts_read_count": rng.randint(0, 50000),
+        "days_visited": rng.randint(0, 365),
+        "topic_count": rng.randint(0, 100),
+        "post_count": rng.randint(0, 2000),
+        "time_read": rng.randint(0, 10 ** 6),
+        "recent_time_read": rng.randint(0, 10 ** 5),
+        "bookmark_count": rng.randint(0, 200),
+    })
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import event
+from sqlalchemy.orm import relationship, Session, with_loader_criteria
 from datetime import datetime
 import enum
 
@@ -88,6 +89,10 @@ class Benefit(Base):
     is_active = Column(Boolean, default=True)
     total_claims = Column(Integer, default=0)      # 总领取次数
     max_claims = Column(Integer, nullable=True)    # 最大领取次数限制（仅content类型）
+    total_cdkeys = Column(Integer, default=0)      # CDKEY总数（库存计数，仅cdkey类型）
+    available_cdkeys = Column(Integer, default=0)  # 未领取CDKEY数（库存计数，仅cdkey类型）
+    deleted_at = Column(DateTime, nullable=True, index=True)  # 软删除时间，关联数据由后台任务清理
+    purge_claimed_at = Column(DateTime, nullable=True)        # 清理任务认领时间（多进程间的租约）
     
     # 创建者
     creator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -101,13 +106,37 @@ class Benefit(Base):
     cdkeys = relationship("BenefitCDKey", back_populates="benefit")
 
 
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_benefits(execute_state):
+    """已软删除的福利对所有ORM查询和批量更新不可见
+
+    清理任务等需要访问已删除福利的语句使用 execution_options(include_deleted=True)。
+    """
+    if (
+        execute_state.is_orm_statement
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(Benefit, Benefit.deleted_at.is_(None), include_aliases=True)
+        )
+
+
 class BenefitCDKey(Base):
     """CDKEY/兑换链接表 - 用于存储一人一个的福利内容"""
     __tablename__ = "benefit_cdkeys"
+    __table_args__ = (
+        # 按领取状态筛选/分配CDKEY（SQLite索引隐含rowid，组内按id有序）
+        Index("ix_benefit_cdkeys_benefit_claimed", "benefit_id", "is_claimed"),
+        # 同一福利下CDKEY内容去重
+        Index("uq_benefit_cdkeys_benefit_hash", "benefit_id", "content_hash", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     benefit_id = Column(Integer, ForeignKey("benefits.id"), nullable=False)
     cdkey_content = Column(Text, nullable=False)  # CDKEY或兑换链接内容
+    content_hash = Column(String(64), nullable=True)  # 内容SHA-256（十六进制），用于去重
     is_claimed = Column(Boolean, default=False)   # 是否已被领取
     claimed_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 领取用户ID
     claimed_at = Column(DateTime, nullable=True)  # 领取时间
@@ -121,10 +150,14 @@ class BenefitCDKey(Base):
 
 class BenefitClaim(Base):
     __tablename__ = "benefit_claims"
+    __table_args__ = (
+        # 每个用户对同一福利只能领取一次（并发领取时由数据库保证）
+        Index("uq_benefit_claims_user_benefit", "user_id", "benefit_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    benefit_id = Column(Integer, ForeignKey("benefits.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    benefit_id = Column(Integer, ForeignKey("benefits.id"), nullable=False, index=True)
     cdkey_id = Column(Integer, ForeignKey("benefit_cdkeys.id"), nullable=True)  # 关联的CDKEY（如果是CDKEY类型）
     
     # 领取时的用户数据快照（高级模式）
@@ -166,3 +199,17 @@ class GlobalBlacklist(Base):
     
     # 关联
     admin = relationship("User", foreign_keys=[admin_id])
+
+
+class CreatorStats(Base):
+    """创建者统计汇总表 - 由BenefitService在写入时增量维护"""
+    __tablename__ = "creator_stats"
+    
+    creator_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_benefits = Column(Integer, default=0, nullable=False)    # 福利总数
+    total_claims = Column(Integer, default=0, nullable=False)      # 总领取次数
+    total_cdkeys = Column(Integer, default=0, nullable=False)      # CDKEY总数
+    available_cdkeys = Column(Integer, default=0, nullable=False)  # 可用CDKEY数
+    blacklisted_users = Column(Integer, default=0, nullable=False) # 个人黑名单人数
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -119,6 +119,28 @@ class Benefit(BenefitBase):
         from_attributes = True
 
 
+class BenefitCreated(Benefit):
+    """创建福利的响应：附带CDKEY库存和去重跳过的数量"""
+    total_cdkeys: Optional[int] = None
+    duplicate_cdkeys: int = 0
+
+
+class BenefitCard(BaseModel):
+    """福利列表卡片（列表接口只返回卡片展示所需字段）"""
+    id: int
+    title: str
+    description: Optional[str] = None
+    benefit_type: str
+    visibility: str
+    mode: str
+    min_trust_level: int
+    is_active: bool
+    total_claims: int
+    max_claims: Optional[int] = None
+    creator_id: int
+    created_at: datetime
+
+
 class BenefitWithCreator(Benefit):
     creator: User
 
@@ -210,6 +232,24 @@ class BenefitCDKey(BaseModel):
         from_attributes = True
 
 
+class CDKeyPage(BaseModel):
+    """CDKEY库存分页（按id的游标分页）"""
+    items: list[BenefitCDKey]
+    next_after_id: Optional[int] = None  # 下一页游标，为空表示没有更多
+    total_count: int
+    claimed_count: int
+    available_count: int
+
+
+class BenefitDeletionProgress(BaseModel):
+    """已删除福利的后台清理进度"""
+    benefit_id: int
+    deleted_at: datetime
+    remaining_claims: int
+    remaining_cdkeys: int
+    completed: bool = False
+
+
 class CDKeyClaimResult(BaseModel):
     success: bool
     cdkey: Optional[str] = None
@@ -267,6 +307,9 @@ class CreatorStats(BaseModel):
     available_cdkeys: int
     blacklisted_users: int
 
+    class Config:
+        from_attributes = True
+
 
 # 新增功能相关模式
 
@@ -278,6 +321,7 @@ class CDKeyAdd(BaseModel):
 class CDKeyAddResult(BaseModel):
     success: bool
     added_count: int
+    duplicate_count: int = 0  # 因内容重复被跳过的数量
     message: str
 
 
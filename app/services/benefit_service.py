@@ -1,39 +1,128 @@
-import json
+import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, func, update, insert, case, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+from typing import IO, Optional, List, Dict, Any, Sequence, Iterable, Iterator, AsyncIterator
+from starlette.concurrency import run_in_threadpool
 from app.models.models import (
     Benefit, BenefitClaim, BenefitCDKey, User,
-    PersonalBlacklist, GlobalBlacklist
+    PersonalBlacklist, GlobalBlacklist, CreatorStats
 )
 from app.schemas.schemas import (
     BenefitCreate, BenefitUpdate, BenefitEligibility, 
     LinuxDOUserSummary, CDKeyClaimResult, BenefitAccessRequest
 )
 from app.services.oauth_service import oauth_service
-from app.core.security import verify_password
+from app.core.metrics import benefit_claims
+from app.core.security import verify_password, hash_cdkey
+from app.core.serialization import dumps_str
+from app.core.streaming import spool_upload_lines
+from app.core.tracing import traced
+from app.db.search import apply_benefit_search, index_benefit, unindex_benefit
+from app.db.bulk import bulk_insert
+from app.db.database import SessionLocal, WriteSessionLocal, release_connection
 
+logger = logging.getLogger(__name__)
 
+
+# 列表卡片只查询这些列，避免读取content/secret/access_password等大字段
+BENEFIT_CARD_COLUMNS = (
+    Benefit.id, Benefit.title, Benefit.description, Benefit.benefit_type,
+    Benefit.visibility, Benefit.mode, Benefit.min_trust_level, Benefit.is_active,
+    Benefit.total_claims, Benefit.max_claims, Benefit.creator_id, Benefit.created_at
+)
+
+CLAIM_COLUMNS = (
+    BenefitClaim.id, BenefitClaim.benefit_id, BenefitClaim.user_id,
+    BenefitClaim.snapshot_data, BenefitClaim.claimed_at
+)
+
+# 领取记录导出的列（用户信息由 add_claim_users 补充）
+CLAIM_EXPORT_COLUMNS = [
+    "claim_id", "claimed_at", "user_id", "username", "name", "trust_level",
+    "cdkey_id", "cdkey_content", "snapshot_data"
+]
+
+# 领取失败的提示对应的结果分类（benefit_claims_total 的 outcome），其余不满足条件的情况计为 ineligible
+CLAIM_FAILURE_OUTCOMES = {
+    "CDKEY已被领完": "sold_out",
+    "福利已被领完": "sold_out",
+    "您已被全局拉黑": "blacklisted",
+    "您已被该福利创建者拉黑": "blacklisted",
+    "您已经领取过此福利": "already_claimed",
+}
+
+# CDKEY每批写入的行数
+CDKEY_BATCH_SIZE = 5000
+
+# 删除福利后每批清理的关联行数（每批一个短事务）
+PURGE_BATCH_SIZE = 1000
+
+# 清理任务的认领租约，每批提交时续期；超时未续期视为认领者已退出，可由其他进程接手
+PURGE_LEASE = timedelta(minutes=10)
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """按固定大小切分"""
+    batch: List[str] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+CDKEY_COLUMNS = (
+    BenefitCDKey.id, BenefitCDKey.benefit_id, BenefitCDKey.cdkey_content, BenefitCDKey.is_claimed,
+    BenefitCDKey.claimed_by_user_id, BenefitCDKey.claimed_at, BenefitCDKey.created_at
+)
+
+
+@traced
 class BenefitService:
+    def _can_view(self, db: Session, creator_id: int, user: Optional[User]) -> bool:
+        """用户是否可以查看该创建者的福利（黑名单检查）"""
+        # 检查全局黑名单
+        if user and user.is_globally_blacklisted:
+            return False
+        
+        # 检查个人黑名单
+        if user and self._is_user_blacklisted(db, creator_id, user.username):
+            return False
+        
+        return True
+    
     def get_benefit_by_id(self, db: Session, benefit_id: int, user: Optional[User] = None) -> Optional[Benefit]:
         """根据ID获取福利（考虑权限和可见性）"""
         benefit = db.query(Benefit).filter(Benefit.id == benefit_id).first()
         if not benefit:
             return None
         
-        # 检查全局黑名单
-        if user and user.is_globally_blacklisted:
+        if not self._can_view(db, benefit.creator_id, user):
             return None
         
-        # 检查个人黑名单
-        if user and self._is_user_blacklisted(db, benefit.creator_id, user.username):
+        return benefit
+    
+    def get_benefit_fields(self, db: Session, benefit_id: int, columns: Sequence[Any], user: Optional[User] = None) -> Optional[Dict[str, Any]]:
+        """只查询指定列的福利详情（权限检查同 get_benefit_by_id）"""
+        row = db.execute(
+            select(Benefit.creator_id.label("_creator_id"), *columns).where(Benefit.id == benefit_id)
+        ).mappings().first()
+        if not row:
             return None
         
-        return benefit
+        if not self._can_view(db, row["_creator_id"], user):
+            return None
+        
+        return {key: value for key, value in row.items() if key != "_creator_id"}
     
-    def get_public_benefits(self, db: Session, user: Optional[User] = None, skip: int = 0, limit: int = 100) -> List[Benefit]:
-        """获取公开的活跃福利列表"""
-        query = db.query(Benefit).filter(
+    def _public_benefits_query(self, db: Session, user: Optional[User] = None, columns: Optional[Sequence[Any]] = None):
+        """公开活跃福利卡片的基础查询（已过滤黑名单），全局黑名单用户返回None"""
+        stmt = select(*(columns or BENEFIT_CARD_COLUMNS)).select_from(Benefit).where(
             and_(
                 Benefit.is_active == True,
                 Benefit.visibility == "public"
@@ -43,23 +132,47 @@ class BenefitService:
         # 过滤黑名单用户
         if user:
             if user.is_globally_blacklisted:
-                return []
+                return None
             
             # 过滤个人黑名单
-            blacklisted_creators = db.query(PersonalBlacklist.creator_id).filter(
+            blacklisted_creators = select(PersonalBlacklist.creator_id).where(
                 PersonalBlacklist.blacklisted_username == user.username
-            ).subquery()
+            )
             
-            query = query.filter(~Benefit.creator_id.in_(blacklisted_creators))
+            stmt = stmt.where(~Benefit.creator_id.in_(blacklisted_creators))
+        
+        return stmt
+    
+    def get_public_benefits(self, db: Session, user: Optional[User] = None, skip: int = 0, limit: int = 100,
+                            columns: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """获取公开的活跃福利列表（columns为空时返回卡片字段）"""
+        stmt = self._public_benefits_query(db, user, columns)
+        if stmt is None:
+            return []
         
-        return query.offset(skip).limit(limit).all()
+        return [dict(row) for row in db.execute(stmt.offset(skip).limit(limit)).mappings()]
     
-    def get_user_benefits(self, db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Benefit]:
+    def search_benefits(self, db: Session, q: str, user: Optional[User] = None, skip: int = 0, limit: int = 20,
+                        columns: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """按标题和描述搜索公开福利（SQLite使用FTS5+BM25排序，其他数据库回退为LIKE）"""
+        stmt = self._public_benefits_query(db, user, columns)
+        if stmt is None:
+            return []
+        
+        stmt = apply_benefit_search(db, stmt, q).offset(skip).limit(limit)
+        return [dict(row) for row in db.execute(stmt).mappings()]
+    
+    def get_user_benefits(self, db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                          columns: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
         """获取用户创建的福利"""
-        return db.query(Benefit).filter(Benefit.creator_id == user_id).offset(skip).limit(limit).all()
+        stmt = select(*(columns or BENEFIT_CARD_COLUMNS)).select_from(Benefit).where(Benefit.creator_id == user_id).offset(skip).limit(limit)
+        return [dict(row) for row in db.execute(stmt).mappings()]
     
     def create_benefit(self, db: Session, benefit_data: BenefitCreate, creator_id: int) -> Benefit:
-        """创建福利"""
+        """创建福利
+        
+        CDKEY按内容去重写入，跳过的重复数记在返回对象的 duplicate_cdkeys 属性上（不入库）。
+        """
         # 提取CDKEY数据
         cdkeys_data = benefit_data.cdkeys
         benefit_dict = benefit_data.dict(exclude={'cdkeys'})
@@ -73,17 +186,26 @@ class BenefitService:
         db.add(db_benefit)
         db.flush()  # 获取ID但不提交
         
-        # 如果是CDKEY类型，创建CDKEY记录
+        # 如果是CDKEY类型，分批写入CDKEY记录
+        cdkey_count = duplicate_count = 0
         if benefit_data.benefit_type == "cdkey" and cdkeys_data:
-            for cdkey_content in cdkeys_data:
-                cdkey = BenefitCDKey(
-                    benefit_id=db_benefit.id,
-                    cdkey_content=cdkey_content.strip()
-                )
-                db.add(cdkey)
+            for batch in _batched(cdkeys_data, CDKEY_BATCH_SIZE):
+                result = self._insert_cdkey_batch(db, db_benefit.id, batch)
+                cdkey_count += result["added"]
+                duplicate_count += result["duplicates"]
+        db_benefit.total_cdkeys = cdkey_count
+        db_benefit.available_cdkeys = cdkey_count
+        
+        # 同步搜索索引和创建者统计
+        index_benefit(db, db_benefit)
+        self._bump_creator_stats(
+            db, creator_id,
+            total_benefits=1, total_cdkeys=cdkey_count, available_cdkeys=cdkey_count
+        )
         
         db.commit()
         db.refresh(db_benefit)
+        db_benefit.duplicate_cdkeys = duplicate_count
         return db_benefit
     
     def update_benefit(self, db: Session, benefit_id: int, benefit_data: BenefitUpdate, user_id: int) -> Optional[Benefit]:
@@ -105,6 +227,10 @@ class BenefitService:
         for field, value in update_data.items():
             setattr(db_benefit, field, value)
         
+        # 标题或描述变更时刷新搜索索引
+        if 'title' in update_data or 'description' in update_data:
+            index_benefit(db, db_benefit)
+        
         db.commit()
         db.refresh(db_benefit)
         return db_benefit
@@ -154,15 +280,9 @@ class BenefitService:
         if self.has_user_claimed(db, user.id, benefit.id):
             return BenefitEligibility(eligible=False, reason="您已经领取过此福利")
         
-        # CDKEY类型检查可用数量
+        # CDKEY类型检查可用数量（库存计数）
         if benefit.benefit_type == "cdkey":
-            available_count = db.query(BenefitCDKey).filter(
-                and_(
-                    BenefitCDKey.benefit_id == benefit.id,
-                    BenefitCDKey.is_claimed == False
-                )
-            ).count()
-            if available_count == 0:
+            if not benefit.available_cdkeys:
                 return BenefitEligibility(eligible=False, reason="CDKEY已被领完")
         
         # CONTENT类型检查最大领取次数
@@ -189,7 +309,8 @@ class BenefitService:
                     reason="需要先同意高级模式协议才能领取此福利"
                 )
             
-            # 获取用户详细数据
+            # 获取用户详细数据（等待期间不占用数据库连接）
+            release_connection(db)
             user_summary = await oauth_service.get_user_summary(user.username)
             if not user_summary:
                 return BenefitEligibility(
@@ -234,44 +355,121 @@ class BenefitService:
         return BenefitEligibility(eligible=True)
     
     async def claim_benefit(self, db: Session, user: User, benefit_id: int) -> CDKeyClaimResult:
-        """领取福利"""
+        """领取福利
+        
+        资格检查（可能请求LinuxDO接口）在普通会话中完成，实际写入在写会话的短事务中执行，
+        远程请求期间不持有写锁。领取结果按福利类型计入 benefit_claims_total。
+        """
         benefit = self.get_benefit_by_id(db, benefit_id, user)
         if not benefit:
+            benefit_claims.inc(benefit_type="unknown", outcome="not_found")
             return CDKeyClaimResult(success=False, message="福利不存在")
         
+        benefit_type = benefit.benefit_type
+        try:
+            result = await self._claim_benefit(db, user, benefit)
+        except Exception:
+            benefit_claims.inc(benefit_type=benefit_type, outcome="error")
+            raise
+        outcome = "success" if result.success else CLAIM_FAILURE_OUTCOMES.get(result.message, "ineligible")
+        benefit_claims.inc(benefit_type=benefit_type, outcome=outcome)
+        return result
+    
+    async def _claim_benefit(self, db: Session, user: User, benefit: Benefit) -> CDKeyClaimResult:
         # 检查资格
         eligibility = await self.check_eligibility(db, user, benefit)
         if not eligibility.eligible:
             return CDKeyClaimResult(success=False, message=eligibility.reason)
         
-        # 根据福利类型处理
-        if benefit.benefit_type == "content":
-            return await self._claim_content_benefit(db, user, benefit)
-        elif benefit.benefit_type == "cdkey":
-            return await self._claim_cdkey_benefit(db, user, benefit)
-        else:
+        if benefit.benefit_type not in ("content", "cdkey"):
             return CDKeyClaimResult(success=False, message="未知的福利类型")
-    
-    async def _claim_content_benefit(self, db: Session, user: User, benefit: Benefit) -> CDKeyClaimResult:
-        """领取内容类型福利"""
-        # 创建领取记录
+        
+        # 高级模式保存领取时的用户数据快照
         snapshot_data = None
         if benefit.mode == "advanced":
+            release_connection(db)
             user_summary = await oauth_service.get_user_summary(user.username)
             if user_summary:
-                snapshot_data = json.dumps(user_summary.dict())
+                snapshot_data = dumps_str(user_summary)
         
-        db_claim = BenefitClaim(
-            user_id=user.id,
-            benefit_id=benefit.id,
-            snapshot_data=snapshot_data
-        )
+        # 等待写入排队期间同样不占用普通会话的连接
+        release_connection(db)
+        return await run_in_threadpool(self._write_claim, user.id, benefit, snapshot_data)
+    
+    def _write_claim(self, user_id: int, benefit: Benefit, snapshot_data: Optional[str]) -> CDKeyClaimResult:
+        write_db = WriteSessionLocal()
+        try:
+            return self.claim_in_session(write_db, user_id, benefit, snapshot_data)
+        finally:
+            write_db.close()
+    
+    def claim_in_session(self, db: Session, user_id: int, benefit: Benefit, snapshot_data: Optional[str] = None) -> CDKeyClaimResult:
+        """在一个写事务内完成领取
         
-        # 更新福利领取次数
-        benefit.total_claims += 1
+        benefit 为调用方已加载的福利（只读取其属性）。先在领取库中复查重复领取（最终由唯一索引保证），
+        CDKEY和领取上限均以条件更新占用（见 _claim_cdkey_benefit / _claim_content_benefit），
+        不依赖写连接串行化，并发领取不会超发；随后更新目录库中的计数，领取库独立时目录库只在这一步短暂加写锁。
+        """
+        try:
+            if self.has_user_claimed(db, user_id, benefit.id):
+                return CDKeyClaimResult(success=False, message="您已经领取过此福利")
+            
+            if benefit.benefit_type == "cdkey":
+                return self._claim_cdkey_benefit(db, user_id, benefit, snapshot_data)
+            return self._claim_content_benefit(db, user_id, benefit, snapshot_data)
+        except Exception:
+            db.rollback()
+            raise
+    
+    def _add_claim(self, db: Session, **values: Any) -> bool:
+        """写入领取记录（不提交）
+        
+        (user_id, benefit_id) 上有唯一索引：并发的重复领取都通过了 has_user_claimed 的检查时，
+        只有一个能写入，其余回滚整个领取事务并返回False。
+        """
+        db.add(BenefitClaim(**values))
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+    
+    def _record_claim(self, db: Session, benefit: Benefit, *conditions: Any, **counters: int) -> bool:
+        """更新福利计数和创建者统计（目录库）并提交
         
-        db.add(db_claim)
+        conditions 为附加在福利计数更新上的条件（如领取上限），条件不满足或福利已删除时
+        回滚整个领取事务（含未提交的领取记录）并返回False。
+        
+        领取库独立时一次提交分别提交两个库，并非原子：其中一个库提交失败时领取记录与计数
+        可能不一致，用 python manage.py rebuild-stats 按领取记录和CDKEY重建计数。
+        """
+        result = db.execute(
+            update(Benefit).where(Benefit.id == benefit.id, *conditions).values(
+                **{name: getattr(Benefit, name) + delta for name, delta in counters.items()}
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount != 1:
+            db.rollback()
+            return False
+        self._bump_creator_stats(db, benefit.creator_id, **counters)
         db.commit()
+        return True
+    
+    def _claim_content_benefit(self, db: Session, user_id: int, benefit: Benefit, snapshot_data: Optional[str]) -> CDKeyClaimResult:
+        """领取内容类型福利
+        
+        领取上限由计数的条件更新保证（total_claims < max_claims），并发领取时只有未超限的更新生效。
+        """
+        # 创建领取记录
+        if not self._add_claim(db, user_id=user_id, benefit_id=benefit.id, snapshot_data=snapshot_data):
+            return CDKeyClaimResult(success=False, message="您已经领取过此福利")
+        
+        # 更新福利领取次数，达到上限时不更新并撤销领取记录
+        conditions = [func.coalesce(Benefit.total_claims, 0) < Benefit.max_claims] if benefit.max_claims else []
+        if not self._record_claim(db, benefit, *conditions, total_claims=1):
+            return CDKeyClaimResult(success=False, message="福利已被领完")
         
         return CDKeyClaimResult(
             success=True, 
@@ -279,44 +477,45 @@ class BenefitService:
             message="领取成功"
         )
     
-    async def _claim_cdkey_benefit(self, db: Session, user: User, benefit: Benefit) -> CDKeyClaimResult:
-        """领取CDKEY类型福利"""
-        # 查找可用的CDKEY
-        available_cdkey = db.query(BenefitCDKey).filter(
-            and_(
-                BenefitCDKey.benefit_id == benefit.id,
-                BenefitCDKey.is_claimed == False
-            )
-        ).first()
-        
-        if not available_cdkey:
-            return CDKeyClaimResult(success=False, message="CDKEY已被领完")
+    def _claim_cdkey_benefit(self, db: Session, user_id: int, benefit: Benefit, snapshot_data: Optional[str]) -> CDKeyClaimResult:
+        """领取CDKEY类型福利
         
-        # 标记CDKEY为已领取
-        available_cdkey.is_claimed = True
-        available_cdkey.claimed_by_user_id = user.id
-        from datetime import datetime
-        available_cdkey.claimed_at = datetime.utcnow()
-        
-        # 创建领取记录
-        snapshot_data = None
-        if benefit.mode == "advanced":
-            user_summary = await oauth_service.get_user_summary(user.username)
-            if user_summary:
-                snapshot_data = json.dumps(user_summary.dict())
-        
-        db_claim = BenefitClaim(
-            user_id=user.id,
-            benefit_id=benefit.id,
-            cdkey_id=available_cdkey.id,
-            snapshot_data=snapshot_data
-        )
+        先查出一个未领取的CDKEY，再以 is_claimed = false 为条件更新；更新行数为0说明已被并发领取，
+        换下一个重试。不依赖写连接串行化，任何数据库上都不会把同一个CDKEY发给两个人。
+        """
+        while True:
+            # 查找可用的CDKEY
+            available_cdkey = db.execute(
+                select(BenefitCDKey.id, BenefitCDKey.cdkey_content).where(
+                    and_(
+                        BenefitCDKey.benefit_id == benefit.id,
+                        BenefitCDKey.is_claimed == False
+                    )
+                ).limit(1)
+            ).first()
+            
+            if not available_cdkey:
+                db.rollback()
+                return CDKeyClaimResult(success=False, message="CDKEY已被领完")
+            
+            # 标记CDKEY为已领取
+            marked = db.execute(
+                update(BenefitCDKey).where(
+                    and_(BenefitCDKey.id == available_cdkey.id, BenefitCDKey.is_claimed == False)
+                ).values(is_claimed=True, claimed_by_user_id=user_id, claimed_at=datetime.utcnow()),
+                execution_options={"synchronize_session": False}
+            )
+            if marked.rowcount == 1:
+                break
         
-        # 更新福利领取次数
-        benefit.total_claims += 1
+        # 创建领取记录（重复领取时连同CDKEY的标记一起回滚）
+        if not self._add_claim(db, user_id=user_id, benefit_id=benefit.id, cdkey_id=available_cdkey.id,
+                               snapshot_data=snapshot_data):
+            return CDKeyClaimResult(success=False, message="您已经领取过此福利")
         
-        db.add(db_claim)
-        db.commit()
+        # 更新福利领取次数和库存
+        if not self._record_claim(db, benefit, total_claims=1, available_cdkeys=-1):
+            return CDKeyClaimResult(success=False, message="福利不存在")
         
         return CDKeyClaimResult(
             success=True, 
@@ -324,11 +523,25 @@ class BenefitService:
             message="领取成功"
         )
     
-    def get_user_claims(self, db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[BenefitClaim]:
+    def get_user_claims(self, db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                        columns: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
         """获取用户的领取记录"""
-        return db.query(BenefitClaim).filter(BenefitClaim.user_id == user_id).offset(skip).limit(limit).all()
+        stmt = select(*(columns or CLAIM_COLUMNS)).select_from(BenefitClaim).where(BenefitClaim.user_id == user_id)
+        stmt = self._exclude_deleted_benefits(stmt, self._deleted_benefit_ids(db))
+        return [dict(row) for row in db.execute(stmt.offset(skip).limit(limit)).mappings()]
+    
+    def _deleted_benefit_ids(self, db: Session) -> List[int]:
+        """已软删除、关联数据尚未清理完的福利id（通常很少）"""
+        return db.execute(
+            select(Benefit.id).where(Benefit.deleted_at.isnot(None)).execution_options(include_deleted=True)
+        ).scalars().all()
+    
+    def _exclude_deleted_benefits(self, stmt: Select, deleted_ids: List[int]) -> Select:
+        """排除已删除福利的领取记录（领取记录可能与福利不在同一个库，不能联表过滤）"""
+        return stmt.where(BenefitClaim.benefit_id.not_in(deleted_ids)) if deleted_ids else stmt
     
-    def get_benefit_claims(self, db: Session, benefit_id: int, user_id: int, skip: int = 0, limit: int = 100) -> List[BenefitClaim]:
+    def get_benefit_claims(self, db: Session, benefit_id: int, user_id: int, skip: int = 0, limit: int = 100,
+                           columns: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
         """获取福利的领取记录（仅创建者可查看）"""
         # 验证是否为福利创建者
         benefit = db.query(Benefit).filter(
@@ -338,19 +551,92 @@ class BenefitService:
         if not benefit:
             return []
         
-        return db.query(BenefitClaim).filter(BenefitClaim.benefit_id == benefit_id).offset(skip).limit(limit).all()
+        stmt = select(*(columns or CLAIM_COLUMNS)).select_from(BenefitClaim).where(BenefitClaim.benefit_id == benefit_id).offset(skip).limit(limit)
+        return [dict(row) for row in db.execute(stmt).mappings()]
     
-    def get_benefit_cdkeys(self, db: Session, benefit_id: int, user_id: int) -> List[BenefitCDKey]:
-        """获取福利的CDKEY列表（仅创建者可查看）"""
-        # 验证是否为福利创建者
-        benefit = db.query(Benefit).filter(
-            and_(Benefit.id == benefit_id, Benefit.creator_id == user_id)
+    def is_benefit_owner(self, db: Session, benefit_id: int, user_id: int) -> bool:
+        """检查用户是否为福利创建者"""
+        return db.execute(
+            select(Benefit.id).where(and_(Benefit.id == benefit_id, Benefit.creator_id == user_id))
+        ).first() is not None
+    
+    def benefit_claims_export_query(self, benefit_id: int) -> Select:
+        """福利领取记录导出查询：联表带出CDKEY，按领取顺序排列（领取用户由 add_claim_users 按批补充）"""
+        return select(
+            BenefitClaim.id.label("claim_id"),
+            BenefitClaim.claimed_at,
+            BenefitClaim.user_id,
+            BenefitClaim.cdkey_id,
+            BenefitCDKey.cdkey_content,
+            BenefitClaim.snapshot_data
+        ).select_from(BenefitClaim).outerjoin(
+            BenefitCDKey, BenefitCDKey.id == BenefitClaim.cdkey_id
+        ).where(
+            BenefitClaim.benefit_id == benefit_id
+        ).order_by(BenefitClaim.id)
+    
+    def add_claim_users(self, db: Session, claims: List[Dict[str, Any]]) -> None:
+        """为一批领取记录补充领取用户信息（用户在目录库）"""
+        users = {
+            row.id: row for row in db.execute(
+                select(User.id, User.username, User.name, User.trust_level).where(
+                    User.id.in_({claim["user_id"] for claim in claims})
+                )
+            )
+        }
+        for claim in claims:
+            user = users.get(claim["user_id"])
+            claim["username"] = user.username if user else None
+            claim["name"] = user.name if user else None
+            claim["trust_level"] = user.trust_level if user else None
+    
+    def _cdkey_status_filter(self, stmt: Select, status: Optional[str]) -> Select:
+        """按领取状态筛选CDKEY: claimed / unclaimed"""
+        if status == "claimed":
+            return stmt.where(BenefitCDKey.is_claimed == True)
+        if status == "unclaimed":
+            return stmt.where(BenefitCDKey.is_claimed == False)
+        return stmt
+    
+    def get_benefit_cdkeys(self, db: Session, benefit_id: int, user_id: int, status: Optional[str] = None,
+                           after_id: Optional[int] = None, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """分页获取福利的CDKEY库存（仅创建者可查看），按id游标翻页
+
+        总数取自福利上的库存计数，翻页时不再统计全部CDKEY。
+        """
+        stock = db.execute(
+            select(Benefit.total_cdkeys, Benefit.available_cdkeys).where(
+                and_(Benefit.id == benefit_id, Benefit.creator_id == user_id)
+            )
         ).first()
+        if stock is None:
+            return None
         
-        if not benefit:
-            return []
+        stmt = self._cdkey_status_filter(
+            select(*CDKEY_COLUMNS).where(BenefitCDKey.benefit_id == benefit_id), status
+        )
+        if after_id is not None:
+            stmt = stmt.where(BenefitCDKey.id > after_id)
+        
+        # 多取一行判断是否还有下一页
+        items = [dict(row) for row in db.execute(stmt.order_by(BenefitCDKey.id).limit(limit + 1)).mappings()]
+        has_more = len(items) > limit
+        items = items[:limit]
         
-        return db.query(BenefitCDKey).filter(BenefitCDKey.benefit_id == benefit_id).all()
+        total_count, available_count = stock.total_cdkeys or 0, stock.available_cdkeys or 0
+        return {
+            "items": items,
+            "next_after_id": items[-1]["id"] if has_more else None,
+            "total_count": total_count,
+            "claimed_count": total_count - available_count,
+            "available_count": available_count
+        }
+    
+    def benefit_cdkeys_export_query(self, benefit_id: int, status: Optional[str] = None, content_only: bool = False) -> Select:
+        """福利CDKEY导出查询，content_only时只导出CDKEY内容"""
+        columns = (BenefitCDKey.cdkey_content,) if content_only else CDKEY_COLUMNS
+        stmt = select(*columns).where(BenefitCDKey.benefit_id == benefit_id)
+        return self._cdkey_status_filter(stmt, status).order_by(BenefitCDKey.id)
     
     # 黑名单管理
     def add_personal_blacklist(self, db: Session, creator_id: int, blacklisted_username: str, reason: str = None) -> bool:
@@ -372,6 +658,7 @@ class BenefitService:
             reason=reason
         )
         db.add(blacklist)
+        self._bump_creator_stats(db, creator_id, blacklisted_users=1)
         db.commit()
         return True
     
@@ -388,6 +675,7 @@ class BenefitService:
             return False
         
         db.delete(blacklist)
+        self._bump_creator_stats(db, creator_id, blacklisted_users=-1)
         db.commit()
         return True
     
@@ -397,62 +685,189 @@ class BenefitService:
     
     # 新增功能方法
     
-    def add_cdkeys_to_benefit(self, db: Session, benefit_id: int, creator_id: int, cdkeys: List[str]) -> Dict[str, Any]:
-        """向福利添加CDKEY"""
-        # 检查福利是否存在且属于创建者
-        benefit = db.query(Benefit).filter(
+    def _get_owned_cdkey_benefit(self, db: Session, benefit_id: int, creator_id: int) -> Optional[Benefit]:
+        """获取属于创建者的CDKEY类型福利"""
+        return db.query(Benefit).filter(
             and_(
                 Benefit.id == benefit_id,
                 Benefit.creator_id == creator_id,
                 Benefit.benefit_type == "cdkey"
             )
         ).first()
+    
+    def _insert_cdkey_batch(self, db: Session, benefit_id: int, cdkeys: Sequence[str]) -> Dict[str, int]:
+        """以一次executemany写入一批CDKEY（忽略空内容）
+        
+        依靠 (benefit_id, content_hash) 唯一索引跳过重复内容（包括批内重复和已存在的CDKEY），
+        无需把已有CDKEY读入内存。返回写入数和重复数。
+        """
+        rows = [
+            (benefit_id, content, hash_cdkey(content))
+            for content in (cdkey.strip() for cdkey in cdkeys) if content
+        ]
+        added = bulk_insert(
+            db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"), rows,
+            ignore_conflicts=True, is_claimed=False, created_at=datetime.utcnow()
+        )
+        return {"added": added, "duplicates": len(rows) - added}
+    
+    def _add_cdkey_stock(self, db: Session, benefit_id: int, creator_id: int, count: int) -> None:
+        """新增CDKEY后更新福利库存计数和创建者统计（每批一次）"""
+        if not count:
+            return
+        db.execute(
+            update(Benefit).where(Benefit.id == benefit_id).values(
+                total_cdkeys=Benefit.total_cdkeys + count,
+                available_cdkeys=Benefit.available_cdkeys + count
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        self._bump_creator_stats(db, creator_id, total_cdkeys=count, available_cdkeys=count)
+    
+    def add_cdkeys_to_benefit(self, db: Session, benefit_id: int, creator_id: int, cdkeys: List[str]) -> Dict[str, Any]:
+        """向福利添加CDKEY"""
+        # 检查福利是否存在且属于创建者
+        benefit = self._get_owned_cdkey_benefit(db, benefit_id, creator_id)
         
         if not benefit:
             return {"success": False, "message": "福利不存在或不是CDKEY类型", "added_count": 0}
         
-        # 添加CDKEY
-        added_count = 0
-        for cdkey_content in cdkeys:
-            if cdkey_content.strip():  # 忽略空内容
-                cdkey = BenefitCDKey(
-                    benefit_id=benefit_id,
-                    cdkey_content=cdkey_content.strip()
-                )
-                db.add(cdkey)
-                added_count += 1
+        # 分批添加CDKEY
+        added_count = duplicate_count = 0
+        for batch in _batched(cdkeys, CDKEY_BATCH_SIZE):
+            result = self._insert_cdkey_batch(db, benefit_id, batch)
+            self._add_cdkey_stock(db, benefit_id, creator_id, result["added"])
+            added_count += result["added"]
+            duplicate_count += result["duplicates"]
         
         db.commit()
-        return {"success": True, "message": f"成功添加 {added_count} 个CDKEY", "added_count": added_count}
+        return self._cdkey_add_result(added_count, duplicate_count)
+    
+    def _cdkey_add_result(self, added_count: int, duplicate_count: int) -> Dict[str, Any]:
+        message = f"成功添加 {added_count} 个CDKEY"
+        if duplicate_count:
+            message += f"，跳过 {duplicate_count} 个重复CDKEY"
+        return {"success": True, "message": message, "added_count": added_count, "duplicate_count": duplicate_count}
+    
+    async def ingest_cdkey_stream(self, db: Session, benefit_id: int, creator_id: int, lines: AsyncIterator[str]) -> Dict[str, Any]:
+        """从流式上传的行中导入CDKEY
+        
+        先把上传完整接收到临时文件（期间不占用数据库连接），再在线程池中按批写入，
+        每批一个短写事务，慢速上传不会长时间持有写锁。中途失败时已提交的批次保留，
+        重新上传同一文件时已写入的CDKEY按内容去重跳过。
+        """
+        benefit = self._get_owned_cdkey_benefit(db, benefit_id, creator_id)
+        if not benefit:
+            return {"success": False, "message": "福利不存在或不是CDKEY类型", "added_count": 0}
+        release_connection(db)
+        
+        spool = await spool_upload_lines(lines)
+        try:
+            result = await run_in_threadpool(self._write_cdkey_file, benefit_id, creator_id, spool)
+        finally:
+            spool.close()
+        return self._cdkey_add_result(result["added"], result["duplicates"])
+    
+    def _write_cdkey_file(self, benefit_id: int, creator_id: int, spool: IO[str]) -> Dict[str, int]:
+        """把临时文件中的CDKEY按批写入，每批提交一次"""
+        added = duplicates = 0
+        write_db = WriteSessionLocal()
+        try:
+            for batch in _batched((line.rstrip("\n") for line in spool), CDKEY_BATCH_SIZE):
+                result = self._insert_cdkey_batch(write_db, benefit_id, batch)
+                self._add_cdkey_stock(write_db, benefit_id, creator_id, result["added"])
+                write_db.commit()
+                added += result["added"]
+                duplicates += result["duplicates"]
+        finally:
+            write_db.close()
+        return {"added": added, "duplicates": duplicates}
+    
+    def backfill_cdkey_hashes(self, db: Session, batch_size: int = CDKEY_BATCH_SIZE) -> Dict[str, int]:
+        """为历史CDKEY补算内容哈希，按id分批提交；与已有内容重复的CDKEY保持为空并计入duplicates
+        
+        重复内容在写入前排除（批内重复和库中已有的哈希），不依赖各数据库不同的 INSERT/UPDATE IGNORE 语法。
+        """
+        table = BenefitCDKey.__table__
+        stmt = update(table).where(table.c.id == bindparam("_id")).values(content_hash=bindparam("_hash"))
+        
+        hashed = duplicates = 0
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(table.c.id, table.c.benefit_id, table.c.cdkey_content).where(
+                    and_(table.c.content_hash.is_(None), table.c.id > last_id)
+                ).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            
+            # 同一福利下的同一内容只保留id最小的一个
+            pending: Dict[tuple, int] = {}
+            for row in rows:
+                pending.setdefault((row.benefit_id, hash_cdkey(row.cdkey_content.strip())), row.id)
+            existing = set(db.execute(
+                select(table.c.benefit_id, table.c.content_hash).where(
+                    and_(
+                        table.c.benefit_id.in_({benefit_id for benefit_id, _ in pending}),
+                        table.c.content_hash.in_({content_hash for _, content_hash in pending})
+                    )
+                )
+            ).tuples())
+            params = [
+                {"_id": cdkey_id, "_hash": content_hash}
+                for (benefit_id, content_hash), cdkey_id in pending.items()
+                if (benefit_id, content_hash) not in existing
+            ]
+            try:
+                if params:
+                    db.execute(stmt, params)
+                db.commit()
+            except IntegrityError:
+                # 检查之后有同内容的CDKEY写入，回滚后重新处理这一批
+                db.rollback()
+                continue
+            hashed += len(params)
+            duplicates += len(rows) - len(params)
+            last_id = rows[-1].id
+        
+        return {"hashed": hashed, "duplicates": duplicates}
     
     def get_user_claim_history(self, db: Session, user_id: int, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
         """获取用户的领取历史"""
-        # 查询用户的所有领取记录
-        claims_query = db.query(BenefitClaim).filter(BenefitClaim.user_id == user_id)
-        total_count = claims_query.count()
+        deleted_ids = self._deleted_benefit_ids(db)
+        total_count = db.execute(self._exclude_deleted_benefits(
+            select(func.count(BenefitClaim.id)).where(BenefitClaim.user_id == user_id), deleted_ids
+        )).scalar()
+        
+        # 领取记录和CDKEY同在领取库，联表查询
+        stmt = select(
+            BenefitClaim.id,
+            BenefitClaim.benefit_id,
+            BenefitCDKey.cdkey_content,
+            BenefitClaim.claimed_at
+        ).select_from(BenefitClaim).outerjoin(
+            BenefitCDKey, BenefitCDKey.id == BenefitClaim.cdkey_id
+        ).where(
+            BenefitClaim.user_id == user_id
+        )
+        stmt = self._exclude_deleted_benefits(stmt, deleted_ids).order_by(BenefitClaim.id.desc()).offset(skip).limit(limit)
+        claims = [dict(row) for row in db.execute(stmt).mappings()]
         
-        claims = claims_query.offset(skip).limit(limit).all()
+        # 福利标题和类型在目录库，按本页涉及的福利一次查询
+        benefits = {
+            row.id: row for row in db.execute(
+                select(Benefit.id, Benefit.title, Benefit.benefit_type).where(
+                    Benefit.id.in_({claim["benefit_id"] for claim in claims})
+                )
+            )
+        } if claims else {}
         
-        # 构建历史记录
         history = []
         for claim in claims:
-            benefit = claim.benefit
-            cdkey_content = None
-            
-            # 如果是CDKEY类型，获取CDKEY内容
-            if claim.cdkey_id:
-                cdkey = db.query(BenefitCDKey).filter(BenefitCDKey.id == claim.cdkey_id).first()
-                if cdkey:
-                    cdkey_content = cdkey.cdkey_content
-            
-            history.append({
-                "id": claim.id,
-                "benefit_id": benefit.id,
-                "benefit_title": benefit.title,
-                "benefit_type": benefit.benefit_type,
-                "cdkey_content": cdkey_content,
-                "claimed_at": claim.claimed_at
-            })
+            benefit = benefits.get(claim["benefit_id"])
+            if benefit:
+                history.append({**claim, "benefit_title": benefit.title, "benefit_type": benefit.benefit_type})
         
         return {
             "claims": history,
@@ -460,7 +875,11 @@ class BenefitService:
         }
     
     def delete_benefit(self, db: Session, benefit_id: int, creator_id: int) -> bool:
-        """删除福利（仅创建者可删除）"""
+        """删除福利（仅创建者可删除）
+        
+        立即软删除（对所有查询隐藏）并扣减创建者统计，关联的CDKEY和领取记录
+        由 purge_deleted_benefit 在后台分批清理，避免长时间持有写锁。
+        """
         benefit = db.query(Benefit).filter(
             and_(
                 Benefit.id == benefit_id,
@@ -471,17 +890,112 @@ class BenefitService:
         if not benefit:
             return False
         
-        # 删除相关的CDKEY记录
-        db.query(BenefitCDKey).filter(BenefitCDKey.benefit_id == benefit_id).delete()
-        
-        # 删除相关的领取记录
-        db.query(BenefitClaim).filter(BenefitClaim.benefit_id == benefit_id).delete()
+        benefit.deleted_at = datetime.utcnow()
+        unindex_benefit(db, benefit_id)
         
-        # 删除福利本身
-        db.delete(benefit)
+        self._bump_creator_stats(
+            db, creator_id,
+            total_benefits=-1,
+            total_claims=-(benefit.total_claims or 0),
+            total_cdkeys=-(benefit.total_cdkeys or 0),
+            available_cdkeys=-(benefit.available_cdkeys or 0)
+        )
         db.commit()
         return True
     
+    def _claim_purge(self, db: Session, benefit_id: int) -> bool:
+        """以条件更新认领福利的清理任务，同一时间只有一个进程（或线程）能认领成功"""
+        benefits = Benefit.__table__
+        now = datetime.utcnow()
+        result = db.execute(
+            benefits.update().where(
+                and_(
+                    benefits.c.id == benefit_id,
+                    benefits.c.deleted_at.isnot(None),
+                    or_(benefits.c.purge_claimed_at.is_(None), benefits.c.purge_claimed_at < now - PURGE_LEASE)
+                )
+            ).values(purge_claimed_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+    
+    def purge_deleted_benefit(self, benefit_id: int, batch_size: int = PURGE_BATCH_SIZE) -> None:
+        """分批删除已软删除福利的领取记录和CDKEY，每批单独提交，最后删除福利本身
+        
+        作为后台任务运行，使用独立会话；先认领再清理，其他进程正在清理时直接返回。
+        中途中断后可重复执行（租约过期后重新认领）。
+        """
+        db = SessionLocal()
+        try:
+            if not self._claim_purge(db, benefit_id):
+                return
+            
+            benefits = Benefit.__table__
+            # 领取记录引用CDKEY，先删除；先查出一批id再按列表删除（MySQL不支持 IN 子查询中的 LIMIT）
+            for table in (BenefitClaim.__table__, BenefitCDKey.__table__):
+                while True:
+                    batch_ids = db.execute(
+                        select(table.c.id).where(table.c.benefit_id == benefit_id).limit(batch_size)
+                    ).scalars().all()
+                    if not batch_ids:
+                        break
+                    db.execute(table.delete().where(table.c.id.in_(batch_ids)))
+                    db.execute(
+                        benefits.update().where(benefits.c.id == benefit_id).values(purge_claimed_at=datetime.utcnow())
+                    )
+                    db.commit()
+                    if len(batch_ids) < batch_size:
+                        break
+            
+            db.execute(benefits.delete().where(benefits.c.id == benefit_id))
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to purge deleted benefit %s", benefit_id)
+        finally:
+            db.close()
+    
+    def resume_pending_purges(self) -> None:
+        """继续清理上次运行中未清理完的已删除福利（启动时调用）
+        
+        每个worker都会调用；逐个认领，已被其他worker认领且租约未过期的福利会被跳过。
+        """
+        db = SessionLocal()
+        try:
+            pending = db.execute(
+                select(Benefit.__table__.c.id).where(Benefit.__table__.c.deleted_at.isnot(None))
+            ).scalars().all()
+        finally:
+            db.close()
+        
+        for benefit_id in pending:
+            self.purge_deleted_benefit(benefit_id)
+    
+    def get_deletion_progress(self, db: Session, benefit_id: int, creator_id: int) -> Optional[Dict[str, Any]]:
+        """已删除福利的清理进度（仅创建者可查看），福利已清理完毕或未删除时返回None"""
+        benefit = db.execute(
+            select(Benefit.id, Benefit.deleted_at).where(
+                and_(Benefit.id == benefit_id, Benefit.creator_id == creator_id, Benefit.deleted_at.isnot(None))
+            ).execution_options(include_deleted=True)
+        ).first()
+        if not benefit:
+            return None
+        
+        remaining_claims = db.execute(
+            select(func.count(BenefitClaim.id)).where(BenefitClaim.benefit_id == benefit_id)
+        ).scalar()
+        remaining_cdkeys = db.execute(
+            select(func.count(BenefitCDKey.id)).where(BenefitCDKey.benefit_id == benefit_id)
+        ).scalar()
+        
+        return {
+            "benefit_id": benefit.id,
+            "deleted_at": benefit.deleted_at,
+            "remaining_claims": remaining_claims,
+            "remaining_cdkeys": remaining_cdkeys,
+            "completed": remaining_claims == 0 and remaining_cdkeys == 0
+        }
+    
     def get_benefit_with_secret(self, db: Session, benefit_id: int, user: User) -> Optional[Dict[str, Any]]:
         """获取包含秘密内容的福利详情（需要登录）"""
         benefit = self.get_benefit_by_id(db, benefit_id, user)
@@ -511,33 +1025,130 @@ class BenefitService:
     
     def get_user_managed_benefits(self, db: Session, creator_id: int, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """获取用户创建的福利管理列表"""
-        benefits = db.query(Benefit).filter(
-            Benefit.creator_id == creator_id
-        ).offset(skip).limit(limit).all()
-        
-        result = []
-        for benefit in benefits:
-            # 计算可用CDKEY数量
-            available_cdkeys = 0
-            if benefit.benefit_type == "cdkey":
-                available_cdkeys = db.query(BenefitCDKey).filter(
-                    and_(
-                        BenefitCDKey.benefit_id == benefit.id,
-                        BenefitCDKey.is_claimed == False
-                    )
-                ).count()
-            
-            result.append({
-                "id": benefit.id,
-                "title": benefit.title,
-                "benefit_type": benefit.benefit_type,
-                "is_active": benefit.is_active,
-                "total_claims": benefit.total_claims,
-                "available_cdkeys": available_cdkeys,
-                "created_at": benefit.created_at
+        stmt = select(
+            Benefit.id, Benefit.title, Benefit.benefit_type, Benefit.is_active,
+            Benefit.total_claims, Benefit.available_cdkeys, Benefit.created_at
+        ).where(Benefit.creator_id == creator_id).offset(skip).limit(limit)
+        
+        return [dict(row) for row in db.execute(stmt).mappings()]
+    
+    # 创建者统计
+    
+    def get_creator_stats(self, db: Session, creator_id: int) -> CreatorStats:
+        """获取创建者统计（主键读取汇总行，不存在时重建）"""
+        stats = db.get(CreatorStats, creator_id)
+        if stats is None:
+            stats = self.rebuild_creator_stats(db, creator_id)
+            db.commit()
+        return stats
+    
+    def rebuild_creator_stats(self, db: Session, creator_id: int) -> CreatorStats:
+        """按福利的计数重新计算单个创建者的统计（不提交，只读目录库）"""
+        benefit_totals = db.execute(
+            select(
+                func.count(Benefit.id),
+                func.coalesce(func.sum(Benefit.total_claims), 0),
+                func.coalesce(func.sum(Benefit.total_cdkeys), 0),
+                func.coalesce(func.sum(Benefit.available_cdkeys), 0)
+            ).where(Benefit.creator_id == creator_id)
+        ).one()
+        blacklisted_users = db.execute(
+            select(func.count(PersonalBlacklist.id)).where(PersonalBlacklist.creator_id == creator_id)
+        ).scalar()
+        
+        return db.merge(CreatorStats(
+            creator_id=creator_id,
+            total_benefits=benefit_totals[0],
+            total_claims=benefit_totals[1],
+            total_cdkeys=benefit_totals[2],
+            available_cdkeys=benefit_totals[3],
+            blacklisted_users=blacklisted_users,
+            updated_at=datetime.utcnow()
+        ))
+    
+    def rebuild_all_stats(self, db: Session) -> int:
+        """重建所有福利的领取和库存计数以及所有创建者的统计，返回创建者数量"""
+        # 福利计数：在领取库分组统计，再写回目录库（两者可能不在同一个库，不能用关联子查询）
+        counts: Dict[int, Dict[str, Any]] = {}
+        for benefit_id, total_cdkeys, available_cdkeys in db.execute(
+            select(
+                BenefitCDKey.benefit_id,
+                func.count(BenefitCDKey.id),
+                func.coalesce(func.sum(case((BenefitCDKey.is_claimed == False, 1), else_=0)), 0)
+            ).group_by(BenefitCDKey.benefit_id)
+        ):
+            counts[benefit_id] = {"_id": benefit_id, "_claims": 0, "_cdkeys": total_cdkeys, "_available": available_cdkeys}
+        for benefit_id, total_claims in db.execute(
+            select(BenefitClaim.benefit_id, func.count(BenefitClaim.id)).group_by(BenefitClaim.benefit_id)
+        ):
+            counts.setdefault(benefit_id, {"_id": benefit_id, "_cdkeys": 0, "_available": 0})["_claims"] = total_claims
+        
+        db.execute(
+            update(Benefit).values(total_claims=0, total_cdkeys=0, available_cdkeys=0),
+            execution_options={"synchronize_session": False}
+        )
+        if counts:
+            benefits = Benefit.__table__
+            db.execute(
+                update(benefits).where(benefits.c.id == bindparam("_id")).values(
+                    total_claims=bindparam("_claims"),
+                    total_cdkeys=bindparam("_cdkeys"),
+                    available_cdkeys=bindparam("_available")
+                ),
+                list(counts.values())
+            )
+        
+        # 创建者统计：先清空，再按分组聚合一次性写入
+        db.query(CreatorStats).delete()
+        stats: Dict[int, Dict[str, Any]] = {}
+        
+        def row_for(creator_id: int) -> Dict[str, Any]:
+            return stats.setdefault(creator_id, {
+                "creator_id": creator_id, "total_benefits": 0, "total_claims": 0,
+                "total_cdkeys": 0, "available_cdkeys": 0, "blacklisted_users": 0,
+                "updated_at": datetime.utcnow()
             })
         
-        return result
+        for creator_id, total_benefits, total_claims, total_cdkeys, available_cdkeys in db.execute(
+            select(
+                Benefit.creator_id,
+                func.count(Benefit.id),
+                func.coalesce(func.sum(Benefit.total_claims), 0),
+                func.coalesce(func.sum(Benefit.total_cdkeys), 0),
+                func.coalesce(func.sum(Benefit.available_cdkeys), 0)
+            ).group_by(Benefit.creator_id)
+        ):
+            row_for(creator_id).update(
+                total_benefits=total_benefits, total_claims=total_claims,
+                total_cdkeys=total_cdkeys, available_cdkeys=available_cdkeys
+            )
+        
+        for creator_id, blacklisted_users in db.execute(
+            select(PersonalBlacklist.creator_id, func.count(PersonalBlacklist.id)).group_by(PersonalBlacklist.creator_id)
+        ):
+            row_for(creator_id)["blacklisted_users"] = blacklisted_users
+        
+        if stats:
+            db.execute(insert(CreatorStats), list(stats.values()))
+        db.commit()
+        return len(stats)
+    
+    def _bump_creator_stats(self, db: Session, creator_id: int, **deltas: int) -> None:
+        """增量更新创建者统计（随调用方事务提交），汇总行不存在时按明细重建"""
+        values = {name: getattr(CreatorStats, name) + delta for name, delta in deltas.items() if delta}
+        if not values:
+            return
+        
+        # 确保重建时能统计到调用方尚未flush的改动
+        db.flush()
+        result = db.execute(
+            update(CreatorStats).where(CreatorStats.creator_id == creator_id).values(
+                **values, updated_at=datetime.utcnow()
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount == 0:
+            self.rebuild_creator_stats(db, creator_id)
 
 
 # 创建服务实例
@@ -3,9 +3,12 @@ import json
 from typing import Optional, Dict, Any
 from urllib.parse import urlencode
 from app.core.config import settings
+from app.core.metrics import observe_linuxdo
+from app.core.tracing import traced
 from app.schemas.schemas import LinuxDOUserInfo, LinuxDOUserSummary
 
 
+@traced
 class OAuthService:
     def __init__(self):
         self.client_id = settings.linuxdo_client_id
@@ -39,23 +42,17 @@ class OAuthService:
         
         async with httpx.AsyncClient(verify=False) as client:
             try:
-                response = await client.post(
-                    settings.linuxdo_token_url,
-                    data=data,
-                    headers=headers
-                )
-                print(f"Token request URL: {settings.linuxdo_token_url}")
-                print(f"Token request data: {data}")
-                print(f"Token response status: {response.status_code}")
-                print(f"Token response text: {response.text}")
-                response.raise_for_status()
-                token_data = response.json()
+                with observe_linuxdo("token"):
+                    response = await client.post(
+                        settings.linuxdo_token_url,
+                        data=data,
+                        headers=headers
+                    )
+                    response.raise_for_status()
+                    token_data = response.json()
                 return token_data.get("access_token")
-            except Exception as e:
-                print(f"Token exchange error: {e}")
-                if hasattr(e, 'response'):
-                    print(f"Response status: {e.response.status_code}")
-                    print(f"Response text: {e.response.text}")
+            except Exception:
+                # 失败原因、耗时和响应内容已由 observe_linuxdo 记录
                 return None
     
     async def get_user_info(self, access_token: str) -> Optional[LinuxDOUserInfo]:
@@ -67,15 +64,15 @@ class OAuthService:
         
         async with httpx.AsyncClient(verify=False) as client:
             try:
-                response = await client.get(
-                    settings.linuxdo_user_info_url,
-                    headers=headers
-                )
-                response.raise_for_status()
-                user_data = response.json()
-                return LinuxDOUserInfo(**user_data)
-            except Exception as e:
-                print(f"User info error: {e}")
+                with observe_linuxdo("user_info"):
+                    response = await client.get(
+                        settings.linuxdo_user_info_url,
+                        headers=headers
+                    )
+                    response.raise_for_status()
+                    user_info = LinuxDOUserInfo(**response.json())
+                return user_info
+            except Exception:
                 return None
     
     async def get_user_summary(self, username: str) -> Optional[LinuxDOUserSummary]:
@@ -96,17 +93,16 @@ class OAuthService:
         
         async with httpx.AsyncClient(verify=False) as client:
             try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                summary_data = response.json()
-                
-                # 提取user_summary部分
-                if "user_summary" in summary_data:
-                    summary = summary_data["user_summary"]
-                    return LinuxDOUserSummary(**summary)
-                return None
-            except Exception as e:
-                print(f"User summary error: {e}")
+                with observe_linuxdo("user_summary"):
+                    response = await client.get(url, headers=headers)
+                    response.raise_for_status()
+                    summary_data = response.json()
+
+                    # 提取user_summary部分
+                    if "user_summary" not in summary_data:
+                        return None
+                    return LinuxDOUserSummary(**summary_data["user_summary"])
+            except Exception:
                 return None
 
 
@@ -1,14 +1,22 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Dict, Any, Sequence
 from app.models.models import User
 from app.schemas.schemas import UserCreate, UserUpdate, LinuxDOUserInfo
+from app.core.tracing import traced
 
 
+@traced
 class UserService:
     def get_user_by_id(self, db: Session, user_id: int) -> Optional[User]:
         """根据ID获取用户"""
         return db.query(User).filter(User.id == user_id).first()
     
+    def get_user_fields(self, db: Session, user_id: int, columns: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        """只查询指定列的用户信息"""
+        row = db.execute(select(*columns).where(User.id == user_id)).mappings().first()
+        return dict(row) if row else None
+    
     def get_user_by_linuxdo_id(self, db: Session, linuxdo_id: int) -> Optional[User]:
         """根据LinuxDO ID获取用户"""
         return db.query(User).filter(User.linuxdo_id == linuxdo_id).first()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+并发领取吞吐基准（SQLite）
+
+多个线程同时领取同一个CDKEY福利（每次领取一个独立会话、一个事务），对比：
+- default: 回滚日志模式、默认PRAGMA、多连接
+- wal:     WAL及 settings 中的PRAGMA、多连接
+- writer:  WAL + 单写连接（BEGIN IMMEDIATE，进程内排队写入）
+
+输出每秒领取数、失败数（database is locked 等）以及超发数（同一CDKEY被重复发放）。
+
+用法: python bench/claims.py [--claims 2000] [--threads 16]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 基准不访问LinuxDO，给必填配置一个占位值
+_workdir = tempfile.mkdtemp(prefix="bench-claims-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/app.db")
+for _name in ("LINUXDO_CLIENT_ID", "LINUXDO_CLIENT_SECRET", "LINUXDO_REDIRECT_URI", "SECRET_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.bulk import bulk_insert
+from app.db.database import create_db_engine
+from app.models.models import Base, Benefit, BenefitCDKey, BenefitClaim, User
+from app.services.benefit_service import benefit_service
+
+
+def seed(session_factory, claims: int) -> int:
+    db = session_factory()
+    try:
+        creator = User(linuxdo_id=0, username="creator", trust_level=4)
+        db.add(creator)
+        db.flush()
+        db.execute(insert(User), [{"linuxdo_id": i, "username": f"user{i}", "trust_level": 1} for i in range(1, claims + 1)])
+        benefit = Benefit(
+            title="bench", benefit_type="cdkey", creator_id=creator.id,
+            total_cdkeys=claims, available_cdkeys=claims
+        )
+        db.add(benefit)
+        db.flush()
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content"), [(benefit.id, f"KEY-{i}") for i in range(claims)],
+                    is_claimed=False, created_at=datetime.utcnow())
+        db.commit()
+        return benefit.id
+    finally:
+        db.close()
+
+
+def run_case(name: str, claims: int, threads: int, **engine_kwargs) -> None:
+    url = f"sqlite:///{_workdir}/{name}.db"
+    engine = create_db_engine(url, **engine_kwargs)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    benefit_id = seed(session_factory, claims)
+    db = session_factory()
+    user_ids = list(db.execute(select(User.id).where(User.username != "creator")).scalars())
+    benefit = db.get(Benefit, benefit_id)
+    db.expunge(benefit)
+    db.close()
+
+    def claim(user_id: int) -> bool:
+        db = session_factory()
+        try:
+            return benefit_service.claim_in_session(db, user_id, benefit).success
+        except OperationalError:
+            return False
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(claim, user_ids))
+    elapsed = time.perf_counter() - started
+
+    db = session_factory()
+    # 同一CDKEY被多次发放即为超发
+    claimed, distinct_cdkeys = db.execute(
+        select(func.count(BenefitClaim.id), func.count(BenefitClaim.cdkey_id.distinct()))
+    ).one()
+    db.close()
+    engine.dispose()
+
+    succeeded = sum(results)
+    print(f"{name:<8} {succeeded / elapsed:>10.0f} {succeeded:>8} {len(results) - succeeded:>7} {claimed - distinct_cdkeys:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{args.claims} claims, {args.threads} threads, workdir {_workdir}")
+    print(f"{'engine':<8} {'claims/s':>10} {'ok':>8} {'failed':>7} {'oversold':>9}")
+    run_case("default", args.claims, args.threads, pragmas={"journal_mode": "DELETE"})
+    run_case("wal", args.claims, args.threads)
+    run_case("writer", args.claims, args.threads, begin="IMMEDIATE", pool_size=1, max_overflow=0, pool_timeout=60)
+
+
+if __name__ == "__main__":
+    main()
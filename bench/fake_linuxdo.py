@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+本地LinuxDO替身服务（基准测试用）
+
+实现应用访问的三个接口，响应延迟和错误率可配置：
+- POST /oauth2/token              授权码即用户名（如 user42），返回 access_token
+- GET  /api/user                  按 Bearer 令牌返回用户信息，userN 的 LinuxDO ID 为 N
+- GET  /u/{username}/summary.json 用户统计（由用户名确定，同一用户每次相同）
+
+用法: python bench/fake_linuxdo.py [--port 9100] [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.01]
+应用通过 LINUXDO_TOKEN_URL、LINUXDO_USER_INFO_URL、LINUXDO_USER_SUMMARY_URL 指向本服务，见 linuxdo_env()。
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import zlib
+from typing import Dict
+
+from fastapi import FastAPI, Form, Header
+from fastapi.responses import JSONResponse
+
+_USERNAME_ID = re.compile(r"^user(\d+)$")
+
+
+def linuxdo_id(username: str) -> int:
+    """userN 对应 N，其他用户名取CRC32"""
+    match = _USERNAME_ID.match(username)
+    return int(match.group(1)) if match else zlib.crc32(username.encode())
+
+
+def linuxdo_env(base_url: str) -> Dict[str, str]:
+    """让应用访问本服务的环境变量"""
+    return {
+        "LINUXDO_TOKEN_URL": f"{base_url}/oauth2/token",
+        "LINUXDO_USER_INFO_URL": f"{base_url}/api/user",
+        "LINUXDO_USER_SUMMARY_URL": base_url + "/u/{username}/summary.json",
+    }
+
+
+def create_app(latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0) -> FastAPI:
+    """latency_ms ± jitter_ms 的均匀分布延迟；error_rate 比例的请求返回502"""
+    app = FastAPI(title="fake linux.do")
+    stats = {"requests": 0, "errors": 0}
+
+    async def simulate():
+        """模拟网络和上游延迟，返回 None 或错误响应"""
+        stats["requests"] += 1
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "bad_gateway"}, status_code=502)
+        return None
+
+    @app.post("/oauth2/token")
+    async def token(code: str = Form(...), client_id: str = Form(None), client_secret: str = Form(None)):
+        error = await simulate()
+        if error:
+            return error
+        if not code or code == "invalid":
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        return {"access_token": f"token-{code}", "token_type": "bearer", "expires_in": 3600}
+
+    @app.get("/api/user")
+    async def user(authorization: str = Header(None)):
+        error = await simulate()
+        if error:
+            return error
+        if not authorization or not authorization.startswith("Bearer token-"):
+            return JSONResponse({"error": "invalid_token"}, status_code=401)
+        username = authorization[len("Bearer token-"):]
+        user_id = linuxdo_id(username)
+        return {
+            "id": user_id,
+            "username": username,
+            "name": username,
+            "active": True,
+            "trust_level": user_id % 4 + 1,
+            "silenced": False,
+            "avatar_template": f"/user_avatar/linux.do/{username}/{{size}}/1.png",
+        }
+
+    @app.get("/u/{username}/summary.json")
+    async def summary(username: str):
+        error = await simulate()
+        if error:
+            return error
+        rng = random.Random(linuxdo_id(username))
+        return {"user_summary": {
+            "likes_given": rng.randint(0, 500),
+            "likes_received": rng.randint(0, 500),
+            "topics_entered": rng.randint(0, 2000),
+            "posts_read_count": rng.randint(0, 20000),
+            "days_visited": rng.randint(0, 365),
+            "topic_count": rng.randint(0, 50),
+            "post_count": rng.randint(0, 1000),
+            "time_read": rng.randint(0, 10 ** 6),
+            "recent_time_read": rng.randint(0, 10 ** 5),
+            "bookmark_count": rng.randint(0, 100),
+        }}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate),
+        host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
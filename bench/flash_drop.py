@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+抢购并发正确性与吞吐测试（SQLite）
+
+N 个进程 × 每进程 M 个异步任务同时调用 BenefitService.claim_benefit，
+争抢同一个CDKEY福利和同一个限量（max_claims）内容福利。部分用户会在不同进程中重复领取，
+用来检验重复领取的防护。结束后检查以下不变量，任一不成立时退出码为1：
+- 同一CDKEY只发放一次，且已领取的CDKEY与领取记录一一对应
+- 同一用户对同一福利只有一条领取记录
+- 福利的 total_claims 等于领取记录数（CDKEY福利的 available_cdkeys 等于未领取的CDKEY数）
+- 内容福利的领取记录数不超过 max_claims
+
+输出领取成功数、各类失败数和每秒领取数，可用于比较不同的写入策略：
+- writer: 单写连接（BEGIN IMMEDIATE，进程内排队写入，SQLITE_SINGLE_WRITER=true）
+- shared: 普通连接池上的延迟事务（SQLITE_SINGLE_WRITER=false），CDKEY、领取上限和重复领取均由条件更新和
+  唯一索引保证，不会超发；写锁冲突更多，用来比较吞吐和失败数
+
+用法: python bench/flash_drop.py [--processes 4] [--tasks 32] [--users 4000] [--keys 1000]
+      [--max-claims 1000] [--duplicates 0.1] [--strategy writer] [--split-claims]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 工作进程继承父进程的环境变量，使用同一个数据库
+if "FLASH_DROP_WORKDIR" not in os.environ:
+    os.environ["FLASH_DROP_WORKDIR"] = tempfile.mkdtemp(prefix="bench-flash-")
+_workdir = os.environ["FLASH_DROP_WORKDIR"]
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/app.db"
+for _name in ("DATABASE_READ_URL", "CLAIMS_DATABASE_READ_URL"):
+    os.environ.pop(_name, None)
+for _name in ("LINUXDO_CLIENT_ID", "LINUXDO_CLIENT_SECRET", "LINUXDO_REDIRECT_URI", "SECRET_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+STRATEGIES = {
+    "writer": {"SQLITE_SINGLE_WRITER": "true"},
+    "shared": {"SQLITE_SINGLE_WRITER": "false"},
+}
+
+
+def seed(users: int, keys: int, max_claims: int) -> Tuple[List[int], int, int]:
+    """返回 (用户ID列表, CDKEY福利ID, 内容福利ID)"""
+    from sqlalchemy import insert, select
+
+    from app.core.security import hash_cdkey
+    from app.db.bulk import bulk_insert
+    from app.db.database import SessionLocal, create_tables
+    from app.models.models import Benefit, BenefitCDKey, User
+
+    create_tables()
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        creator = User(linuxdo_id=0, username="creator", trust_level=4)
+        db.add(creator)
+        db.flush()
+        db.execute(insert(User), [
+            {"linuxdo_id": i, "username": f"user{i}", "trust_level": 1, "created_at": now}
+            for i in range(1, users + 1)
+        ])
+        user_ids = list(db.execute(select(User.id).where(User.id != creator.id)).scalars())
+
+        cdkey_benefit = Benefit(
+            title="flash cdkey", benefit_type="cdkey", creator_id=creator.id,
+            total_cdkeys=keys, available_cdkeys=keys
+        )
+        content_benefit = Benefit(
+            title="flash content", benefit_type="content", content="内容", creator_id=creator.id, max_claims=max_claims
+        )
+        db.add_all([cdkey_benefit, content_benefit])
+        db.flush()
+        contents = [f"FLASH-{i}" for i in range(keys)]
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"),
+                    [(cdkey_benefit.id, content, hash_cdkey(content)) for content in contents],
+                    is_claimed=False, created_at=now)
+        db.commit()
+        return user_ids, cdkey_benefit.id, content_benefit.id
+    finally:
+        db.close()
+
+
+def plan_attempts(user_ids: Sequence[int], benefit_ids: Sequence[int], duplicates: float,
+                  processes: int, rng: random.Random) -> List[List[Tuple[int, int]]]:
+    """每个用户领取每个福利一次，duplicates 比例的用户再领一次；重复的领取尽量分到其他进程"""
+    attempts = [(user_id, benefit_id) for user_id in user_ids for benefit_id in benefit_ids]
+    rng.shuffle(attempts)
+    repeats = rng.sample(attempts, int(len(attempts) * duplicates))
+    shares: List[List[Tuple[int, int]]] = [attempts[i::processes] for i in range(processes)]
+    for i, attempt in enumerate(repeats):
+        shares[(i + 1) % processes].append(attempt)
+    for share in shares:
+        rng.shuffle(share)
+    return shares
+
+
+def run_worker(attempts: List[Tuple[int, int]], tasks: int, start_at: float) -> Dict[str, Any]:
+    """工作进程：M 个任务依次取出领取请求，start_at（时间戳）时同时开始"""
+    return asyncio.run(_run_worker(attempts, tasks, start_at))
+
+
+async def _run_worker(attempts: List[Tuple[int, int]], tasks: int, start_at: float) -> Dict[str, Any]:
+    from sqlalchemy import select
+
+    from app.db.database import SessionLocal
+    from app.models.models import User
+    from app.services.benefit_service import benefit_service
+
+    db = SessionLocal()
+    user_ids = {user_id for user_id, _ in attempts}
+    users = {user.id: user for user in db.execute(select(User).where(User.id.in_(user_ids))).scalars()}
+    db.expunge_all()
+    db.close()
+
+    outcomes: Counter = Counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    for attempt in attempts:
+        queue.put_nowait(attempt)
+
+    async def task():
+        while not queue.empty():
+            user_id, benefit_id = queue.get_nowait()
+            session = SessionLocal()
+            try:
+                result = await benefit_service.claim_benefit(session, users[user_id], benefit_id)
+                outcomes["success" if result.success else result.message] += 1
+            except Exception as e:
+                outcomes[f"error: {type(e).__name__}: {str(e).splitlines()[0][:80]}"] += 1
+            finally:
+                session.close()
+
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    started = time.perf_counter()
+    await asyncio.gather(*(task() for _ in range(tasks)))
+    return {"outcomes": outcomes, "elapsed": time.perf_counter() - started}
+
+
+def check_invariants(cdkey_benefit_id: int, content_benefit_id: int) -> List[Tuple[str, bool, str]]:
+    """(不变量, 是否成立, 详情)"""
+    from sqlalchemy import func, select
+
+    from app.db.database import SessionLocal
+    from app.models.models import Benefit, BenefitCDKey, BenefitClaim
+
+    db = SessionLocal()
+    try:
+        claim_counts = dict(db.execute(
+            select(BenefitClaim.benefit_id, func.count()).group_by(BenefitClaim.benefit_id)
+        ).all())
+        benefits = {benefit.id: benefit for benefit in db.query(Benefit).filter(
+            Benefit.id.in_([cdkey_benefit_id, content_benefit_id])
+        )}
+        claim_rows, distinct_keys = db.execute(
+            select(func.count(BenefitClaim.cdkey_id), func.count(BenefitClaim.cdkey_id.distinct()))
+            .where(BenefitClaim.benefit_id == cdkey_benefit_id)
+        ).one()
+        claimed_keys, unclaimed_keys = db.execute(
+            select(
+                func.count().filter(BenefitCDKey.is_claimed.is_(True)),
+                func.count().filter(BenefitCDKey.is_claimed.is_(False)),
+            ).where(BenefitCDKey.benefit_id == cdkey_benefit_id),
+            bind_arguments={"mapper": BenefitCDKey}
+        ).one()
+        double_claims = db.execute(
+            select(func.count()).select_from(
+                select(BenefitClaim.user_id).group_by(BenefitClaim.user_id, BenefitClaim.benefit_id)
+                .having(func.count() > 1).subquery()
+            ),
+            bind_arguments={"mapper": BenefitClaim}
+        ).scalar()
+    finally:
+        db.close()
+
+    cdkey, content = benefits[cdkey_benefit_id], benefits[content_benefit_id]
+    cdkey_claims, content_claims = claim_counts.get(cdkey_benefit_id, 0), claim_counts.get(content_benefit_id, 0)
+    return [
+        ("no key issued twice", claim_rows == distinct_keys == claimed_keys,
+         f"{claim_rows} claims, {distinct_keys} distinct keys, {claimed_keys} keys marked claimed"),
+        ("no user claims twice", double_claims == 0, f"{double_claims} duplicated (user, benefit) pairs"),
+        ("total_claims equals rows",
+         cdkey.total_claims == cdkey_claims and content.total_claims == content_claims
+         and cdkey.available_cdkeys == unclaimed_keys,
+         f"cdkey {cdkey.total_claims}/{cdkey_claims} (available {cdkey.available_cdkeys}/{unclaimed_keys}), "
+         f"content {content.total_claims}/{content_claims}"),
+        ("max_claims not exceeded", content_claims <= content.max_claims, f"{content_claims} <= {content.max_claims}"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=32, help="每个进程的并发任务数")
+    parser.add_argument("--users", type=int, default=4000)
+    parser.add_argument("--keys", type=int, default=1000, help="CDKEY福利的CDKEY数")
+    parser.add_argument("--max-claims", type=int, default=1000, help="内容福利的 max_claims")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="重复领取的比例")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="writer")
+    parser.add_argument("--split-claims", action="store_true", help="领取和CDKEY使用独立的数据库")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # 在导入应用之前确定配置，工作进程继承同样的环境变量
+    os.environ.update(STRATEGIES[args.strategy])
+    if args.split_claims:
+        os.environ["CLAIMS_DATABASE_URL"] = f"sqlite:///{_workdir}/claims.db"
+    else:
+        os.environ.pop("CLAIMS_DATABASE_URL", None)
+
+    user_ids, cdkey_benefit_id, content_benefit_id = seed(args.users, args.keys, args.max_claims)
+    shares = plan_attempts(user_ids, (cdkey_benefit_id, content_benefit_id), args.duplicates,
+                           args.processes, random.Random(args.seed))
+    print(f"{sum(map(len, shares))} claim attempts, {args.processes} processes x {args.tasks} tasks, "
+          f"strategy {args.strategy}{', split claims store' if args.split_claims else ''}, workdir {_workdir}")
+
+    # 预留进程启动和导入应用的时间，所有进程同时开始
+    start_at = time.time() + 3 + args.processes * 0.5
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(run_worker, share, args.tasks, start_at) for share in shares]
+        results = [future.result() for future in futures]
+
+    outcomes: Counter = Counter()
+    for result in results:
+        outcomes.update(result["outcomes"])
+    elapsed = max(result["elapsed"] for result in results)
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:<40} {count:>8}")
+    print(f"{outcomes['success'] / elapsed:.0f} claims/s, {sum(outcomes.values()) / elapsed:.0f} attempts/s, {elapsed:.2f}s")
+
+    failed = False
+    for name, ok, detail in check_invariants(cdkey_benefit_id, content_benefit_id):
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {detail}")
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
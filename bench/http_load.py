@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+HTTP负载基准
+
+在临时目录中灌入数据，启动应用（uvicorn，单进程）和本地LinuxDO替身（bench/fake_linuxdo.py），
+由异步负载驱动按场景回放请求，输出每类请求的吞吐和 p50/p95/p99 延迟。全程离线，
+固定 --seed 时请求序列可重复。
+
+场景：
+- browse: 浏览目录（公开列表、搜索、福利详情、我的领取，匿名和登录用户混合）
+- login:  登录风暴（/oauth/login + /oauth/callback，每次回调访问LinuxDO的token和用户信息接口）
+- claims: 抢购（大量不同用户同时领取同一个CDKEY福利，其中一半为高级模式福利，会访问用户统计接口）
+- mixed:  以上三类按 70/10/20 混合
+
+用法: python bench/http_load.py [--scenario mixed] [--concurrency 50] [--duration 20]
+      [--fake-latency-ms 50] [--fake-error-rate 0.01] [--split-claims] [--json result.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 应用进程和本进程（灌数据、签发JWT）使用同一份配置
+_workdir = tempfile.mkdtemp(prefix="bench-http-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/app.db"
+for _name in ("DATABASE_READ_URL", "CLAIMS_DATABASE_URL", "CLAIMS_DATABASE_READ_URL"):
+    os.environ.pop(_name, None)
+for _name in ("LINUXDO_CLIENT_ID", "LINUXDO_CLIENT_SECRET", "LINUXDO_REDIRECT_URI", "SECRET_KEY"):
+    os.environ.setdefault(_name, "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+from fake_linuxdo import linuxdo_env
+
+API = "/api/v1"
+
+# 场景中的操作及权重
+SCENARIOS: Dict[str, Sequence[Tuple[str, int]]] = {
+    "browse": [("public", 40), ("search", 15), ("benefit", 30), ("my_history", 15)],
+    "login": [("login", 1)],
+    "claims": [("claim", 1)],
+    "mixed": [("public", 28), ("search", 10), ("benefit", 22), ("my_history", 10), ("login", 10), ("claim", 20)],
+}
+
+SEARCH_TERMS = ("游戏", "会员", "CDKEY", "教程", "bench")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(users: int, benefits: int, flash_keys: int) -> Dict[str, Any]:
+    """灌入用户、目录福利和两个抢购福利，返回场景需要的ID"""
+    from sqlalchemy import insert, select
+
+    from app.core.security import hash_cdkey
+    from app.db.bulk import bulk_insert
+    from app.db.database import SessionLocal, create_tables
+    from app.models.models import Benefit, BenefitCDKey, BenefitClaim, User
+    from app.services.benefit_service import benefit_service
+
+    create_tables()
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        # userN 的 LinuxDO ID 为 N，与替身服务一致；前5%为创建者
+        db.execute(insert(User), [
+            {"linuxdo_id": i, "username": f"user{i}", "name": f"user{i}", "trust_level": i % 4 + 1,
+             "advanced_mode_agreed": True, "created_at": now, "updated_at": now}
+            for i in range(users)
+        ])
+        user_ids = list(db.execute(select(User.id).order_by(User.linuxdo_id)).scalars())
+        creator_ids = user_ids[:max(1, users // 20)]
+
+        db.execute(insert(Benefit), [
+            {
+                "title": f"{rng.choice(SEARCH_TERMS)} 福利 #{i}",
+                "description": "基准测试福利，" + "每人限领一份。" * rng.randint(1, 8),
+                "content": "福利内容" if i % 2 == 0 else None,
+                "benefit_type": "content" if i % 2 == 0 else "cdkey",
+                "visibility": "public", "mode": "normal", "min_trust_level": 0,
+                "creator_id": rng.choice(creator_ids), "is_active": True, "total_claims": 0,
+                "total_cdkeys": 0, "available_cdkeys": 0, "created_at": now, "updated_at": now,
+            }
+            for i in range(benefits)
+        ])
+        catalog_ids = list(db.execute(select(Benefit.id)).scalars())
+
+        # 部分用户已领过目录中的福利，"我的领取"有数据
+        db.execute(insert(BenefitClaim), [
+            {"user_id": rng.choice(user_ids), "benefit_id": benefit_id, "claimed_at": now}
+            for benefit_id in rng.sample(catalog_ids, len(catalog_ids) // 2)
+        ])
+
+        flash_ids = []
+        for mode in ("normal", "advanced"):
+            flash = Benefit(
+                title=f"bench 抢购 {mode}", description="抢购", benefit_type="cdkey", mode=mode,
+                creator_id=creator_ids[0], total_cdkeys=flash_keys, available_cdkeys=flash_keys
+            )
+            db.add(flash)
+            db.flush()
+            contents = [f"FLASH-{mode}-{i}" for i in range(flash_keys)]
+            bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"),
+                        [(flash.id, content, hash_cdkey(content)) for content in contents],
+                        is_claimed=False, created_at=now)
+            flash_ids.append(flash.id)
+        db.commit()
+
+        for creator_id in creator_ids:
+            benefit_service.rebuild_creator_stats(db, creator_id)
+        db.commit()
+        return {"users": user_ids, "catalog": catalog_ids, "flash": flash_ids}
+    finally:
+        db.close()
+
+
+def start_process(args: List[str], env: Dict[str, str], health_url: str, timeout: float = 30) -> subprocess.Popen:
+    process = subprocess.Popen(args, cwd=ROOT, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{args} exited with code {process.returncode}")
+        try:
+            if httpx.get(health_url, timeout=1).status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{health_url} not ready after {timeout}s")
+
+
+class Recorder:
+    """按操作名记录每次请求的耗时和结果"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.rejected: Dict[str, int] = defaultdict(int)  # 4xx（如已领完、已领取）
+        self.errors: Dict[str, int] = defaultdict(int)    # 5xx 和连接错误
+        self.enabled = True
+
+    def record(self, name: str, elapsed: float, status: Optional[int]) -> None:
+        if not self.enabled:
+            return
+        self.latencies[name].append(elapsed)
+        if status is None or status >= 500:
+            self.errors[name] += 1
+        elif status >= 400:
+            self.rejected[name] += 1
+
+
+class LoadDriver:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, ids: Dict[str, Any], rng: random.Random):
+        from app.core.security import create_access_token
+
+        self.client = client
+        self.recorder = recorder
+        self.ids = ids
+        self.rng = rng
+        self.tokens = {
+            user_id: {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+            for user_id in ids["users"]
+        }
+        # 抢购时每个用户只领一次，按随机顺序依次出场
+        self.claimers = list(ids["users"])
+        rng.shuffle(self.claimers)
+        self.next_login = 0
+
+    async def request(self, name: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, API + path, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(name, time.perf_counter() - started, None)
+            return None
+        self.recorder.record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    def _user_headers(self) -> Dict[str, str]:
+        return self.tokens[self.rng.choice(self.ids["users"])]
+
+    async def public(self):
+        headers = self._user_headers() if self.rng.random() < 0.5 else {}
+        await self.request("public", "GET", f"/benefits/public?skip={self.rng.randint(0, 3) * 20}&limit=20", headers=headers)
+
+    async def search(self):
+        await self.request("search", "GET", f"/benefits/search?q={self.rng.choice(SEARCH_TERMS)}&limit=20")
+
+    async def benefit(self):
+        headers = self._user_headers() if self.rng.random() < 0.5 else {}
+        await self.request("benefit", "GET", f"/benefits/{self.rng.choice(self.ids['catalog'])}", headers=headers)
+
+    async def my_history(self):
+        await self.request("my_history", "GET", "/benefits/my/history?limit=20", headers=self._user_headers())
+
+    async def login(self):
+        # 九成为已有用户再次登录，一成为新用户首次登录
+        if self.rng.random() < 0.9:
+            username = f"user{self.rng.randrange(len(self.ids['users']))}"
+        else:
+            username = f"user{len(self.ids['users']) + self.next_login}"
+            self.next_login += 1
+        response = await self.request("oauth_login", "GET", "/oauth/login")
+        if response is not None and response.status_code == 200:
+            state = response.json()["state"]
+            await self.request("oauth_callback", "GET", f"/oauth/callback?code={username}&state={state}")
+
+    async def claim(self):
+        user_id = self.claimers.pop() if self.claimers else self.rng.choice(self.ids["users"])
+        benefit_id = self.ids["flash"][user_id % 2]
+        await self.request("claim", "POST", f"/benefits/{benefit_id}/claim", headers=self.tokens[user_id])
+
+    def pick(self, scenario: str) -> Callable:
+        names, weights = zip(*SCENARIOS[scenario])
+        return getattr(self, self.rng.choices(names, weights)[0])
+
+
+async def run_load(base_url: str, ids: Dict[str, Any], args) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        driver = LoadDriver(client, recorder, ids, random.Random(args.seed))
+        remaining = args.requests
+
+        async def worker(deadline: float):
+            nonlocal remaining
+            while time.monotonic() < deadline:
+                if args.requests:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                await driver.pick(args.scenario)()
+
+        # 预热（不计入结果）：建立连接、填充缓存
+        if args.warmup > 0:
+            recorder.enabled = False
+            warmup = LoadDriver(client, recorder, ids, random.Random(args.seed + 1))
+            deadline = time.monotonic() + args.warmup
+            await asyncio.gather(*(_repeat(warmup, "browse", deadline) for _ in range(args.concurrency)))
+            recorder.enabled = True
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + (args.duration if not args.requests else float("inf"))
+        await asyncio.gather(*(worker(deadline) for _ in range(args.concurrency)))
+        return recorder, time.perf_counter() - started
+
+
+async def _repeat(driver: LoadDriver, scenario: str, deadline: float):
+    while time.monotonic() < deadline:
+        await driver.pick(scenario)()
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法百分位"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    everything: List[float] = []
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        everything.extend(values)
+        results[name] = _stats(values, elapsed, recorder.rejected[name], recorder.errors[name])
+    results["total"] = _stats(
+        sorted(everything), elapsed, sum(recorder.rejected.values()), sum(recorder.errors.values())
+    )
+    return results
+
+
+def _stats(values: List[float], elapsed: float, rejected: int, errors: int) -> Dict[str, float]:
+    return {
+        "requests": len(values),
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "rejected": rejected,
+        "errors": errors,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=50, help="同时进行的虚拟用户数")
+    parser.add_argument("--duration", type=float, default=20, help="测量时长（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="改为执行固定数量的操作")
+    parser.add_argument("--warmup", type=float, default=2, help="预热时长（秒），不计入结果")
+    parser.add_argument("--timeout", type=float, default=30, help="单个请求的超时（秒）")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--benefits", type=int, default=500)
+    parser.add_argument("--flash-keys", type=int, default=500, help="每个抢购福利的CDKEY数")
+    parser.add_argument("--fake-latency-ms", type=float, default=50, help="LinuxDO替身的平均响应延迟")
+    parser.add_argument("--fake-jitter-ms", type=float, default=20)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="LinuxDO替身返回502的比例")
+    parser.add_argument("--split-claims", action="store_true", help="领取和CDKEY使用独立的数据库")
+    parser.add_argument("--seed", type=int, default=1, help="请求序列的随机种子")
+    parser.add_argument("--json", help="结果另存为JSON文件，便于对比")
+    args = parser.parse_args()
+
+    if args.split_claims:
+        os.environ["CLAIMS_DATABASE_URL"] = f"sqlite:///{_workdir}/claims.db"
+
+    print(f"seeding {args.users} users, {args.benefits} benefits in {_workdir}")
+    ids = seed(args.users, args.benefits, args.flash_keys)
+
+    fake_url = f"http://127.0.0.1:{free_port()}"
+    app_url = f"http://127.0.0.1:{free_port()}"
+    env = {**os.environ, **linuxdo_env(fake_url)}
+    fake = start_process([
+        sys.executable, os.path.join(ROOT, "bench", "fake_linuxdo.py"), "--port", fake_url.rsplit(":", 1)[1],
+        "--latency-ms", str(args.fake_latency_ms), "--jitter-ms", str(args.fake_jitter_ms),
+        "--error-rate", str(args.fake_error_rate),
+    ], env, f"{fake_url}/stats")
+    app = None
+    try:
+        app = start_process([
+            sys.executable, "-m", "uvicorn", "main:app", "--port", app_url.rsplit(":", 1)[1],
+            "--log-level", "warning", "--no-access-log",
+        ], env, f"{app_url}/health")
+
+        print(f"scenario {args.scenario}, concurrency {args.concurrency}, "
+              + (f"{args.requests} operations" if args.requests else f"{args.duration:g}s"))
+        recorder, elapsed = asyncio.run(run_load(app_url, ids, args))
+        fake_stats = httpx.get(f"{fake_url}/stats").json()
+    finally:
+        for process in (app, fake):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    results = summarize(recorder, elapsed)
+    print(f"{'operation':<15} {'requests':>9} {'req/s':>9} {'4xx':>6} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:<15} {stats['requests']:>9} {stats['rps']:>9.1f} {stats['rejected']:>6} {stats['errors']:>7} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    print(f"linux.do stand-in: {fake_stats['requests']} requests, {fake_stats['errors']} injected errors")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "elapsed": elapsed, "results": results, "linuxdo": fake_stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
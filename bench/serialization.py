@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+列表响应序列化开销基准
+
+对比一页福利列表（默认100条）在不同序列化路径下的耗时：
+- before: ORM对象 -> 完整Benefit模式校验 -> jsonable_encoder -> json.dumps
+- orjson: ORM对象 -> 完整Benefit模式校验 -> orjson（仅替换序列化器）
+- card:   投影行 -> BenefitCard模式校验 -> orjson（FastJSONResponse）
+- dump_json: 投影行 -> BenefitCard模式校验 -> pydantic-core直接输出JSON
+
+用法: python bench/serialization.py [--rows 100] [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.serialization import FastJSONResponse
+from app.models.models import Benefit as BenefitModel
+from app.schemas.schemas import Benefit, BenefitCard
+
+
+def build_orm_rows(count: int) -> List[BenefitModel]:
+    now = datetime.utcnow()
+    return [
+        BenefitModel(
+            id=i,
+            title=f"🎮 游戏CDKEY大放送 #{i}",
+            description="限量游戏CDKEY，先到先得！每人限领一个。" * 4,
+            content="恭喜获得福利！\n" * 40,
+            secret="秘密内容" * 20,
+            benefit_type="cdkey" if i % 2 else "content",
+            visibility="public",
+            access_password=None,
+            mode="normal",
+            min_trust_level=i % 4,
+            is_active=True,
+            total_claims=i * 3,
+            max_claims=None,
+            creator_id=1 + i % 7,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def project_rows(orm_rows: List[BenefitModel]) -> List[dict]:
+    keys = list(BenefitCard.model_fields)
+    return [{key: getattr(row, key) for key in keys} for row in orm_rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    orm_rows = build_orm_rows(args.rows)
+    card_rows = project_rows(orm_rows)
+
+    full_adapter = TypeAdapter(List[Benefit])
+    card_adapter = TypeAdapter(List[BenefitCard])
+    response = FastJSONResponse(content=None)
+
+    def before():
+        validated = full_adapter.validate_python(orm_rows, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated)).encode()
+
+    def full_orjson():
+        validated = full_adapter.validate_python(orm_rows, from_attributes=True)
+        return response.render(full_adapter.dump_python(validated, mode="json"))
+
+    def card():
+        validated = card_adapter.validate_python(card_rows)
+        return response.render(card_adapter.dump_python(validated, mode="json"))
+
+    def dump_json():
+        return card_adapter.dump_json(card_adapter.validate_python(card_rows))
+
+    cases = [("before", before), ("orjson", full_orjson), ("card", card), ("dump_json", dump_json)]
+    baseline = None
+    print(f"{args.rows} rows per response, {args.iterations} iterations")
+    print(f"{'path':<10} {'us/response':>12} {'bytes':>8} {'speedup':>8}")
+    for name, func in cases:
+        size = len(func())
+        per_call = min(timeit.repeat(func, number=args.iterations, repeat=3)) / args.iterations * 1e6
+        baseline = baseline or per_call
+        print(f"{name:<10} {per_call:>12.1f} {size:>8} {baseline / per_call:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,43 @@
-from fastapi import FastAPI
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from app.core.config import settings
+from app.core.log import setup_logging
+from app.core.metrics import MetricsMiddleware, pools_snapshot, render_prometheus
+from app.core.query_profiler import QueryProfilerMiddleware, profile_engine
+from app.core.profiling import RequestProfilerMiddleware
+from app.core.tracing import TracingMiddleware, trace_engine
+from app.core.serialization import FastJSONResponse
 from app.api.api import api_router
-from app.db.database import engine
-from app.models.models import Base
+from app.db.database import DATABASE_BUSY_ERRORS, engine, all_engines, create_tables, is_database_busy
+from app.db.search import init_benefit_search
+from app.services.benefit_service import benefit_service
+
+# 日志经队列由后台线程输出
+setup_logging()
 
 # 创建数据库表
-Base.metadata.create_all(bind=engine)
+create_tables()
+
+# 创建福利全文检索索引
+init_benefit_search(engine)
+
+# 按请求统计SQL查询，开启链路追踪时为每条语句记录span
+for db_engine in all_engines():
+    profile_engine(db_engine)
+    trace_engine(db_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 继续清理上次运行中未完成的已删除福利（多个worker同时启动时按福利认领，不会重复清理）
+    threading.Thread(target=benefit_service.resume_pending_purges, daemon=True).start()
+    yield
+
 
 app = FastAPI(
     title=settings.app_name,
@@ -16,7 +45,9 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/api/v1/openapi.json",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -26,7 +57,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Query-Time-Ms", "X-DB-N-Plus-One", "Server-Timing", "X-Profile-Id", "X-Profile-Concurrent", "X-Trace-Id"],
 )
+# 后添加的中间件在外层：MetricsMiddleware 需要读取 QueryProfilerMiddleware 的SQL统计，
+# TracingMiddleware 在其外层，根span包含指标和SQL统计的开销
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(QueryProfilerMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestProfilerMiddleware)
+
+
+async def database_busy_handler(request: Request, exc: Exception):
+    """写入高峰时等待写连接超时或数据库被锁：返回503让客户端稍后重试，而不是500"""
+    if not is_database_busy(exc):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": str(settings.db_busy_retry_after)}
+    )
+
+
+for _busy_error in DATABASE_BUSY_ERRORS:
+    app.add_exception_handler(_busy_error, database_busy_handler)
+
 
 # 包含API路由
 app.include_router(api_router, prefix="/api/v1")
@@ -51,3 +105,15 @@ async def demo_page():
 async def health_check():
     """健康检查"""
     return {"status": "healthy", "service": settings.app_name}
+
+
+@app.get("/health/pool")
+async def pool_health():
+    """数据库连接池状态：签出数、等待连接耗时分布、超时次数"""
+    return {"pools": pools_snapshot()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus指标（文本格式）"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -9,7 +9,8 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.search import init_benefit_search, clear_benefit_index
 from app.models.models import User, Benefit, BenefitClaim, BenefitCDKey
 from app.schemas.schemas import BenefitCreate
 from app.services.benefit_service import benefit_service
@@ -182,6 +183,8 @@ def create_test_benefits():
         try:
             benefit = benefit_service.create_benefit(db, benefit_data, test_user.id)
             print(f"✅ 成功创建福利: {benefit.title}")
+            if benefit.duplicate_cdkeys:
+                print(f"   ⚠️  跳过 {benefit.duplicate_cdkeys} 个重复CDKEY")
         except Exception as e:
             print(f"❌ 创建福利失败: {benefit_data.title}, 错误: {e}")
     
@@ -189,93 +192,176 @@ def create_test_benefits():
     print(f"\n🎉 测试福利创建完成！")
 
 
-def list_users():
-    """列出所有用户"""
-    db = get_db()
-    users = db.query(User).all()
-    
-    if not users:
-        print("📝 暂无用户数据")
-        return
-    
-    print("👥 用户列表:")
-    print("-" * 80)
-    print(f"{'ID':<5} {'LinuxDO ID':<12} {'用户名':<20} {'昵称':<15} {'信任等级':<10} {'高级模式'}")
-    print("-" * 80)
-    
-    for user in users:
-        advanced_status = "✅" if user.advanced_mode_agreed else "❌"
-        print(f"{user.id:<5} {user.linuxdo_id:<12} {user.username:<20} {user.name or 'N/A':<15} Level {user.trust_level:<6} {advanced_status}")
+LIST_FORMATS = ("table", "csv", "json")
+
+
+def _list_args(prog: str, argv, benefit_help: str):
+    """列表命令的公共参数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog=f"manage.py {prog}")
+    parser.add_argument("--limit", type=int, default=None, help="最多输出的行数")
+    parser.add_argument("--benefit", type=int, default=None, help=benefit_help)
+    parser.add_argument("--format", choices=LIST_FORMATS, default="table", help="输出格式，json 为每行一个JSON对象")
+    return parser.parse_args(argv)
+
+
+def _print_rows(rows, columns, output_format, title, header, width, format_row, empty_message):
+    """输出逐行读取的查询结果：table 为对齐的文本，csv/json 直接写字节流"""
+    from app.core.streaming import encode_csv, encode_ndjson
     
-    db.close()
+    try:
+        if output_format != "table":
+            out = sys.stdout.buffer
+            chunks = encode_csv(columns, rows) if output_format == "csv" else encode_ndjson(
+                {column: row[column] for column in columns} for row in rows
+            )
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+        
+        printed = False
+        for row in rows:
+            if not printed:
+                print(title)
+                print("-" * width)
+                print(header)
+                print("-" * width)
+                printed = True
+            print(format_row(row))
+        if not printed:
+            print(empty_message)
+    except BrokenPipeError:
+        # 输出被 head 等提前关闭
+        sys.stderr.close()
 
 
-def list_benefits():
-    """列出所有福利"""
-    db = get_db()
-    benefits = db.query(Benefit).all()
+def list_users(argv=()):
+    """列出用户（--benefit 时为领取过该福利的用户）"""
+    from sqlalchemy import select
+    from app.core.streaming import enrich_rows, iter_rows
+    
+    args = _list_args("list-users", argv, "只列出领取过该福利的用户")
+    user_columns = (User.id, User.linuxdo_id, User.username, User.name, User.trust_level, User.advanced_mode_agreed)
+    if args.benefit is None:
+        stmt = select(*user_columns).order_by(User.id).limit(args.limit)
+        rows = iter_rows(stmt)
+    else:
+        # 领取记录可能在独立的领取库，按批到目录库补充用户信息
+        stmt = (
+            select(BenefitClaim.user_id.label("id"), BenefitClaim.claimed_at)
+            .where(BenefitClaim.benefit_id == args.benefit)
+            .order_by(BenefitClaim.id)
+            .limit(args.limit)
+        )
+        
+        def add_users(db: Session, batch):
+            users = {
+                row.id: row for row in db.execute(
+                    select(*user_columns).where(User.id.in_({claim["id"] for claim in batch}))
+                ).mappings()
+            }
+            for claim in batch:
+                claim.update(users.get(claim["id"]) or {column.key: None for column in user_columns[1:]})
+        
+        rows = enrich_rows(iter_rows(stmt), add_users)
     
-    if not benefits:
-        print("🎁 暂无福利数据")
-        return
+    def format_row(user):
+        advanced_status = "✅" if user["advanced_mode_agreed"] else "❌"
+        return f"{user['id']:<5} {user['linuxdo_id'] or 'N/A':<12} {user['username'] or 'N/A':<20} {user['name'] or 'N/A':<15} Level {user['trust_level'] if user['trust_level'] is not None else '-':<6} {advanced_status}"
     
-    print("🎁 福利列表:")
-    print("-" * 110)
-    print(f"{'ID':<5} {'标题':<20} {'类型':<8} {'可见性':<8} {'模式':<8} {'最低等级':<8} {'领取数':<12} {'状态'}")
-    print("-" * 110)
-    
-    for benefit in benefits:
-        status = "✅ 活跃" if benefit.is_active else "❌ 停用"
-        claims_info = f"{benefit.total_claims}"
-        if benefit.max_claims:
-            claims_info += f"/{benefit.max_claims}"
-        elif benefit.benefit_type == "cdkey":
+    columns = [column.key for column in user_columns] + (["claimed_at"] if args.benefit is not None else [])
+    _print_rows(
+        rows, columns, args.format, "👥 用户列表:",
+        f"{'ID':<5} {'LinuxDO ID':<12} {'用户名':<20} {'昵称':<15} {'信任等级':<10} {'高级模式'}", 80,
+        format_row, "📝 暂无用户数据"
+    )
+
+
+def list_benefits(argv=()):
+    """列出福利（CDKEY库存取自福利上的计数字段）"""
+    from sqlalchemy import select
+    from app.core.streaming import iter_rows
+    
+    args = _list_args("list-benefits", argv, "只列出该福利")
+    stmt = select(
+        Benefit.id, Benefit.title, Benefit.benefit_type, Benefit.visibility, Benefit.mode, Benefit.min_trust_level,
+        Benefit.total_claims, Benefit.max_claims, Benefit.total_cdkeys, Benefit.available_cdkeys, Benefit.is_active,
+        Benefit.creator_id, Benefit.created_at
+    ).order_by(Benefit.id).limit(args.limit)
+    if args.benefit is not None:
+        stmt = stmt.where(Benefit.id == args.benefit)
+    
+    def format_row(benefit):
+        status = "✅ 活跃" if benefit["is_active"] else "❌ 停用"
+        claims_info = f"{benefit['total_claims']}"
+        if benefit["max_claims"]:
+            claims_info += f"/{benefit['max_claims']}"
+        elif benefit["benefit_type"] == "cdkey":
             # 对于CDKEY类型，显示可用/总数
-            total_cdkeys = db.query(BenefitCDKey).filter(BenefitCDKey.benefit_id == benefit.id).count()
-            available_cdkeys = db.query(BenefitCDKey).filter(
-                BenefitCDKey.benefit_id == benefit.id,
-                BenefitCDKey.is_claimed == False
-            ).count()
-            claims_info = f"{available_cdkeys}/{total_cdkeys}"
-        
-        benefit_type = "内容" if benefit.benefit_type == "content" else "CDKEY"
-        visibility = "公开" if benefit.visibility == "public" else "私有"
-        mode = "普通" if benefit.mode == "normal" else "高级"
+            claims_info = f"{benefit['available_cdkeys']}/{benefit['total_cdkeys']}"
         
-        print(f"{benefit.id:<5} {benefit.title[:18]:<20} {benefit_type:<8} {visibility:<8} {mode:<8} Level {benefit.min_trust_level:<5} {claims_info:<12} {status}")
-    
-    db.close()
+        benefit_type = "内容" if benefit["benefit_type"] == "content" else "CDKEY"
+        visibility = "公开" if benefit["visibility"] == "public" else "私有"
+        mode = "普通" if benefit["mode"] == "normal" else "高级"
+        return f"{benefit['id']:<5} {benefit['title'][:18]:<20} {benefit_type:<8} {visibility:<8} {mode:<8} Level {benefit['min_trust_level']:<5} {claims_info:<12} {status}"
+    
+    _print_rows(
+        iter_rows(stmt), [column.key for column in stmt.selected_columns], args.format, "🎁 福利列表:",
+        f"{'ID':<5} {'标题':<20} {'类型':<8} {'可见性':<8} {'模式':<8} {'最低等级':<8} {'领取数':<12} {'状态'}", 110,
+        format_row, "🎁 暂无福利数据"
+    )
 
 
-def list_cdkeys():
-    """列出所有CDKEY状态"""
-    db = get_db()
-    cdkeys = db.query(BenefitCDKey).join(Benefit).all()
-    
-    if not cdkeys:
-        print("🎮 暂无CDKEY数据")
-        return
-    
-    print("🎮 CDKEY列表:")
-    print("-" * 120)
-    print(f"{'ID':<5} {'福利ID':<8} {'福利标题':<25} {'CDKEY':<25} {'状态':<8} {'领取者':<15} {'领取时间'}")
-    print("-" * 120)
-    
-    for cdkey in cdkeys:
-        status = "❌ 已领取" if cdkey.is_claimed else "✅ 可用"
+def _add_cdkey_details(db: Session, batch):
+    """为一批CDKEY补充福利标题和领取者用户名（福利和用户在目录库，CDKEY可能在独立的领取库）"""
+    from sqlalchemy import select
+    
+    titles = dict(db.execute(
+        select(Benefit.id, Benefit.title).where(Benefit.id.in_({cdkey["benefit_id"] for cdkey in batch}))
+    ).all())
+    user_ids = {cdkey["claimed_by_user_id"] for cdkey in batch if cdkey["claimed_by_user_id"]}
+    usernames = dict(db.execute(select(User.id, User.username).where(User.id.in_(user_ids))).all()) if user_ids else {}
+    for cdkey in batch:
+        cdkey["benefit_title"] = titles.get(cdkey["benefit_id"])
+        cdkey["claimed_by"] = usernames.get(cdkey["claimed_by_user_id"])
+
+
+def list_cdkeys(argv=()):
+    """列出CDKEY状态"""
+    from sqlalchemy import select
+    from app.core.streaming import enrich_rows, iter_rows
+    
+    args = _list_args("list-cdkeys", argv, "只列出该福利的CDKEY")
+    stmt = select(
+        BenefitCDKey.id, BenefitCDKey.benefit_id, BenefitCDKey.cdkey_content, BenefitCDKey.is_claimed,
+        BenefitCDKey.claimed_by_user_id, BenefitCDKey.claimed_at
+    ).order_by(BenefitCDKey.id).limit(args.limit)
+    if args.benefit is not None:
+        stmt = stmt.where(BenefitCDKey.benefit_id == args.benefit)
+    
+    def format_row(cdkey):
+        status = "❌ 已领取" if cdkey["is_claimed"] else "✅ 可用"
         claimed_by = "N/A"
         claimed_time = "N/A"
         
-        if cdkey.is_claimed and cdkey.claimed_by_user_id:
-            claimed_user = db.query(User).filter(User.id == cdkey.claimed_by_user_id).first()
-            if claimed_user:
-                claimed_by = claimed_user.username[:13]
-            if cdkey.claimed_at:
-                claimed_time = cdkey.claimed_at.strftime("%m-%d %H:%M")
+        if cdkey["is_claimed"] and cdkey["claimed_by_user_id"]:
+            if cdkey["claimed_by"]:
+                claimed_by = cdkey["claimed_by"][:13]
+            if cdkey["claimed_at"]:
+                claimed_time = cdkey["claimed_at"].strftime("%m-%d %H:%M")
         
-        print(f"{cdkey.id:<5} {cdkey.benefit_id:<8} {cdkey.benefit.title[:23]:<25} {cdkey.cdkey_content[:23]:<25} {status:<8} {claimed_by:<15} {claimed_time}")
-    
-    db.close()
+        return f"{cdkey['id']:<5} {cdkey['benefit_id']:<8} {(cdkey['benefit_title'] or 'N/A')[:23]:<25} {cdkey['cdkey_content'][:23]:<25} {status:<8} {claimed_by:<15} {claimed_time}"
+    
+    columns = [column.key for column in stmt.selected_columns]
+    columns[2:2] = ["benefit_title"]
+    columns.insert(columns.index("claimed_at"), "claimed_by")
+    _print_rows(
+        enrich_rows(iter_rows(stmt), _add_cdkey_details), columns, args.format, "🎮 CDKEY列表:",
+        f"{'ID':<5} {'福利ID':<8} {'福利标题':<25} {'CDKEY':<25} {'状态':<8} {'领取者':<15} {'领取时间'}", 120,
+        format_row, "🎮 暂无CDKEY数据"
+    )
 
 
 def show_benefit_details(benefit_id: int):
@@ -352,8 +438,10 @@ def clear_test_data():
         # 删除所有数据
         db.query(BenefitClaim).delete()
         db.query(BenefitCDKey).delete()
-        db.query(Benefit).delete()
-        db.commit()
+        db.query(Benefit).execution_options(include_deleted=True).delete()  # 包括已软删除的福利
+        clear_benefit_index(db)
+        # 创建者统计随福利一起清零（保留黑名单人数），并提交整个清理
+        benefit_service.rebuild_all_stats(db)
         print("✅ 测试数据清理完成")
     except Exception as e:
         db.rollback()
@@ -362,6 +450,145 @@ def clear_test_data():
         db.close()
 
 
+def rebuild_search_index():
+    """重建福利全文检索索引"""
+    if init_benefit_search(engine, rebuild=True):
+        print("✅ 福利搜索索引重建完成")
+    else:
+        print("⚠️  当前数据库不支持FTS5，搜索将使用LIKE匹配")
+
+
+def rebuild_stats():
+    """重建福利库存计数和创建者统计"""
+    db = get_db()
+    try:
+        creator_count = benefit_service.rebuild_all_stats(db)
+        print(f"✅ 统计重建完成，共 {creator_count} 个创建者")
+    finally:
+        db.close()
+
+
+def backfill_cdkey_hashes():
+    """为历史CDKEY补算内容哈希（启用去重索引前的数据）"""
+    db = get_db()
+    try:
+        result = benefit_service.backfill_cdkey_hashes(db)
+        print(f"✅ 已补算 {result['hashed']} 个CDKEY哈希")
+        if result["duplicates"]:
+            print(f"⚠️  {result['duplicates']} 个CDKEY与同一福利下已有内容重复，未写入哈希")
+    finally:
+        db.close()
+
+
+def seed_large(argv):
+    """生成大量合成数据（性能测试用）"""
+    import argparse
+    import time
+    from app.db.synthetic import SYNTHETIC_PASSWORD, generate
+    
+    parser = argparse.ArgumentParser(prog="manage.py seed-large", description="生成带偏斜分布的合成数据，相同 --seed 生成相同的数据")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--benefits", type=int, default=10_000)
+    parser.add_argument("--cdkeys", type=int, default=1_000_000)
+    parser.add_argument("--claims", type=int, default=2_000_000, help="目标领取数（受库存和 max_claims 限制）")
+    parser.add_argument("--blacklist", type=int, default=20_000)
+    parser.add_argument("--creator-ratio", type=float, default=0.02, help="发布过福利的用户比例")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="每个事务写入的行数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    
+    started = time.perf_counter()
+    
+    def progress(table, count):
+        print(f"\r  {table:<20} {count:>12,}  ({time.perf_counter() - started:.0f}s)", end="", flush=True)
+    
+    create_tables()
+    db = get_db()
+    try:
+        written = generate(
+            db, users=args.users, benefits=args.benefits, cdkeys=args.cdkeys, claims=args.claims,
+            blacklist=args.blacklist, creator_ratio=args.creator_ratio, seed=args.seed,
+            chunk_size=args.chunk_size, progress=progress
+        )
+        print()
+        print("📝 正在重建计数和统计...")
+        benefit_service.rebuild_all_stats(db)
+    finally:
+        db.close()
+    print("📝 正在重建搜索索引...")
+    init_benefit_search(engine, rebuild=True)
+    
+    for table, count in written.items():
+        print(f"  {table:<20} {count:>12,}")
+    print(f"✅ 共写入 {sum(written.values()):,} 行，用时 {time.perf_counter() - started:.0f}s（私有福利密码: {SYNTHETIC_PASSWORD}）")
+
+
+def import_benefits(argv):
+    """从JSONL/CSV文件批量导入福利和CDKEY（可中断后继续）"""
+    import argparse
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from app.db.importer import IMPORT_FORMATS, detect_format, import_benefits as run_import
+    
+    parser = argparse.ArgumentParser(
+        prog="manage.py import",
+        description="每行一个福利（字段同创建福利接口），cdkeys 内联或用 cdkeys_file 引用文件；中断后重新运行会从检查点继续"
+    )
+    parser.add_argument("file", help="JSONL或CSV文件（可为 .gz）")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="默认按扩展名判断")
+    parser.add_argument("--creator", default=None, help="记录未指定创建者时使用的用户名或用户ID")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务导入的记录数")
+    parser.add_argument("--workers", type=int, default=None, help="计算密码哈希的进程数（默认为CPU数）")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件（默认为 <file>.checkpoint.json）")
+    parser.add_argument("--restart", action="store_true", help="忽略已有的检查点，从头导入")
+    args = parser.parse_args(argv)
+    
+    if not os.path.isfile(args.file):
+        print(f"❌ 文件不存在: {args.file}")
+        return
+    checkpoint_path = args.checkpoint or f"{args.file}.checkpoint.json"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elif os.path.exists(checkpoint_path):
+        print(f"📝 从检查点继续: {checkpoint_path}")
+    
+    creator = args.creator
+    if creator is not None and creator.isdigit():
+        creator = int(creator)
+    started = time.perf_counter()
+    
+    def on_error(line, reason):
+        print(f"\n⚠️  第 {line} 行已跳过: {reason}")
+    
+    def progress(state):
+        print(f"\r  已处理 {state['records']:,} 条，导入福利 {state['benefits']:,}，CDKEY {state['cdkeys']:,}，"
+              f"跳过 {state['failed']:,}  ({time.perf_counter() - started:.0f}s)", end="", flush=True)
+    
+    create_tables()
+    db = get_db()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as hasher:
+            result = run_import(
+                db, args.file, hasher, file_format=args.format or detect_format(args.file), default_creator=creator,
+                batch_size=args.batch_size, checkpoint_path=checkpoint_path, on_error=on_error, progress=progress
+            )
+    finally:
+        db.close()
+    print()
+    print(f"✅ 导入完成: 共 {result['records']:,} 条记录，福利 {result['benefits']:,}，CDKEY {result['cdkeys']:,}，"
+          f"跳过 {result['failed']:,}，用时 {time.perf_counter() - started:.0f}s")
+
+
+def profile_token(minutes: int = 60):
+    """生成性能分析令牌（请求头 X-Profile-Token）"""
+    from app.core.profiling import create_profile_token, profiling_enabled
+    
+    if not profiling_enabled():
+        print("❌ 未配置 PROFILING_SECRET，性能分析未启用")
+        return
+    print(create_profile_token(minutes * 60))
+
+
 def main():
     if len(sys.argv) < 2:
         print("📋 LinuxDO福利分发平台管理工具")
@@ -371,7 +598,14 @@ def main():
         print("  python manage.py list-users        # 列出:所有用户")
         print("  python manage.py list-benefits     # 列出所有福利")
         print("  python manage.py list-cdkeys       # 列出所有CDKEY状态")
+        print("    列表命令可选 --limit N --benefit ID --format table|csv|json")
         print("  python manage.py clear-test-data   # 清理测试数据")
+        print("  python manage.py rebuild-search-index  # 重建福利搜索索引")
+        print("  python manage.py rebuild-stats     # 重建库存计数和创建者统计")
+        print("  python manage.py backfill-cdkey-hashes  # 为历史CDKEY补算去重哈希")
+        print("  python manage.py profile-token [分钟]  # 生成性能分析令牌（默认60分钟有效）")
+        print("  python manage.py seed-large [--users N ...]  # 生成大量合成数据（性能测试用，-h 查看参数）")
+        print("  python manage.py import 文件 [--creator 用户名]  # 从JSONL/CSV批量导入福利和CDKEY（-h 查看参数）")
         return
     
     command = sys.argv[1]
@@ -381,13 +615,25 @@ def main():
     elif command == "create-benefits":
         create_test_benefits()
     elif command == "list-users":
-        list_users()
+        list_users(sys.argv[2:])
     elif command == "list-benefits":
-        list_benefits()
+        list_benefits(sys.argv[2:])
     elif command == "list-cdkeys":
-        list_cdkeys()
+        list_cdkeys(sys.argv[2:])
     elif command == "clear-test-data":
         clear_test_data()
+    elif command == "rebuild-search-index":
+        rebuild_search_index()
+    elif command == "rebuild-stats":
+        rebuild_stats()
+    elif command == "backfill-cdkey-hashes":
+        backfill_cdkey_hashes()
+    elif command == "import":
+        import_benefits(sys.argv[2:])
+    elif command == "seed-large":
+        seed_large(sys.argv[2:])
+    elif command == "profile-token":
+        profile_token(int(sys.argv[2]) if len(sys.argv) > 2 else 60)
     else:
         print(f"❌ 未知命令: {command}")
 
@@ -0,0 +1,168 @@
+"""
+测试夹具：独立的临时数据库、按规模灌入的数据集和SQL语句计数
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+# 在导入应用之前指定临时数据库和必填配置
+_workdir = tempfile.mkdtemp(prefix="linuxdo-free-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ.pop("CLAIMS_DATABASE_URL", None)
+os.environ.pop("CLAIMS_DATABASE_READ_URL", None)
+for _name in ("LINUXDO_CLIENT_ID", "LINUXDO_CLIENT_SECRET", "LINUXDO_REDIRECT_URI", "SECRET_KEY"):
+    os.environ.setdefault(_name, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+import main
+from app.core.security import create_access_token, get_password_hash
+from app.db.bulk import bulk_insert
+from app.db.database import SessionLocal, all_engines
+from app.models.models import Benefit, BenefitCDKey, BenefitClaim, PersonalBlacklist, User
+from app.services.benefit_service import benefit_service
+
+# 数据集规模：同一接口在两种规模下的SQL语句数必须相同
+SCALES = {"small": 3, "large": 40}
+
+
+class QueryCounter:
+    """统计期间所有引擎上执行的SQL语句"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @contextmanager
+    def watch(self) -> Iterator["QueryCounter"]:
+        engines = all_engines()
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        try:
+            yield self
+        finally:
+            for engine in engines:
+                event.remove(engine, "before_cursor_execute", self._record)
+
+
+@pytest.fixture
+def count_queries():
+    """with count_queries() as counter: ... 之后 counter.count 为执行的语句数"""
+    return lambda: QueryCounter().watch()
+
+
+@pytest.fixture(scope="session")
+def client() -> TestClient:
+    # 不进入lifespan，避免后台清理线程的查询计入统计
+    return TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def no_background_purge(monkeypatch):
+    """删除福利后的后台清理在响应之后执行，不计入接口的语句数"""
+    monkeypatch.setattr(benefit_service, "purge_deleted_benefit", lambda benefit_id, **kwargs: None)
+
+
+def auth_headers(user_id: int) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def _seed_scale(db, scale: str, size: int) -> Dict[str, int]:
+    """一个创建者的福利、CDKEY、领取记录和黑名单，数量均随 size 增长"""
+    now = datetime.utcnow()
+    offset = 100000 * (list(SCALES).index(scale) + 1)
+
+    def new_user(linuxdo_id: int, username: str, trust_level: int = 2) -> int:
+        user = User(linuxdo_id=linuxdo_id, username=username, trust_level=trust_level)
+        db.add(user)
+        db.flush()
+        return user.id
+
+    creator_id = new_user(offset, f"creator_{scale}", trust_level=3)
+    claimer_id = new_user(offset + 1, f"claimer_{scale}")
+    db.execute(insert(User), [
+        {"linuxdo_id": offset + 10 + i, "username": f"fan_{scale}_{i}", "trust_level": 1, "created_at": now}
+        for i in range(size)
+    ])
+    fan_ids = [user_id for (user_id,) in db.query(User.id).filter(User.username.like(f"fan_{scale}_%"))]
+
+    def new_benefit(**values) -> Benefit:
+        benefit = Benefit(creator_id=creator_id, description=f"{scale} 测试福利", **values)
+        db.add(benefit)
+        db.flush()
+        return benefit
+
+    content_benefits = [
+        new_benefit(title=f"{scale} content {i}", benefit_type="content", content="内容", secret="秘密")
+        for i in range(size)
+    ]
+    cdkey_benefits = [new_benefit(title=f"{scale} cdkey {i}", benefit_type="cdkey") for i in range(size)]
+
+    # 每个CDKEY福利有 2*size 个CDKEY，其中 size 个已被不同用户领取
+    for benefit in cdkey_benefits:
+        bulk_insert(
+            db, BenefitCDKey, ("benefit_id", "cdkey_content", "is_claimed", "claimed_by_user_id", "claimed_at"),
+            [
+                (benefit.id, f"{scale}-{benefit.id}-{i}", i < size, fan_ids[i] if i < size else None, now if i < size else None)
+                for i in range(2 * size)
+            ],
+            created_at=now
+        )
+        db.execute(insert(BenefitClaim), [
+            {"user_id": user_id, "benefit_id": benefit.id, "cdkey_id": cdkey_id, "claimed_at": now}
+            for cdkey_id, user_id in db.query(BenefitCDKey.id, BenefitCDKey.claimed_by_user_id).filter(
+                BenefitCDKey.benefit_id == benefit.id, BenefitCDKey.is_claimed.is_(True)
+            )
+        ])
+        benefit.total_cdkeys, benefit.available_cdkeys, benefit.total_claims = 2 * size, size, size
+
+    # 领取者领过全部内容福利
+    db.execute(insert(BenefitClaim), [
+        {"user_id": claimer_id, "benefit_id": benefit.id, "claimed_at": now} for benefit in content_benefits
+    ])
+    for benefit in content_benefits:
+        benefit.total_claims = 1
+
+    db.execute(insert(PersonalBlacklist), [
+        {"creator_id": creator_id, "blacklisted_username": f"spammer_{scale}_{i}", "created_at": now}
+        for i in range(size)
+    ])
+
+    private = new_benefit(title=f"{scale} private", visibility="private", access_password=get_password_hash("pass"), content="私有")
+    db.commit()
+    benefit_service.rebuild_creator_stats(db, creator_id)
+    db.commit()
+
+    return {
+        "size": size,
+        "creator": creator_id,
+        "claimer": claimer_id,
+        "content_benefit": content_benefits[0].id,
+        "cdkey_benefit": cdkey_benefits[0].id,
+        "open_cdkey_benefit": cdkey_benefits[1].id,
+        "private_benefit": private.id,
+    }
+
+
+@pytest.fixture(scope="session")
+def dataset() -> Dict[str, Dict[str, int]]:
+    """各规模的数据集，值为用户和福利的ID"""
+    db = SessionLocal()
+    try:
+        return {scale: _seed_scale(db, scale, size) for scale, size in SCALES.items()}
+    finally:
+        db.close()
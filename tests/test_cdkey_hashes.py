@@ -0,0 +1,40 @@
+"""
+历史CDKEY的哈希补算：重复内容跳过并计数，不依赖数据库的IGNORE语法
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.core.security import hash_cdkey
+from app.db.bulk import bulk_insert
+from app.db.database import SessionLocal
+from app.models.models import Benefit, BenefitCDKey, User
+from app.services.benefit_service import benefit_service
+
+
+def test_backfill_skips_duplicates():
+    db = SessionLocal()
+    try:
+        creator = User(linuxdo_id=800000, username="hash_backfill", trust_level=2)
+        db.add(creator)
+        db.flush()
+        benefit = Benefit(title="backfill", benefit_type="cdkey", creator_id=creator.id)
+        db.add(benefit)
+        db.flush()
+        # 已有哈希的 A，以及未补算的 A（重复）、B、B（批内重复）、C
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content", "content_hash"), [
+            (benefit.id, "A", hash_cdkey("A")), (benefit.id, " A ", None),
+            (benefit.id, "B", None), (benefit.id, "B", None), (benefit.id, "C", None),
+        ], is_claimed=False, created_at=datetime.utcnow())
+        db.commit()
+
+        result = benefit_service.backfill_cdkey_hashes(db, batch_size=2)
+
+        assert result == {"hashed": 2, "duplicates": 2}
+        hashes = db.execute(
+            select(BenefitCDKey.cdkey_content, BenefitCDKey.content_hash)
+            .where(BenefitCDKey.benefit_id == benefit.id).order_by(BenefitCDKey.id)
+        ).all()
+        assert [content_hash is not None for _, content_hash in hashes] == [True, False, True, False, True]
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+"""
+领取的并发安全：CDKEY和领取上限以条件更新占用，不依赖写连接串行化
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.sql import Update
+
+from app.db.bulk import bulk_insert
+from app.db.database import SessionLocal, claims_store_metadata
+from app.models.models import Benefit, BenefitCDKey, BenefitClaim, User
+from app.services.benefit_service import benefit_service
+
+
+def _users(db, prefix: str, base: int, count: int = 3):
+    users = [User(linuxdo_id=base + i, username=f"{prefix}_{i}", trust_level=2) for i in range(count)]
+    db.add_all(users)
+    db.flush()
+    return [user.id for user in users]
+
+
+def test_cdkey_taken_concurrently_is_skipped():
+    db = SessionLocal()
+    try:
+        creator, claimer, rival = _users(db, "race_cdkey", 820000)
+        benefit = Benefit(title="race", benefit_type="cdkey", creator_id=creator, total_cdkeys=2, available_cdkeys=2)
+        db.add(benefit)
+        db.flush()
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content"), [(benefit.id, "first"), (benefit.id, "second")],
+                    is_claimed=False, created_at=datetime.utcnow())
+        db.commit()
+
+        # 在第一次标记CDKEY之前，模拟另一个领取者抢先领走了同一个CDKEY
+        raced = []
+
+        @event.listens_for(db, "do_orm_execute")
+        def _race(state):
+            if not raced and isinstance(state.statement, Update) and state.statement.table.name == "benefit_cdkeys":
+                raced.append(True)
+                state.session.connection().execute(
+                    update(BenefitCDKey.__table__).where(BenefitCDKey.__table__.c.cdkey_content == "first")
+                    .values(is_claimed=True, claimed_by_user_id=rival)
+                )
+
+        result = benefit_service.claim_in_session(db, claimer, benefit)
+
+        assert (result.success, result.cdkey) == (True, "second")
+        owners = dict(db.execute(
+            select(BenefitCDKey.cdkey_content, BenefitCDKey.claimed_by_user_id).where(BenefitCDKey.benefit_id == benefit.id)
+        ).all())
+        assert owners == {"first": rival, "second": claimer}
+    finally:
+        db.close()
+
+
+def test_content_max_claims_checked_atomically():
+    db = SessionLocal()
+    try:
+        creator, first, second = _users(db, "race_content", 820100)
+        benefit = Benefit(title="race", benefit_type="content", content="内容", creator_id=creator,
+                          max_claims=1, total_claims=0)
+        db.add(benefit)
+        db.commit()
+
+        # 两次领取都基于领取前加载的福利（资格检查时 total_claims 仍为0）
+        assert benefit_service.claim_in_session(db, first, benefit).success
+        result = benefit_service.claim_in_session(db, second, benefit)
+
+        assert (result.success, result.message) == (False, "福利已被领完")
+        assert db.execute(
+            select(func.count()).select_from(BenefitClaim).where(BenefitClaim.benefit_id == benefit.id)
+        ).scalar() == 1
+    finally:
+        db.close()
+
+
+def test_concurrent_duplicate_claim_rejected_by_unique_index(monkeypatch):
+    db = SessionLocal()
+    try:
+        creator, claimer = _users(db, "race_duplicate", 820200, count=2)
+        benefit = Benefit(title="race", benefit_type="cdkey", creator_id=creator, total_cdkeys=2, available_cdkeys=2)
+        db.add(benefit)
+        db.flush()
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content"), [(benefit.id, "first"), (benefit.id, "second")],
+                    is_claimed=False, created_at=datetime.utcnow())
+        db.commit()
+
+        assert benefit_service.claim_in_session(db, claimer, benefit).success
+        # 另一个并发请求在第一条领取记录提交前通过了重复领取的检查
+        monkeypatch.setattr(benefit_service, "has_user_claimed", lambda *args: False)
+        result = benefit_service.claim_in_session(db, claimer, benefit)
+
+        assert (result.success, result.message) == (False, "您已经领取过此福利")
+        assert db.execute(
+            select(func.count()).select_from(BenefitCDKey)
+            .where(BenefitCDKey.benefit_id == benefit.id, BenefitCDKey.is_claimed == False)
+        ).scalar() == 1
+    finally:
+        db.close()
+
+
+def test_claims_store_drops_cross_store_foreign_keys():
+    tables = claims_store_metadata().tables
+    references = {
+        name: {element.target_fullname for element in table.foreign_keys} for name, table in tables.items()
+    }
+    assert references == {"benefit_cdkeys": set(), "benefit_claims": {"benefit_cdkeys.id"}}
+    # 模型本身的外键和ORM关联不受影响
+    assert {element.target_fullname for element in BenefitCDKey.__table__.foreign_keys} == {"benefits.id", "users.id"}
+    assert {index.name for index in tables["benefit_cdkeys"].indexes} >= {"ix_benefit_cdkeys_benefit_claimed"}
@@ -0,0 +1,30 @@
+"""
+数据库繁忙（等待写连接超时、SQLite写锁超时）时返回503和Retry-After
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+from app.core.config import settings
+from app.services.benefit_service import benefit_service
+from tests.conftest import auth_headers
+
+API = "/api/v1"
+
+
+@pytest.mark.parametrize("error", [
+    PoolTimeoutError("QueuePool limit of size 1 overflow 0 reached"),
+    OperationalError("UPDATE benefits", {}, sqlite3.OperationalError("database is locked")),
+], ids=["pool_timeout", "database_locked"])
+def test_busy_database_returns_503(client, dataset, monkeypatch, error):
+    def busy(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(benefit_service, "update_benefit", busy)
+    ids = dataset["small"]
+    response = client.put(f"{API}/benefits/{ids['content_benefit']}", headers=auth_headers(ids["creator"]),
+                          json={"title": "busy"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.db_busy_retry_after)
@@ -0,0 +1,139 @@
+"""
+福利批量导入：校验、CDKEY来源和中断后从检查点继续
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.security import verify_password
+from app.db.database import SessionLocal
+from app.db.importer import Checkpoint, import_benefits
+from app.models.models import Benefit, BenefitCDKey, CreatorStats, User
+
+
+@pytest.fixture
+def creator():
+    db = SessionLocal()
+    try:
+        count = db.query(User).count()
+        user = User(linuxdo_id=700000 + count, username=f"importer_{count}", trust_level=2)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(
+        record if isinstance(record, str) else json.dumps(record, ensure_ascii=False) + "\n" for record in records
+    ), encoding="utf-8")
+
+
+def _run(path, creator, **kwargs):
+    db = SessionLocal()
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=2) as hasher:
+            result = import_benefits(db, str(path), hasher, default_creator=creator, batch_size=2,
+                                     on_error=lambda line, reason: errors.append(line), **kwargs)
+        return result, errors
+    finally:
+        db.close()
+
+
+def _benefits(creator):
+    db = SessionLocal()
+    try:
+        return {benefit.title: benefit for benefit in db.query(Benefit).filter(Benefit.creator_id == creator)}
+    finally:
+        db.close()
+
+
+def test_import_records_and_cdkey_sources(tmp_path, creator):
+    (tmp_path / "keys.txt").write_text("F-1\nF-2\n\nF-2\nF-3\n", encoding="utf-8")
+    _write_jsonl(tmp_path / "benefits.jsonl", [
+        {"title": "inline", "benefit_type": "cdkey", "cdkeys": ["A", "B", "A"]},
+        {"title": "file", "benefit_type": "cdkey", "cdkeys_file": "keys.txt"},
+        "{not json\n",
+        {"title": "private", "visibility": "private", "access_password": "pw", "content": "内容"},
+        {"title": "bad level", "min_trust_level": "high"},
+        {"title": "content keys", "cdkeys": ["X"]},
+        {"title": "ghost", "creator": "no_such_user"},
+    ])
+
+    result, errors = _run(tmp_path / "benefits.jsonl", creator)
+
+    assert result == {"records": 7, "benefits": 3, "cdkeys": 5, "failed": 4}
+    assert errors == [3, 5, 6, 7]
+    benefits = _benefits(creator)
+    assert (benefits["inline"].total_cdkeys, benefits["inline"].available_cdkeys) == (2, 2)
+    assert benefits["file"].total_cdkeys == 3
+    assert verify_password("pw", benefits["private"].access_password)
+
+    db = SessionLocal()
+    try:
+        assert db.execute(
+            select(func.count()).select_from(BenefitCDKey).where(BenefitCDKey.benefit_id == benefits["file"].id)
+        ).scalar() == 3
+        stats = db.get(CreatorStats, creator)
+        assert (stats.total_benefits, stats.total_cdkeys) == (3, 5)
+    finally:
+        db.close()
+
+
+def _interrupt_after_first_commit(monkeypatch, path, creator):
+    """第一批提交之后、检查点推进之前中断"""
+    saves = []
+    original_save = Checkpoint.save
+
+    def interrupted_save(self):
+        saves.append(self.state["pending"])
+        if len(saves) == 2:
+            raise KeyboardInterrupt
+        original_save(self)
+
+    monkeypatch.setattr(Checkpoint, "save", interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        _run(path, creator)
+    monkeypatch.setattr(Checkpoint, "save", original_save)
+    return saves[0]
+
+
+def test_resume_after_interrupted_commit(tmp_path, creator, monkeypatch):
+    path = tmp_path / "benefits.jsonl"
+    _write_jsonl(path, [{"title": f"resume {i}", "content": "内容"} for i in range(5)])
+
+    _interrupt_after_first_commit(monkeypatch, path, creator)
+    assert len(_benefits(creator)) == 2
+
+    result, _ = _run(path, creator)
+
+    assert result == {"records": 5, "benefits": 5, "cdkeys": 0, "failed": 0}
+    assert sorted(_benefits(creator)) == [f"resume {i}" for i in range(5)]
+
+
+def test_resume_discards_half_committed_batch(tmp_path, creator, monkeypatch):
+    path = tmp_path / "benefits.jsonl"
+    _write_jsonl(path, [
+        {"title": f"split {i}", "benefit_type": "cdkey", "cdkeys": [f"S-{i}-1", f"S-{i}-2"]} for i in range(3)
+    ])
+    pending = _interrupt_after_first_commit(monkeypatch, path, creator)
+
+    # 领取库独立时福利已提交、CDKEY的提交丢失
+    db = SessionLocal()
+    try:
+        cdkeys = BenefitCDKey.__table__
+        db.execute(cdkeys.delete().where(cdkeys.c.benefit_id.in_(pending["benefit_ids"])))
+        db.commit()
+    finally:
+        db.close()
+
+    result, _ = _run(path, creator)
+
+    assert result == {"records": 3, "benefits": 3, "cdkeys": 6, "failed": 0}
+    benefits = _benefits(creator)
+    assert sorted(benefits) == [f"split {i}" for i in range(3)]
+    assert all(benefit.total_cdkeys == 2 for benefit in benefits.values())
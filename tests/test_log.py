@@ -0,0 +1,43 @@
+"""
+日志：敏感字段打码和JSON格式
+"""
+import json
+import logging
+import sys
+
+from app.core.log import JSONFormatter, _TraceQueueHandler, redact
+
+
+def test_redact_fields_and_text():
+    data = {"client_secret": "s", "nested": [{"Access_Token": "t"}], "status_code": 400}
+    assert redact(data) == {"client_secret": "***", "nested": [{"Access_Token": "***"}], "status_code": 400}
+
+    text = 'client_secret=s&code=c status_code=400 {"access_token": "t", "scope": "read"}'
+    assert redact(text) == 'client_secret=***&code=c status_code=400 {"access_token": "***", "scope": "read"}'
+
+
+def test_generic_field_names_are_kept():
+    data = {"code": 404, "status_code": 400, "token_type": "bearer", "token": "next-page", "secret": False}
+    assert redact(data) == data
+    assert redact('{"code": "E01", "token_type": "bearer"} code=E01') == '{"code": "E01", "token_type": "bearer"} code=E01'
+
+
+def test_redact_oauth_code_in_callback_url():
+    assert redact("GET /api/v1/auth/callback?code=abc&state=s 200") == "GET /api/v1/auth/callback?code=***&state=s 200"
+    assert redact("GET /api/v1/auth/callback?state=s&code=abc 200") == "GET /api/v1/auth/callback?state=s&code=*** 200"
+    assert redact("GET /api/v1/benefits?code=abc 200") == "GET /api/v1/benefits?code=abc 200"
+
+
+def test_json_formatter_outputs_extra_fields_and_exception():
+    handler = _TraceQueueHandler(None)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.getLogger("test").makeRecord(
+            "test", logging.WARNING, __file__, 1, "call %s failed", ("token",), sys.exc_info(),
+            extra={"duration_ms": 1.5, "password": "p"}
+        )
+    entry = json.loads(JSONFormatter().format(handler.prepare(record)))
+    assert entry["message"] == "call token failed"
+    assert entry["duration_ms"] == 1.5 and entry["password"] == "***"
+    assert "ValueError: boom" in entry["exception"]
@@ -0,0 +1,23 @@
+"""
+单请求分析：响应头和结果文件的保留个数
+"""
+import os
+
+from app.core.config import settings
+from app.core.profiling import create_profile_token, list_profiles
+
+
+def test_profiled_requests_keep_newest(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_secret", "test-secret")
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiling_keep", 2)
+    headers = {"X-Profile-Token": create_profile_token()}
+
+    profile_ids = []
+    for _ in range(3):
+        response = client.get("/health", headers=headers)
+        assert response.headers["X-Profile-Concurrent"] == "0"
+        profile_ids.append(response.headers["X-Profile-Id"])
+
+    assert [entry["id"] for entry in list_profiles()] == sorted(profile_ids[1:], reverse=True)
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,74 @@
+"""
+已删除福利的后台清理：按列表分批删除，多个worker之间按福利认领
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.db.bulk import bulk_insert
+from app.db.database import SessionLocal
+from app.models.models import Benefit, BenefitCDKey, User
+from app.services.benefit_service import BenefitService, PURGE_LEASE, benefit_service
+
+
+def _deleted_benefit(keys: int) -> int:
+    db = SessionLocal()
+    try:
+        creator = User(linuxdo_id=810000 + keys, username=f"purge_{keys}", trust_level=2)
+        db.add(creator)
+        db.flush()
+        benefit = Benefit(title="purge", benefit_type="cdkey", creator_id=creator.id, deleted_at=datetime.utcnow())
+        db.add(benefit)
+        db.flush()
+        bulk_insert(db, BenefitCDKey, ("benefit_id", "cdkey_content"), [
+            (benefit.id, f"purge-{i}") for i in range(keys)
+        ], is_claimed=False, created_at=datetime.utcnow())
+        db.commit()
+        return benefit.id
+    finally:
+        db.close()
+
+
+def _remaining(benefit_id: int):
+    db = SessionLocal()
+    try:
+        keys = db.execute(
+            select(func.count()).select_from(BenefitCDKey).where(BenefitCDKey.benefit_id == benefit_id)
+        ).scalar()
+        benefit = db.execute(
+            select(Benefit.__table__.c.id).where(Benefit.__table__.c.id == benefit_id)
+        ).first()
+        return keys, benefit is not None
+    finally:
+        db.close()
+
+
+def test_purge_deletes_in_batches():
+    benefit_id = _deleted_benefit(5)
+
+    # 测试夹具替换了实例上的后台清理，这里直接调用类上的实现
+    BenefitService.purge_deleted_benefit(benefit_service, benefit_id, batch_size=2)
+
+    assert _remaining(benefit_id) == (0, False)
+
+
+def test_purge_claimed_by_one_worker():
+    benefit_id = _deleted_benefit(3)
+    db = SessionLocal()
+    try:
+        assert benefit_service._claim_purge(db, benefit_id)
+        # 其他worker在租约内认领失败，不做任何清理
+        BenefitService.purge_deleted_benefit(benefit_service, benefit_id)
+        assert _remaining(benefit_id) == (3, True)
+
+        # 认领者退出、租约过期后可以接手
+        db.execute(
+            Benefit.__table__.update().where(Benefit.__table__.c.id == benefit_id)
+            .values(purge_claimed_at=datetime.utcnow() - PURGE_LEASE * 2)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    BenefitService.purge_deleted_benefit(benefit_service, benefit_id)
+    assert _remaining(benefit_id) == (0, False)
@@ -0,0 +1,209 @@
+"""
+接口SQL语句数预算
+
+每个接口在小、大两种规模的数据集和不同分页大小下执行的SQL语句数必须相同（O(1)），
+且不超过预算。逐行查询（N+1）的回归会直接导致测试失败。
+"""
+import gzip
+
+import pytest
+
+import manage
+from app.core.config import settings
+from app.services.oauth_service import oauth_service
+from app.schemas.schemas import LinuxDOUserInfo
+from tests.conftest import SCALES, auth_headers
+
+API = "/api/v1"
+
+# (名称, 路径模板, 以谁的身份请求, 语句数预算)；路径中的 {limit} 分别取 LIMITS 中的值
+READ_ENDPOINTS = [
+    ("public", "/benefits/public?limit={limit}", None, 1),
+    ("public_authed", "/benefits/public?limit={limit}", "claimer", 2),
+    ("root", "/benefits/?limit={limit}", None, 1),
+    ("search", "/benefits/search?q=content&limit={limit}", None, 1),
+    ("public_fields", "/benefits/public?fields=id,title&limit={limit}", None, 1),
+    ("my", "/benefits/my?limit={limit}", "creator", 2),
+    ("my_stats", "/benefits/my/stats", "creator", 3),  # 写会话，含 BEGIN IMMEDIATE
+    ("my_managed", "/benefits/my/managed?limit={limit}", "creator", 2),
+    ("my_history", "/benefits/my/history?limit={limit}", "claimer", 5),
+    ("blacklist", "/benefits/blacklist", "creator", 2),
+    ("benefit", "/benefits/{cdkey_benefit}", "claimer", 3),
+    ("benefit_fields", "/benefits/{cdkey_benefit}?fields=id,title", "claimer", 3),
+    ("detail", "/benefits/{content_benefit}/detail", "claimer", 3),
+    ("eligibility", "/benefits/{open_cdkey_benefit}/eligibility", "claimer", 5),
+    ("claims", "/benefits/{cdkey_benefit}/claims?limit={limit}", "creator", 3),
+    ("claims_fields", "/benefits/{cdkey_benefit}/claims?fields=id,user_id&limit={limit}", "creator", 3),
+    ("claims_export", "/benefits/{cdkey_benefit}/claims/export?format=csv", "creator", 4),
+    ("cdkeys", "/benefits/{cdkey_benefit}/cdkeys?limit={limit}", "creator", 3),
+    ("cdkeys_unclaimed", "/benefits/{cdkey_benefit}/cdkeys?status=unclaimed&limit={limit}", "creator", 3),
+    ("cdkeys_export", "/benefits/{cdkey_benefit}/cdkeys/export", "creator", 3),
+    ("me", "/users/me", "claimer", 1),
+    ("me_claims", "/users/me/claims?limit={limit}", "claimer", 3),
+    ("user", "/users/{creator}", None, 1),
+    ("oauth_login", "/oauth/login", None, 0),
+]
+
+LIMITS = (2, 100)
+
+
+def _request_counts(client, count_queries, dataset, method, template, role, **kwargs):
+    """在每种规模、每个分页大小下请求一次，返回 {(规模, limit): 语句数}"""
+    counts = {}
+    for scale, ids in dataset.items():
+        headers = auth_headers(ids[role]) if role else {}
+        for limit in LIMITS if "{limit}" in template else (None,):
+            path = template.format(limit=limit, **ids)
+            with count_queries() as counter:
+                response = client.request(method, API + path, headers=headers, **kwargs)
+            assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text}"
+            counts[(scale, limit)] = counter.count
+    return counts
+
+
+@pytest.mark.parametrize(
+    "template, role, budget",
+    [endpoint[1:] for endpoint in READ_ENDPOINTS],
+    ids=[endpoint[0] for endpoint in READ_ENDPOINTS]
+)
+def test_read_endpoint_query_budget(client, count_queries, dataset, template, role, budget):
+    counts = _request_counts(client, count_queries, dataset, "GET", template, role)
+    assert len(set(counts.values())) == 1, f"语句数随数据量或分页大小变化: {counts}"
+    assert max(counts.values()) <= budget, f"超出预算 {budget}: {counts}"
+
+
+@pytest.mark.parametrize("fields", ["access_password", "secret", "id,title,secret"])
+def test_private_fields_cannot_be_projected(client, dataset, fields):
+    ids = dataset["small"]
+    for path in (f"/benefits/{ids['private_benefit']}", "/benefits/public"):
+        response = client.get(f"{API}{path}?fields={fields}", headers=auth_headers(ids["claimer"]))
+        assert response.status_code == 400, response.text
+
+
+def test_dataset_scales_differ(dataset):
+    # O(1) 断言只有在两种规模的数据量确实不同时才有意义
+    assert dataset["small"]["size"] == SCALES["small"] < dataset["large"]["size"] == SCALES["large"]
+
+
+def _create_benefit(client, headers, **values):
+    payload = {"title": "budget", "description": "budget", "benefit_type": "content", "content": "内容"}
+    payload.update(values)
+    response = client.post(f"{API}/benefits/", headers=headers, json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _count(client, count_queries, method, path, headers=None, expected=200, **kwargs):
+    with count_queries() as counter:
+        response = client.request(method, API + path, headers=headers or {}, **kwargs)
+    assert response.status_code == expected, f"{method} {path}: {response.status_code} {response.text}"
+    return counter.count
+
+
+@pytest.mark.parametrize("keys", [3, 300])
+def test_create_cdkey_benefit_is_constant_in_keys(client, count_queries, dataset, keys):
+    headers = auth_headers(dataset["small"]["creator"])
+    payload = {
+        "title": "budget", "description": "budget", "benefit_type": "cdkey",
+        "cdkeys": [f"create-{keys}-{i}" for i in range(keys)]
+    }
+    assert _count(client, count_queries, "POST", "/benefits/", headers, json=payload) <= 10
+
+
+@pytest.mark.parametrize("keys", [3, 300])
+def test_add_cdkeys_is_constant_in_keys(client, count_queries, dataset, keys):
+    ids = dataset["small"]
+    headers = auth_headers(ids["creator"])
+    cdkeys = [f"add-{keys}-{i}" for i in range(keys)]
+    path = f"/benefits/{ids['open_cdkey_benefit']}/cdkeys/add"
+    assert _count(client, count_queries, "POST", path, headers, json={"cdkeys": cdkeys}) <= 6
+
+
+@pytest.mark.parametrize("keys", [3, 300])
+def test_upload_cdkeys_is_constant_in_keys(client, count_queries, dataset, keys):
+    ids = dataset["large"]
+    headers = {**auth_headers(ids["creator"]), "Content-Type": "application/gzip"}
+    body = gzip.compress("\n".join(f"upload-{keys}-{i}" for i in range(keys)).encode())
+    path = f"/benefits/{ids['open_cdkey_benefit']}/cdkeys/upload"
+    # 含写连接上的 BEGIN IMMEDIATE
+    assert _count(client, count_queries, "POST", path, headers, content=body) <= 6
+
+
+@pytest.mark.parametrize("limit, value", [
+    ("cdkey_upload_max_lines", 2), ("cdkey_upload_max_bytes", 10), ("cdkey_upload_max_decompressed_bytes", 10)
+])
+def test_upload_cdkeys_limits(client, dataset, monkeypatch, limit, value):
+    ids = dataset["small"]
+    monkeypatch.setattr(settings, limit, value)
+    path = f"/benefits/{ids['open_cdkey_benefit']}/cdkeys/upload"
+    response = client.post(API + path, headers=auth_headers(ids["creator"]), content="over-1\nover-2\nover-3\n")
+    assert response.status_code == 413, response.text
+
+
+@pytest.mark.parametrize("scale", list(SCALES))
+def test_claim_query_budget(client, count_queries, dataset, scale):
+    ids = dataset[scale]
+    headers = auth_headers(ids["claimer"])
+    assert _count(client, count_queries, "POST", f"/benefits/{ids['open_cdkey_benefit']}/claim", headers) <= 12
+
+    content_id = _create_benefit(client, auth_headers(ids["creator"]), max_claims=10)
+    assert _count(client, count_queries, "POST", f"/benefits/{content_id}/claim", headers) <= 11
+
+
+# 先读后写的接口使用写会话，以下预算均含每个事务开头的 BEGIN IMMEDIATE
+@pytest.mark.parametrize("scale", list(SCALES))
+def test_benefit_write_query_budgets(client, count_queries, dataset, scale):
+    ids = dataset[scale]
+    creator = auth_headers(ids["creator"])
+
+    assert _count(client, count_queries, "POST", f"/benefits/{ids['private_benefit']}/access",
+                  auth_headers(ids["claimer"]), json={"password": "pass"}) <= 3
+    assert _count(client, count_queries, "PUT", f"/benefits/{ids['content_benefit']}", creator,
+                  json={"title": "renamed"}) <= 8
+    assert _count(client, count_queries, "POST", "/benefits/blacklist", creator,
+                  json={"blacklisted_username": f"budget_{scale}"}) <= 5
+    assert _count(client, count_queries, "DELETE", f"/benefits/blacklist/budget_{scale}", creator) <= 5
+
+    benefit_id = _create_benefit(client, creator)
+    assert _count(client, count_queries, "DELETE", f"/benefits/{benefit_id}", creator) <= 6
+    assert _count(client, count_queries, "GET", f"/benefits/{benefit_id}/deletion", creator) <= 4
+
+
+def test_oauth_query_budgets(client, count_queries, dataset, monkeypatch):
+    async def exchange_code_for_token(code):
+        return "token"
+
+    async def get_user_info(access_token):
+        return LinuxDOUserInfo(id=999999, username="oauth_budget", name="OAuth", trust_level=1, active=True, silenced=False)
+
+    monkeypatch.setattr(oauth_service, "exchange_code_for_token", exchange_code_for_token)
+    monkeypatch.setattr(oauth_service, "get_user_info", get_user_info)
+
+    for _ in range(2):  # 首次登录创建用户，再次登录更新用户
+        state = client.get(f"{API}/oauth/login").json()["state"]
+        # 写会话：提交后刷新用户会开启第二个写事务，各含一条 BEGIN IMMEDIATE
+        assert _count(client, count_queries, "GET", f"/oauth/callback?code=c&state={state}") <= 7
+
+    headers = auth_headers(dataset["small"]["claimer"])
+    assert _count(client, count_queries, "POST", "/oauth/agree-advanced-mode", headers) <= 6
+
+
+# 管理命令：(函数, 语句数预算, 输出行数相对数据集规模的倍数)
+MANAGE_LIST_COMMANDS = [
+    ("list_users", 2, 1),
+    ("list_benefits", 1, 0),
+    ("list_cdkeys", 3, 2),
+]
+
+
+@pytest.mark.parametrize("command, budget, rows", MANAGE_LIST_COMMANDS, ids=[entry[0] for entry in MANAGE_LIST_COMMANDS])
+def test_manage_list_query_budget(count_queries, dataset, capsys, command, budget, rows):
+    counts = {}
+    for scale, ids in dataset.items():
+        with count_queries() as counter:
+            getattr(manage, command)(["--benefit", str(ids["cdkey_benefit"]), "--format", "json"])
+        counts[scale] = counter.count
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == (rows * ids["size"] or 1)
+    assert len(set(counts.values())) == 1, f"语句数随数据量变化: {counts}"
+    assert max(counts.values()) <= budget, f"超出预算 {budget}: {counts}"
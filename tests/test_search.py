@@ -0,0 +1,112 @@
+"""
+福利检索：创建、编辑、删除后 /benefits/search 的结果，FTS和LIKE回退两条路径
+"""
+import pytest
+from sqlalchemy import select
+
+from app.db import search
+from app.db.database import SessionLocal, engine
+from app.models.models import User
+from app.services.benefit_service import BenefitService, benefit_service
+from tests.conftest import auth_headers
+
+API = "/api/v1"
+
+# 每条路径使用各自的词，互不干扰；短词不足trigram的3个字符，FTS路径下也走LIKE
+TERMS = {
+    "fts": {"title": "蓝莓果酱", "renamed": "草莓果酱", "description": "手工熬制", "short": "蓝莓"},
+    "like": {"title": "柠檬汽水", "renamed": "橙子汽水", "description": "冰镇饮用", "short": "柠檬"},
+}
+
+
+@pytest.fixture(params=list(TERMS))
+def path(request, monkeypatch):
+    """fts 使用测试库的FTS5索引；like 模拟不支持FTS5的数据库"""
+    if request.param == "like":
+        monkeypatch.setitem(search._fts_ready, str(engine.url), False)
+    return request.param
+
+
+@pytest.fixture
+def creator(path):
+    db = SessionLocal()
+    try:
+        user = User(linuxdo_id=830000 + list(TERMS).index(path), username=f"search_{path}", trust_level=2)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _search(client, q):
+    response = client.get(f"{API}/benefits/search", params={"q": q})
+    assert response.status_code == 200, response.text
+    return [benefit["id"] for benefit in response.json()]
+
+
+def _indexed(benefit_id):
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(search.benefits_fts.c.title).where(search.benefits_fts.c.rowid == benefit_id)
+        ).scalar_one_or_none()
+    finally:
+        db.close()
+
+
+def test_search_follows_create_edit_delete(client, path, creator):
+    terms = TERMS[path]
+    headers = auth_headers(creator)
+    db = SessionLocal()
+    try:
+        assert search.fts_available(db) == (path == "fts")
+    finally:
+        db.close()
+
+    response = client.post(f"{API}/benefits/", headers=headers, json={
+        "title": terms["title"], "description": terms["description"], "benefit_type": "content", "content": "内容"
+    })
+    assert response.status_code == 200, response.text
+    benefit_id = response.json()["id"]
+
+    assert _search(client, terms["title"]) == [benefit_id]
+    assert _search(client, terms["description"]) == [benefit_id]
+    assert _search(client, f'{terms["title"]} {terms["description"]}') == [benefit_id]
+    assert _search(client, terms["short"]) == [benefit_id]
+    assert _search(client, f'{terms["title"]} 不存在的词') == []
+
+    response = client.put(f"{API}/benefits/{benefit_id}", headers=headers, json={"title": terms["renamed"]})
+    assert response.status_code == 200, response.text
+
+    assert _search(client, terms["title"]) == []
+    assert _search(client, terms["short"]) == []
+    assert _search(client, terms["renamed"]) == [benefit_id]
+    assert _search(client, terms["description"]) == [benefit_id]
+    if path == "fts":
+        assert _indexed(benefit_id) == terms["renamed"]
+
+    response = client.put(f"{API}/benefits/{benefit_id}", headers=headers, json={"is_active": False})
+    assert response.status_code == 200, response.text
+    assert _search(client, terms["renamed"]) == []
+
+    response = client.put(f"{API}/benefits/{benefit_id}", headers=headers, json={"is_active": True})
+    assert response.status_code == 200, response.text
+    assert _search(client, terms["renamed"]) == [benefit_id]
+
+    response = client.delete(f"{API}/benefits/{benefit_id}", headers=headers)
+    assert response.status_code == 200, response.text
+
+    assert _search(client, terms["renamed"]) == []
+    assert _search(client, terms["description"]) == []
+    assert _indexed(benefit_id) is None
+
+    # 测试夹具替换了实例上的后台清理，这里直接调用类上的实现
+    BenefitService.purge_deleted_benefit(benefit_service, benefit_id)
+    assert _search(client, terms["renamed"]) == []
+    assert _search(client, terms["description"]) == []
+
+
+@pytest.mark.parametrize("q", ["%", "_", "\\", '"', "a\"b OR c"])
+def test_search_special_characters(client, path, q):
+    assert _search(client, q) == []
@@ -0,0 +1,55 @@
+"""
+CDKEY上传的逐行解析：压缩前后的大小、行数限制和多成员gzip
+"""
+import asyncio
+import gzip
+
+import pytest
+
+from app.core.streaming import DECOMPRESS_CHUNK_SIZE, UploadTooLarge, iter_upload_lines
+
+
+def _lines(body: bytes, chunk_size: int = 7, **limits):
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    async def collect():
+        return [line async for line in iter_upload_lines(chunks(), **limits)]
+
+    return asyncio.run(collect())
+
+
+def test_plain_and_gzip_lines():
+    body = "﻿A\r\n  B \n\nC".encode()
+    assert _lines(body) == ["A", "B", "C"]
+    assert _lines(gzip.compress(body)) == ["A", "B", "C"]
+
+
+def test_concatenated_gzip_members_are_all_decoded():
+    body = gzip.compress(b"A\nB\n") + gzip.compress(b"C\n") + gzip.compress(b"D")
+    assert _lines(body) == ["A", "B", "C", "D"]
+    assert _lines(body, chunk_size=1) == ["A", "B", "C", "D"]
+
+
+@pytest.mark.parametrize("trailer", [b"garbage", b"\x1f\x8b\x08"], ids=["not_gzip", "truncated_member"])
+def test_data_after_gzip_member_rejected(trailer):
+    with pytest.raises(ValueError) as excinfo:
+        _lines(gzip.compress(b"A\n") + trailer)
+    assert not isinstance(excinfo.value, UploadTooLarge)
+
+
+def test_decompressed_size_limited():
+    # 压缩后很小的压缩炸弹在解压到上限时中止
+    body = gzip.compress(b"A" * 1000 + b"\n" * (4 * DECOMPRESS_CHUNK_SIZE))
+    assert len(body) < 10 * 1024
+    with pytest.raises(UploadTooLarge):
+        _lines(body, chunk_size=len(body), max_decompressed_bytes=DECOMPRESS_CHUNK_SIZE)
+
+
+def test_blank_lines_count_towards_line_limit():
+    assert _lines(b"A\n\n\nB", max_lines=4) == ["A", "B"]
+    with pytest.raises(UploadTooLarge):
+        _lines(b"A\n\n\n\nB", max_lines=4)
+    with pytest.raises(UploadTooLarge):
+        _lines(gzip.compress(b"\n" * 100), max_lines=10)
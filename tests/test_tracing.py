@@ -0,0 +1,66 @@
+"""
+链路追踪：请求的根span、服务方法和SQL语句的子span，以及采样
+"""
+import pytest
+
+from app.core import tracing
+from app.core.config import settings
+from tests.conftest import auth_headers
+
+API = "/api/v1"
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """开启追踪，导出的trace（span字典列表）收集在返回的列表中"""
+    traces = []
+    monkeypatch.setattr(settings, "tracing_enabled", True)
+    monkeypatch.setattr(settings, "tracing_sample_rate", 1.0)
+    monkeypatch.setattr(tracing._export_worker, "submit", traces.append)
+    return traces
+
+
+def test_request_span_tree(client, dataset, exported):
+    ids = dataset["small"]
+    response = client.get(f"{API}/benefits/{ids['open_cdkey_benefit']}/eligibility", headers=auth_headers(ids["claimer"]))
+    assert response.status_code == 200
+
+    [spans] = exported
+    by_id = {span["spanId"]: span for span in spans}
+    [root] = [span for span in spans if span["kind"] == "SPAN_KIND_SERVER"]
+    assert root["name"] == "GET /api/v1/benefits/{benefit_id}/eligibility"
+    assert root["attributes"]["http.status_code"] == 200
+    assert response.headers["x-trace-id"] == root["traceId"]
+
+    assert all(span["traceId"] == root["traceId"] for span in spans)
+    assert all(span["parentSpanId"] in by_id for span in spans if span is not root)
+    service = next(span for span in spans if span["name"] == "BenefitService.check_eligibility")
+    queries = [span for span in spans if span["name"] == "db.query"]
+    assert queries and all(span["attributes"]["db.system"] == "sqlite" for span in queries)
+    # 服务方法中执行的语句挂在该方法（或其调用的方法）之下
+    def ancestors(span):
+        while span["parentSpanId"] in by_id:
+            span = by_id[span["parentSpanId"]]
+            yield span["spanId"]
+    assert any(service["spanId"] in ancestors(span) for span in queries)
+
+
+def test_unsampled_fast_request_is_not_exported(client, exported, monkeypatch):
+    monkeypatch.setattr(settings, "tracing_sample_rate", 0.0)
+    assert client.get(f"{API}/benefits/public").status_code == 200
+    assert exported == []
+
+    monkeypatch.setattr(settings, "tracing_slow_ms", 0)
+    assert client.get(f"{API}/benefits/public").status_code == 200
+    assert len(exported) == 1
+
+
+def test_incoming_traceparent_is_continued(client, exported, monkeypatch):
+    monkeypatch.setattr(settings, "tracing_sample_rate", 0.0)
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    response = client.get(f"{API}/benefits/public", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert response.headers["x-trace-id"] == trace_id
+
+    [spans] = exported
+    root = next(span for span in spans if span["kind"] == "SPAN_KIND_SERVER")
+    assert root["traceId"] == trace_id and root["parentSpanId"] == parent_id